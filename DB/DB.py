@@ -11,19 +11,48 @@ create_wagon_db.py
 исполнители      – исполнители (ФИО)
 выполненные_работы – фактически выполненные работы с привязкой к вагону, договору,
                    услуге и исполнителю, а также интервалом дат и подписантом
+
+Служебные таблицы (своды для отчётов, поисковый индекс, версии справочников
+для кэша – см. rollups.py, search.py, relation_cache.py) создаются
+миграциями и в редакторе не показываются – см. is_service_table.
+
+Изменения схемы после первой версии (индексы, новые колонки, триггеры)
+оформляются миграциями в migrations.py; create_db применяет их сразу,
+а существующие файлы обновляются при открытии в GUI.
 """
 
-import sqlite3
+import sys
 from pathlib import Path
 
+from connection import PROFILES, connect
+from migrations import apply_migrations
+
+# Префиксы служебных таблиц, которые программа ведёт сама
+SERVICE_TABLE_PREFIXES = ("свод_", "поиск", "версии_", "sqlite_")
+
+
+def is_service_table(name: str) -> bool:
+    """True для служебных таблиц, скрытых от пользователя в редакторе."""
+    return name.startswith(SERVICE_TABLE_PREFIXES)
+
 
 def create_db(db_path: str | Path = "wagons.db") -> None:
     """Создаёт (или пере-создаёт) файл БД со всеми нужными таблицами."""
     db_path = Path(db_path)
 
-    # подключаемся и включаем поддержку внешних ключей
-    conn = sqlite3.connect(db_path)
+    fresh = not db_path.exists() or db_path.stat().st_size == 0
+
+    # подключаемся и включаем поддержку внешних ключей; журнал WAL – позже
+    conn = connect(db_path, journal_mode=None)
     conn.execute("PRAGMA foreign_keys = ON;")
+    # Режим задаётся до первой записи в файл – и до перехода на WAL, который
+    # уже пишет заголовок БД: свободные страницы потом возвращаются порциями
+    # через PRAGMA incremental_vacuum (см. maintenance.py)
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+    conn.execute(f"PRAGMA journal_mode = {PROFILES['default']['journal_mode']};")
+    if fresh and conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.close()
+        raise RuntimeError(f"{db_path.name}: не удалось включить auto_vacuum=INCREMENTAL")
 
     schema = """
     /* ===== Справочники ===== */
@@ -89,9 +118,13 @@ def create_db(db_path: str | Path = "wagons.db") -> None:
 
     conn.executescript(schema)
     conn.commit()
+
+    # доводим схему до последней версии
+    conn.isolation_level = None
+    apply_migrations(conn)
     conn.close()
     print(f"База данных создана: {db_path.resolve()}")
 
 
 if __name__ == "__main__":
-    create_db()
+    create_db(*sys.argv[1:2])
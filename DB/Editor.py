@@ -3,6 +3,9 @@ from PyQt5 import QtWidgets, QtSql
 from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
                              QComboBox, QTableView, QFileDialog, QMessageBox)
 
+from connection import configure_qt
+from paged_model import PagedTableModel
+
 class SQLiteEditor(QWidget):
     def __init__(self):
         super().__init__()
@@ -61,6 +64,7 @@ class SQLiteEditor(QWidget):
                 QMessageBox.critical(self, "Error", f"Could not open database: {self.db.lastError().text()}")
                 return
 
+            configure_qt(self.db)
             self.load_tables()
 
     def load_tables(self):
@@ -77,16 +81,23 @@ class SQLiteEditor(QWidget):
         if self.model:
             self.model.clear()
 
-        # Set up table model
-        self.model = QtSql.QSqlTableModel(self, self.db)
+        # Set up table model: rows are read in windows and sorted in SQL,
+        # so large tables open and sort without loading every row
+        self.model = PagedTableModel(self, self.db)
         self.model.setTable(table_name)
-        self.model.setEditStrategy(QtSql.QSqlTableModel.OnFieldChange)
         self.model.select()
 
         # Show in view
         self.table_view.setModel(self.model)
+        self.table_view.selectionModel().currentRowChanged.connect(self.submit_new_rows)
         self.table_view.resizeColumnsToContents()
 
+    def submit_new_rows(self, current, previous):
+        # Added rows are written once the user leaves them
+        if self.model and previous.row() != current.row() and not self.model.submitAll():
+            QMessageBox.warning(self, "Add Record",
+                                f"Could not save new record: {self.model.lastError().text()}")
+
     def add_record(self):
         if not self.model:
             return
@@ -110,8 +121,6 @@ class SQLiteEditor(QWidget):
         rows = sorted({idx.row() for idx in selection.selectedIndexes()}, reverse=True)
         for row in rows:
             self.model.removeRow(row)
-        self.model.submitAll()
-        self.model.select()
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
@@ -18,23 +18,87 @@ from PyQt5.QtWidgets import (
     QFormLayout,
     QTimeEdit,
     QLineEdit,
-    QTabWidget, QSplitter, QHeaderView, QAbstractItemView, QSpacerItem, QSizePolicy, QGridLayout, QGroupBox, QRadioButton
+    QTabWidget, QSplitter, QHeaderView, QAbstractItemView, QSpacerItem, QSizePolicy, QGridLayout, QGroupBox, QRadioButton, QCheckBox,
+    QTableWidget, QTableWidgetItem
 )
-from PyQt5.QtCore import Qt, QDate, QModelIndex, QTime, QSettings, QSize, QDateTime, QVariant
+from PyQt5.QtCore import Qt, QDate, QModelIndex, QTime, QSettings, QSize, QDateTime, QVariant, QTimer, QThread, pyqtSignal, QEvent, QObject
 from PyQt5.QtGui import QColor, QPalette, QIcon
-from fill_test_data import fill_test_data
-from DB import create_db
+from fill_test_data import SCALES, fill_test_data
+from DB import create_db, is_service_table
+from migrations import migrate
+from reports import (BREAKDOWNS, act_frame, act_rows, contract_frame, contract_services,
+                     payroll_breakdown, period_bounds)
+from archive import ARCHIVE_VIEW, attach_archives
+from connection import configure_qt, snapshot
+from search import entity_table, original_snippet, search_query
+from paged_model import PagedTableModel, RelationDelegate
+from table_filter import Condition, build_where, describe as describe_filter, hit_sources_query
+import relation_cache
+import sqltrace
+from backup import BACKUP_KEEP, backup, describe as describe_backup
+from maintenance import enable_incremental_vacuum, run_maintenance, describe as describe_maintenance
 import re
-from docx import Document
-from word import extract_placeholders, replace_placeholders, process_related_tables_markers
 from datetime import datetime, timedelta
-import pandas as pd
 import random
 import string
+import time
+import importlib
+import sqlite3
+from pathlib import Path
+from collections import OrderedDict
+from typing import NamedTuple
+import logging
+import logs
+import profiling
+import metrics
+import sqlaudit
+from profiling import action
+
+log = logging.getLogger("ui")
+reports_log = logging.getLogger("reports")
+import_log = logging.getLogger("import")
 
 # Паттерн для функциональных маркеров: функция(аргумент)
 func_pattern = re.compile(r"^([a-zA-Zа-яА-Я_]+)\(([^)]+)\)$")
 
+# Модули, нужные только отчётам, импорту и Word: загружаются при первом
+# использовании или заранее в фоне через WARM_UP_DELAY_MS после показа окна
+# (WAGON_WARMUP=0 – не загружать заранее)
+WARM_UP_MODULES = ("pandas", "openpyxl", "docx", "word", "excel_import")
+WARM_UP_DELAY_MS = 1000
+
+# Обслуживание БД в простое: после MAINTENANCE_IDLE_MINUTES без действий
+# пользователя, не чаще раза в MAINTENANCE_INTERVAL_HOURS
+MAINTENANCE_IDLE_MINUTES = 10
+MAINTENANCE_INTERVAL_HOURS = 24
+
+# Моделей таблиц, из которых переключились, в памяти: возвращение к таблице,
+# в БД которой ничего не менялось, не перечитывает её (SQLiteEditor.load_table)
+MODEL_CACHE_SIZE = 4
+
+
+class CachedTable(NamedTuple):
+    """Модель таблицы, из которой переключились, и состояние её просмотра."""
+    model: PagedTableModel
+    version: tuple | None      # PagedTableModel.data_version() после select()
+    filter_conditions: list
+    filter_text: str
+    widths: list
+    scroll: tuple              # (по вертикали, по горизонтали)
+    row_count: str             # подпись числа строк, "" – не досчитано
+
+
+def report_snapshot(db, include_archive=False):
+    """
+    Снимок БД только для чтения для отчётов (см. connection.snapshot).
+
+    Отчёт работает на отдельном sqlite3-соединении с одной читающей транзакцией
+    и не видит правок, сделанных в редакторе во время его формирования.
+    """
+    db_path = db.databaseName()
+    prepare = (lambda conn: attach_archives(conn, db_path)) if include_archive else None
+    return snapshot(db_path, prepare=prepare)
+
 class DateDelegate(QStyledItemDelegate):
     def createEditor(self, parent, option, index):
         editor = QDateEdit(parent)
@@ -54,25 +118,222 @@ class DateDelegate(QStyledItemDelegate):
         value = editor.date().toString("yyyy-MM-dd")
         model.setData(index, value, Qt.EditRole)
 
-class ReadOnlyRelationalTableModel(QtSql.QSqlRelationalTableModel):
-    def __init__(self, parent=None, db=None, read_only_columns_by_name=None):
-        super().__init__(parent, db)
-        self.read_only_columns_by_name = read_only_columns_by_name if read_only_columns_by_name else []
+class TracedQuery(QtSql.QSqlQuery):
+    """
+    QSqlQuery с замером времени (см. sqltrace.py). Запрос SELECT учитывается,
+    когда строки прочитаны через next() до конца, запрос выполнен заново
+    или объект удалён.
+    """
+
+    def __init__(self, *args):
+        # TracedQuery("SELECT …", db) выполняет запрос сразу, как и QSqlQuery
+        sql = args[0] if args and isinstance(args[0], str) else None
+        super().__init__(*(args[1:] if sql is not None else args))
+        self._trace = None
+        if sql is not None:
+            self.exec_(sql)
+
+    def _trace_finish(self):
+        trace, self._trace = self._trace, None
+        if trace is not None:
+            sqltrace.record(*trace)
+
+    def exec_(self, *args):
+        self._trace_finish()
+        source = sqltrace.caller()
+        started = time.perf_counter()
+        ok = super().exec_(*args)
+        seconds = time.perf_counter() - started
+        sql = args[0] if args else self.lastQuery()
+        shape = sqltrace.param_shape(list(self.boundValues().values())) if not args else "()"
+        if ok and self.isSelect():
+            self._trace = [sql, shape, seconds, 0, source]
+        else:
+            sqltrace.record(sql, shape, seconds, max(self.numRowsAffected(), 0), source)
+        return ok
+
+    def next(self):
+        started = time.perf_counter()
+        has_row = super().next()
+        if self._trace is not None:
+            self._trace[2] += time.perf_counter() - started
+            if has_row:
+                self._trace[3] += 1
+            else:
+                self._trace_finish()
+        return has_row
+
+    def finish(self):
+        self._trace_finish()
+        super().finish()
 
-    def flags(self, index):
-        default_flags = super().flags(index)
-        if not index.isValid():
-            return default_flags
-        
-        col_name = self.record().fieldName(index.column())
-        if col_name in self.read_only_columns_by_name:
-            return default_flags & ~Qt.ItemIsEditable
-        return default_flags
+    def __del__(self):
+        try:
+            self._trace_finish()
+        except Exception:
+            pass
+
+class FirstPaintSpan(QObject):
+    """Спан «<класс окна>.first_paint»: от создания окна до первой отрисовки."""
+
+    def __init__(self, widget):
+        super().__init__(widget)
+        self.name = f"{type(widget).__name__}.first_paint"
+        self.started = time.perf_counter()
+        widget.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            metrics.record(self.name, time.perf_counter() - self.started)
+            obj.removeEventFilter(self)
+        return False
+
+
+def select_model(model, span_name):
+    """
+    model.select() со спаном metrics. Свой SELECT модель выполняет в обход
+    TracedQuery, поэтому он отдельно записывается в sqltrace – так его видят
+    вкладка «Диагностика» и sqlaudit.
+    """
+    started = time.perf_counter()
+    model.select()
+    seconds = time.perf_counter() - started
+    metrics.record(span_name, seconds)
+    # PagedTableModel читает через TracedQuery сам
+    if sqltrace.enabled and isinstance(model, QtSql.QSqlQueryModel):
+        sqltrace.record(model.query().lastQuery(), "()", seconds, model.rowCount())
+
+
+class BackupThread(QThread):
+    """Снимает резервную копию в фоне через отдельное sqlite3-соединение (см. backup.py)."""
+    progress = pyqtSignal(int, int)
+    done = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, db_path, keep, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.keep = keep
+
+    def run(self):
+        try:
+            result = backup(self.db_path, keep=self.keep, on_progress=self.progress.emit)
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.done.emit(result)
+
+class FillTestDataThread(QThread):
+    """Наполняет БД тест-данными в фоне (см. fill_test_data.py)."""
+    progress = pyqtSignal(str, int, int)
+    done = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, db_path, size, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.size = size
+
+    def run(self):
+        try:
+            counts = fill_test_data(self.db_path, self.size, on_progress=self.progress.emit)
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.done.emit(counts)
+
+class OpenDatabaseThread(QThread):
+    """Миграция схемы открываемой БД в фоне – окно не ждёт её (см. migrations.py)."""
+    done = pyqtSignal(str, object)
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, db_path, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+
+    def run(self):
+        try:
+            applied = migrate(self.db_path)
+        except Exception as e:
+            self.failed.emit(self.db_path, str(e))
+        else:
+            self.done.emit(self.db_path, applied)
+
+class RowCountThread(QThread):
+    """
+    Считает строки таблицы с фильтром (SELECT COUNT(*)) в фоне на снимке БД,
+    пока модель показывает первые окна. cancel() прерывает подсчёт.
+    """
+    done = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+
+    def __init__(self, generation, db_path, sql, params, span_name, parent=None):
+        super().__init__(parent)
+        self.generation = generation
+        self.db_path = db_path
+        self.sql = sql
+        self.params = params
+        self.span_name = span_name
+        self.conn = None
+
+    def cancel(self):
+        conn = self.conn
+        if conn is not None:
+            conn.interrupt()
+
+    def run(self):
+        try:
+            with metrics.span(self.span_name), snapshot(self.db_path) as conn:
+                self.conn = conn
+                count = conn.execute(self.sql, self.params).fetchone()[0]
+        except Exception as e:
+            self.failed.emit(self.generation, str(e))
+        else:
+            self.done.emit(self.generation, count)
+        finally:
+            self.conn = None
+
+class WarmUpThread(QThread):
+    """
+    Импортирует тяжёлые модули (pandas, python-docx, openpyxl) в фоне после
+    показа окна, чтобы первый отчёт или импорт не ждал их загрузки.
+    """
+
+    def run(self):
+        for name in WARM_UP_MODULES:
+            try:
+                importlib.import_module(name)
+            except ImportError as e:
+                log.warning("Модуль %s не загружен заранее: %s", name, e)
+
+class MaintenanceThread(QThread):
+    """Прогон обслуживания БД в фоне (см. maintenance.py)."""
+    done = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, db_path, full=False, switch_incremental=False, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.full = full
+        self.switch_incremental = switch_incremental
+
+    def run(self):
+        try:
+            if self.switch_incremental:
+                enable_incremental_vacuum(self.db_path)
+            result = run_maintenance(self.db_path, self.full)
+        except Exception as e:
+            self.failed.emit(str(e))
+        else:
+            self.done.emit(result)
 
 class AddWorkDialog(QDialog):
     def __init__(self, db, parent=None):
         super().__init__(parent)
+        FirstPaintSpan(self)
         self.db = db
+        # id добавленной записи – для обновления только её строки в таблице
+        self.new_id = None
         self.setWindowTitle("Добавление выполненной работы")
         self.setup_ui()
 
@@ -148,18 +409,20 @@ class AddWorkDialog(QDialog):
             # Reload services after management
             self.load_services()
 
+    @metrics.timed
     def load_contracts(self):
-        query = QtSql.QSqlQuery(self.db)
+        query = TracedQuery(self.db)
         query.exec_("SELECT id, номер FROM договоры ORDER BY номер")
         self.contract_combo.clear()
         while query.next():
             self.contract_combo.addItem(query.value(1), query.value(0))
 
+    @metrics.timed
     def load_services(self):
         contract_id = self.contract_combo.currentData()
         if not contract_id:
             return
-        query = QtSql.QSqlQuery(self.db)
+        query = TracedQuery(self.db)
         query.prepare("""
             SELECT у.id, у.наименование 
             FROM услуги у
@@ -168,9 +431,9 @@ class AddWorkDialog(QDialog):
         """)
         query.addBindValue(contract_id)
         success = query.exec_()
-        print(f"DEBUG: load_services query executed with success = {success}")
+        log.debug("load_services query executed with success = %s", success)
         if not success:
-            print(f"DEBUG: SQL Error: {query.lastError().text()}")
+            log.error("SQL Error: %s", query.lastError().text())
         
         # Count results for debugging
         count = 0
@@ -178,7 +441,7 @@ class AddWorkDialog(QDialog):
         while query.next():
             count += 1
             self.service_combo.addItem(query.value(1), query.value(0))
-        print(f"DEBUG: Found {count} services for contract_id = {contract_id}")
+        log.debug("Found %s services for contract_id = %s", count, contract_id)
         
         # If no services found, check if we need to add them
         if count == 0:
@@ -186,17 +449,17 @@ class AddWorkDialog(QDialog):
     
     def check_and_setup_contract_services(self, contract_id):
         # Check if the contract exists
-        contract_query = QtSql.QSqlQuery(self.db)
+        contract_query = TracedQuery(self.db)
         contract_query.prepare("SELECT номер FROM договоры WHERE id = ?")
         contract_query.addBindValue(contract_id)
         if not contract_query.exec_() or not contract_query.next():
-            print(f"DEBUG: Contract with id {contract_id} not found")
+            log.debug("Contract with id %s not found", contract_id)
             return
         
         contract_number = contract_query.value(0)
         
         # Check if any services exist at all
-        services_query = QtSql.QSqlQuery(self.db)
+        services_query = TracedQuery(self.db)
         services_query.exec_("SELECT COUNT(*) FROM услуги")
         if services_query.next() and services_query.value(0) == 0:
             QMessageBox.warning(self, "Нет услуг", 
@@ -210,13 +473,13 @@ class AddWorkDialog(QDialog):
         
         if reply == QMessageBox.Yes:
             # Get all available services
-            all_services_query = QtSql.QSqlQuery(self.db)
+            all_services_query = TracedQuery(self.db)
             all_services_query.exec_("SELECT id, наименование FROM услуги ORDER BY наименование")
             
             # Insert relationships in the договорные_услуги table
             self.db.transaction()
             try:
-                insert_query = QtSql.QSqlQuery(self.db)
+                insert_query = TracedQuery(self.db)
                 insert_query.prepare("""
                     INSERT INTO договорные_услуги (id_договора, id_услуги)
                     VALUES (?, ?)
@@ -230,7 +493,7 @@ class AddWorkDialog(QDialog):
                     if insert_query.exec_():
                         service_count += 1
                     else:
-                        print(f"DEBUG: Failed to insert contract-service relation: {insert_query.lastError().text()}")
+                        log.error("Failed to insert contract-service relation: %s", insert_query.lastError().text())
                 
                 if service_count > 0:
                     self.db.commit()
@@ -243,18 +506,20 @@ class AddWorkDialog(QDialog):
                     QMessageBox.warning(self, "Ошибка", "Не удалось добавить услуги")
             except Exception as e:
                 self.db.rollback()
-                print(f"DEBUG: Exception while adding services: {e}")
+                log.error("Exception while adding services: %s", e)
                 QMessageBox.critical(self, "Ошибка", f"Ошибка при добавлении услуг: {e}")
 
+    @metrics.timed
     def load_wagons(self):
-        query = QtSql.QSqlQuery(self.db)
+        query = TracedQuery(self.db)
         query.exec_("SELECT id, номер FROM вагоны ORDER BY номер")
         self.wagon_combo.clear()
         while query.next():
             self.wagon_combo.addItem(query.value(1), query.value(0))
 
+    @metrics.timed
     def load_workers(self):
-        query = QtSql.QSqlQuery(self.db)
+        query = TracedQuery(self.db)
         query.exec_("SELECT id, фио FROM исполнители ORDER BY фио")
         self.worker_combo.clear()
         while query.next():
@@ -278,7 +543,7 @@ class AddWorkDialog(QDialog):
             QMessageBox.warning(self, "Ошибка", "Выберите исполнителя")
             return
         
-        query = QtSql.QSqlQuery(self.db)
+        query = TracedQuery(self.db)
         query.prepare("""
             INSERT INTO выполненные_работы 
             (id_вагона, id_договора, id_услуги, id_исполнителя, 
@@ -291,14 +556,14 @@ class AddWorkDialog(QDialog):
         time_end = self.time_end.time().toString("HH:mm")
         
         # Debug output
-        print(f"DEBUG: Saving work with values:")
-        print(f"  id_вагона: {self.wagon_combo.currentData()} ({self.wagon_combo.currentText()})")
-        print(f"  id_договора: {self.contract_combo.currentData()} ({self.contract_combo.currentText()})")
-        print(f"  id_услуги: {self.service_combo.currentData()} ({self.service_combo.currentText()})")
-        print(f"  id_исполнителя: {self.worker_combo.currentData()} ({self.worker_combo.currentText()})")
-        print(f"  дата_начала: {date} {time_start}")
-        print(f"  дата_окончания: {date} {time_end}")
-        print(f"  подписант: {self.signer_edit.text()}")
+        log.debug("Saving work with values:")
+        log.debug("  id_вагона: %s (%s)", self.wagon_combo.currentData(), self.wagon_combo.currentText())
+        log.debug("  id_договора: %s (%s)", self.contract_combo.currentData(), self.contract_combo.currentText())
+        log.debug("  id_услуги: %s (%s)", self.service_combo.currentData(), self.service_combo.currentText())
+        log.debug("  id_исполнителя: %s (%s)", self.worker_combo.currentData(), self.worker_combo.currentText())
+        log.debug("  дата_начала: %s %s", date, time_start)
+        log.debug("  дата_окончания: %s %s", date, time_end)
+        log.debug("  подписант: %s", self.signer_edit.text())
         
         query.addBindValue(self.wagon_combo.currentData())
         query.addBindValue(self.contract_combo.currentData())
@@ -310,16 +575,18 @@ class AddWorkDialog(QDialog):
 
         success = query.exec_()
         if success:
+            self.new_id = query.lastInsertId()
             QMessageBox.information(self, "Успех", "Работа успешно добавлена")
             self.accept()
         else:
             error_text = query.lastError().text()
-            print(f"DEBUG: SQL Error: {error_text}")
+            log.error("SQL Error: %s", error_text)
             QMessageBox.critical(self, "Ошибка", f"Ошибка при добавлении работы: {error_text}")
 
 class WorkerPaymentDialog(QDialog):
     def __init__(self, db, parent=None):
         super().__init__(parent)
+        FirstPaintSpan(self)
         self.db = db
         self.setWindowTitle("Расчет оплаты работника")
         self.style().unpolish(QApplication.instance())
@@ -349,6 +616,12 @@ class WorkerPaymentDialog(QDialog):
         period_layout.addWidget(self.date_end)
         layout.addRow("Период:", period_layout)
 
+        # Разбивка итогов по неделям/месяцам
+        self.breakdown_combo = QComboBox()
+        for key, title in BREAKDOWNS.items():
+            self.breakdown_combo.addItem(title, key)
+        layout.addRow("Разбивка:", self.breakdown_combo)
+
         # Кнопка расчета
         calculate_btn = QPushButton("Рассчитать")
         calculate_btn.clicked.connect(self.calculate_payment)
@@ -376,6 +649,10 @@ class WorkerPaymentDialog(QDialog):
         self.total_label.setFont(font)
         layout.addRow(self.total_label)
 
+        # Суммы по интервалам разбивки
+        self.breakdown_label = QLabel("")
+        layout.addRow(self.breakdown_label)
+
     def edit_selected_record(self):
         selection = self.result_table.selectionModel()
         if not selection.hasSelection():
@@ -403,21 +680,24 @@ class WorkerPaymentDialog(QDialog):
             # После успешного редактирования обновляем отображение
             self.calculate_payment()  # Перезагружаем данные
     
+    @action("calculate_payment")
     def calculate_payment(self):
         worker_id = self.worker_combo.currentData()
         if not worker_id:
             return
 
-        start_date = self.date_start.date().toString("yyyy-MM-dd")
-        end_date = self.date_end.date().toString("yyyy-MM-dd")
+        start_date = self.date_start.date().toPyDate()
+        end_date = self.date_end.date().toPyDate()
+        # Полуинтервал по ts_начала: последний день периода входит целиком
+        start_ts, end_ts = period_bounds(start_date, end_date)
 
         # Создаем модель для отображения результатов
         # Replace QSqlQueryModel with QSqlTableModel to allow editing
         self.work_model = QtSql.QSqlTableModel(self, self.db)
         self.work_model.setTable("выполненные_работы")
-        self.work_model.setFilter(f"id_исполнителя = {worker_id} AND дата_начала_ BETWEEN '{start_date}' AND '{end_date}'")
+        self.work_model.setFilter(f"id_исполнителя = {int(worker_id)} AND ts_начала >= {start_ts} AND ts_начала < {end_ts}")
         self.work_model.setEditStrategy(QtSql.QSqlTableModel.OnFieldChange)
-        self.work_model.select()
+        select_model(self.work_model, "WorkerPaymentDialog.select")
         
         # Set headers for the editable model
         self.work_model.setHeaderData(0, Qt.Horizontal, "ID")
@@ -430,29 +710,31 @@ class WorkerPaymentDialog(QDialog):
         self.work_model.setHeaderData(7, Qt.Horizontal, "Подписант")
         
         self.result_table.setModel(self.work_model)
-        self.result_table.resizeColumnsToContents()
-
-        # Рассчитываем итоговую сумму
-        sum_query = QtSql.QSqlQuery(self.db)
-        sum_query.prepare("""
-            SELECT SUM(у.стоимость_без_ндс)
-            FROM выполненные_работы в
-            JOIN услуги у ON в.id_услуги = у.id
-            WHERE в.id_исполнителя = ? 
-            AND в.дата_начала_ BETWEEN ? AND ?
-        """)
-        sum_query.addBindValue(worker_id)
-        sum_query.addBindValue(start_date)
-        sum_query.addBindValue(end_date)
-        
+        with metrics.span("WorkerPaymentDialog.resizeColumnsToContents"):
+            self.result_table.resizeColumnsToContents()
+
+        # Рассчитываем итоговую сумму по снимку только для чтения: по интервалу
+        # разбивки – отдельный диапазон дней в своде свод_исполнитель_услуга_день
+        breakdown = self.breakdown_combo.currentData()
+        try:
+            with report_snapshot(self.db) as conn:
+                intervals = payroll_breakdown(conn, int(worker_id), start_date, end_date, breakdown)
+        except Exception as e:
+            reports_log.error("Ошибка расчета оплаты: %s", e)
+            intervals = []
+
         total = 0.0
-        if sum_query.exec_() and sum_query.next():
-            total = float(sum_query.value(0) or 0)
-        
+        lines = []
+        for label, works_count, amount in intervals:
+            total += float(amount or 0)
+            lines.append(f"{label}: работ {works_count}, {float(amount or 0):.2f} руб.")
+
+        self.breakdown_label.setText("\n".join(lines) if breakdown != "none" else "")
         self.total_label.setText(f"Итого: {total:.2f} руб.")
 
+    @metrics.timed
     def load_workers(self):
-        query = QtSql.QSqlQuery(self.db)
+        query = TracedQuery(self.db)
         query.exec_("SELECT id, фио FROM исполнители ORDER BY фио")
         self.worker_combo.clear()
         while query.next():
@@ -461,6 +743,7 @@ class WorkerPaymentDialog(QDialog):
 class ExcelReportDialog(QDialog):
     def __init__(self, db, parent=None):
         super().__init__(parent)
+        FirstPaintSpan(self)
         self.db = db
         self.setWindowTitle("Формирование Акта выполненных работ (Excel)")
         self.style().unpolish(QApplication.instance())
@@ -502,6 +785,10 @@ class ExcelReportDialog(QDialog):
         period_layout.addWidget(QLabel("по:"))
         period_layout.addWidget(self.date_end_edit)
         form_layout.addRow("Период акта:", period_layout)
+
+        # Работы закрытых периодов лежат в архивных файлах (см. archive.py)
+        self.include_archive_check = QCheckBox("Включая архив")
+        form_layout.addRow("", self.include_archive_check)
         
         layout.addLayout(form_layout)
         
@@ -561,10 +848,9 @@ class ExcelReportDialog(QDialog):
             return
             
         # Создаем и отображаем диалог редактирования
+        # Диалог пишет через setData модели, которая сама перечитывает правленую строку
         dialog = EditRecordDialog(model, row, self)
-        if dialog.exec_() == QDialog.Accepted:
-            # После успешного редактирования обновляем отображение
-            self.load_preview_data()
+        dialog.exec_()
     
     def load_preview_data(self):
         contract_id = self.contract_combo.currentData()
@@ -572,16 +858,16 @@ class ExcelReportDialog(QDialog):
             QMessageBox.warning(self, "Ошибка", "Выберите договор")
             return
             
-        # Create an editable model for preview
-        self.preview_model = QtSql.QSqlRelationalTableModel(self, self.db)
+        # Create an editable model for preview. Номера, услуги и ФИО берутся из
+        # общего кэша справочников (relation_cache), SELECT читает только работы договора
+        self.preview_model = PagedTableModel(self, self.db, query_class=TracedQuery)
         self.preview_model.setTable("выполненные_работы")
-        self.preview_model.setFilter(f"id_договора = {contract_id}")
+        self.preview_model.setFilter("t.id_договора = ?", [contract_id])
         self.preview_model.setRelation(1, QtSql.QSqlRelation("вагоны", "id", "номер"))
         self.preview_model.setRelation(2, QtSql.QSqlRelation("договоры", "id", "номер"))
         self.preview_model.setRelation(3, QtSql.QSqlRelation("услуги", "id", "наименование"))
         self.preview_model.setRelation(4, QtSql.QSqlRelation("исполнители", "id", "фио"))
-        self.preview_model.setEditStrategy(QtSql.QSqlTableModel.OnFieldChange)
-        self.preview_model.select()
+        select_model(self.preview_model, "ExcelReportDialog.select")
         
         # Set headers
         self.preview_model.setHeaderData(0, Qt.Horizontal, "ID")
@@ -594,17 +880,22 @@ class ExcelReportDialog(QDialog):
         self.preview_model.setHeaderData(7, Qt.Horizontal, "Подписант")
         
         self.preview_table.setModel(self.preview_model)
+        self.preview_table.setItemDelegate(RelationDelegate(self.preview_table))
         self.preview_table.hideColumn(0)  # Hide ID column
-        self.preview_table.resizeColumnsToContents()
+        with metrics.span("ExcelReportDialog.resizeColumnsToContents"):
+            self.preview_table.resizeColumnsToContents()
 
+    @metrics.timed
     def load_contracts(self):
-        query = QtSql.QSqlQuery(self.db)
+        query = TracedQuery(self.db)
         query.exec_("SELECT id, номер FROM договоры ORDER BY номер")
         self.contract_combo.clear()
         while query.next():
             self.contract_combo.addItem(query.value(1), query.value(0))
             
+    @action("generate_report")
     def generate_report(self):
+        import pandas as pd  # тяжёлый модуль – при первом отчёте (или WarmUpThread)
         try:
             # Получаем выбранные данные
             contract_id = self.contract_combo.currentData()
@@ -622,109 +913,25 @@ class ExcelReportDialog(QDialog):
             output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Отчеты")
             os.makedirs(output_dir, exist_ok=True)
             
-            # Получаем необработанные данные о выполненных работах и услугах по договору
-            query = QtSql.QSqlQuery(self.db)
-            
-            # Упрощенный запрос без агрегации и DISTINCT
-            # Добавляем фильтр по дате
-            sql = f"""
-                SELECT 
-                    у.id AS id_услуги,
-                    у.наименование AS наименование_услуги,
-                    у.стоимость_без_ндс AS стоимость_без_ндс,
-                    у.стоимость_с_ндс AS стоимость_с_ндс,
-                    в.номер AS номер_вагона
-                FROM 
-                    выполненные_работы вр
-                JOIN услуги у ON вр.id_услуги = у.id
-                JOIN вагоны в ON вр.id_вагона = в.id
-                WHERE 
-                    вр.id_договора = {contract_id}
-                    AND вр.дата_начала_ BETWEEN '{report_date_start}' AND '{report_date_end}'
-                ORDER BY 
-                    у.наименование, в.номер;
-            """
-            
-            print(f"Выполняется SQL запрос (без агрегации): {sql}")
-            
-            # --- Добавлено логирование --- 
-            print("DEBUG: Перед query.exec_(sql)")
-            
-            success = query.exec_(sql)
-            
-            # --- Добавлено логирование --- 
-            print(f"DEBUG: После query.exec_(sql). Успех: {success}")
-            
-            if not success:
-                # --- Добавлено логирование ошибки --- 
-                error_text = query.lastError().text()
-                print(f"DEBUG: Ошибка выполнения SQL: {error_text}")
-                QMessageBox.critical(self, "Ошибка", f"Ошибка при получении данных: {error_text}")
+            # Строки акта читаются из снимка только для чтения: отчёт видит
+            # согласованное состояние БД и не занимает соединение редактора
+            include_archive = self.include_archive_check.isChecked()
+            source = ARCHIVE_VIEW if include_archive else "выполненные_работы"
+            try:
+                with report_snapshot(self.db, include_archive) as conn:
+                    rows = act_rows(conn, int(contract_id), self.date_start_edit.date().toPyDate(),
+                                    self.date_end_edit.date().toPyDate(), source)
+            except Exception as e:
+                reports_log.error("Ошибка выполнения SQL: %s", e)
+                QMessageBox.critical(self, "Ошибка", f"Ошибка при получении данных: {e}")
                 return
-                
-            # --- Добавлено логирование --- 
-            print("DEBUG: SQL выполнен успешно, начинаем сбор данных.")
-            
-            # Собираем данные в список словарей
-            raw_data = []
-            while query.next():
-                raw_data.append({
-                    "id_услуги": query.value(0),
-                    "Наименование услуги": query.value(1),
-                    "Стоимость за ед. без НДС": float(query.value(2) or 0),
-                    "Стоимость за ед. с НДС": float(query.value(3) or 0),
-                    "Номер вагона": query.value(4)
-                })
-            
-            if not raw_data:
+
+            # Группировка по услугам и итоговая строка – reports.act_frame
+            df = act_frame(rows)
+            if df is None:
                 QMessageBox.warning(self, "Предупреждение", "Нет данных о выполненных работах по выбранному договору")
                 return
-                
-            # Создаем DataFrame из необработанных данных
-            raw_df = pd.DataFrame(raw_data)
-            
-            # Выполняем агрегацию с помощью pandas
-            grouped = raw_df.groupby([
-                'id_услуги', 
-                'Наименование услуги', 
-                'Стоимость за ед. без НДС', 
-                'Стоимость за ед. с НДС'
-            ])
-            
-            # Считаем количество уникальных вагонов и собираем их номера
-            aggregated_data = grouped['Номер вагона'].agg(
-                Количество='nunique', 
-                Номера_вагонов=lambda x: ', '.join(x.unique())
-            ).reset_index()
-            
-            # Переименовываем колонку для соответствия отчету
-            aggregated_data.rename(columns={'Номера_вагонов': 'Номера вагонов'}, inplace=True)
-            
-            # Вычисляем итоговые суммы для каждой услуги
-            aggregated_data['Итого без НДС'] = aggregated_data['Стоимость за ед. без НДС'] * aggregated_data['Количество']
-            aggregated_data['Итого с НДС'] = aggregated_data['Стоимость за ед. с НДС'] * aggregated_data['Количество']
-            
-            # Убираем id_услуги, так как он не нужен в финальном отчете
-            df = aggregated_data.drop(columns=['id_услуги'])
-            
-            # Вычисляем общие итоговые суммы
-            total_without_vat = df['Итого без НДС'].sum()
-            total_with_vat = df['Итого с НДС'].sum()
-            
-            # Добавляем строку с итоговой суммой
-            summary_row = pd.DataFrame([{
-                "Наименование услуги": "ИТОГО:",
-                "Стоимость за ед. без НДС": "",
-                "Стоимость за ед. с НДС": "",
-                "Количество": "",
-                "Номера вагонов": "",
-                "Итого без НДС": total_without_vat,
-                "Итого с НДС": total_with_vat
-            }])
-            
-            # Объединяем основной DataFrame с итоговой строкой
-            df = pd.concat([df, summary_row], ignore_index=True)
-            
+
             # Предлагаем пользователю выбрать место сохранения и имя файла
             default_filename = f"Акт_{contract_number.replace('.', '_')}_{report_date_start}_по_{report_date_end}_{act_number}.xlsx"
             file_path, _ = QFileDialog.getSaveFileName(
@@ -742,7 +949,7 @@ class ExcelReportDialog(QDialog):
                 file_path += '.xlsx'
             
             # Записываем в Excel
-            with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
+            with metrics.span("ExcelReportDialog.save"), pd.ExcelWriter(file_path, engine='openpyxl') as writer:
                 df.to_excel(writer, sheet_name='Акт выполненных работ', index=False)
                 
                 # Получаем рабочий лист для форматирования
@@ -769,6 +976,7 @@ class ExcelReportDialog(QDialog):
 class ContractReportDialog(QDialog):
     def __init__(self, db, parent=None):
         super().__init__(parent)
+        FirstPaintSpan(self)
         self.db = db
         self.setWindowTitle("Формирование Выписки по договорам (Excel)")
         self.style().unpolish(QApplication.instance())
@@ -784,6 +992,9 @@ class ContractReportDialog(QDialog):
         self.contract_combo = QComboBox()
         self.load_contracts()
         contract_layout.addRow("Выберите договор:", self.contract_combo)
+        # Работы закрытых периодов лежат в архивных файлах (см. archive.py)
+        self.include_archive_check = QCheckBox("Включая архив")
+        contract_layout.addRow("", self.include_archive_check)
         layout.addLayout(contract_layout)
         
         # Add table view to preview and edit data
@@ -842,10 +1053,9 @@ class ContractReportDialog(QDialog):
             return
             
         # Создаем и отображаем диалог редактирования
+        # Диалог пишет через setData модели, которая сама перечитывает правленую строку
         dialog = EditRecordDialog(model, row, self)
-        if dialog.exec_() == QDialog.Accepted:
-            # После успешного редактирования обновляем отображение
-            self.load_preview_data()
+        dialog.exec_()
         
     def load_preview_data(self):
         contract_id = self.contract_combo.currentData()
@@ -853,16 +1063,16 @@ class ContractReportDialog(QDialog):
             QMessageBox.warning(self, "Ошибка", "Выберите договор")
             return
             
-        # Create an editable model for preview
-        self.preview_model = QtSql.QSqlRelationalTableModel(self, self.db)
+        # Create an editable model for preview. Номера, услуги и ФИО берутся из
+        # общего кэша справочников (relation_cache), SELECT читает только работы договора
+        self.preview_model = PagedTableModel(self, self.db, query_class=TracedQuery)
         self.preview_model.setTable("выполненные_работы")
-        self.preview_model.setFilter(f"id_договора = {contract_id}")
+        self.preview_model.setFilter("t.id_договора = ?", [contract_id])
         self.preview_model.setRelation(1, QtSql.QSqlRelation("вагоны", "id", "номер"))
         self.preview_model.setRelation(2, QtSql.QSqlRelation("договоры", "id", "номер"))
         self.preview_model.setRelation(3, QtSql.QSqlRelation("услуги", "id", "наименование"))
         self.preview_model.setRelation(4, QtSql.QSqlRelation("исполнители", "id", "фио"))
-        self.preview_model.setEditStrategy(QtSql.QSqlTableModel.OnFieldChange)
-        self.preview_model.select()
+        select_model(self.preview_model, "ContractReportDialog.select")
         
         # Set headers
         self.preview_model.setHeaderData(0, Qt.Horizontal, "ID")
@@ -875,17 +1085,22 @@ class ContractReportDialog(QDialog):
         self.preview_model.setHeaderData(7, Qt.Horizontal, "Подписант")
         
         self.preview_table.setModel(self.preview_model)
+        self.preview_table.setItemDelegate(RelationDelegate(self.preview_table))
         self.preview_table.hideColumn(0)  # Hide ID column
-        self.preview_table.resizeColumnsToContents()
+        with metrics.span("ContractReportDialog.resizeColumnsToContents"):
+            self.preview_table.resizeColumnsToContents()
 
+    @metrics.timed
     def load_contracts(self):
-        query = QtSql.QSqlQuery(self.db)
+        query = TracedQuery(self.db)
         query.exec_("SELECT id, номер FROM договоры ORDER BY номер")
         self.contract_combo.clear()
         while query.next():
             self.contract_combo.addItem(query.value(1), query.value(0))
             
+    @action("generate_report")
     def generate_report(self):
+        import pandas as pd  # тяжёлый модуль – при первом отчёте (или WarmUpThread)
         try:
             # Получаем выбранный договор
             contract_id = self.contract_combo.currentData()
@@ -899,114 +1114,31 @@ class ContractReportDialog(QDialog):
             output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Отчеты")
             os.makedirs(output_dir, exist_ok=True)
             
-            # Получаем список услуг по договору и статистику по ним
-            query = QtSql.QSqlQuery(self.db)
-            
-            # Упрощенный запрос без агрегации и DISTINCT
-            sql = f"""
-                SELECT 
-                    у.id AS id_услуги,
-                    у.наименование AS наименование_услуги,
-                    у.стоимость_без_ндс AS стоимость_без_ндс,
-                    у.стоимость_с_ндс AS стоимость_с_ндс,
-                    в.номер AS номер_вагона
-                FROM 
-                    выполненные_работы вр
-                JOIN услуги у ON вр.id_услуги = у.id
-                JOIN вагоны в ON вр.id_вагона = в.id
-                WHERE 
-                    вр.id_договора = {contract_id}
-                ORDER BY 
-                    у.наименование, в.номер;
-            """
-            
-            print(f"Выполняется SQL запрос (без агрегации): {sql}")
-            
-            # --- Добавлено логирование --- 
-            print("DEBUG: Перед query.exec_(sql)")
-            
-            success = query.exec_(sql)
-            
-            # --- Добавлено логирование --- 
-            print(f"DEBUG: После query.exec_(sql). Успех: {success}")
-            
-            if not success:
-                # --- Добавлено логирование ошибки --- 
-                error_text = query.lastError().text()
-                print(f"DEBUG: Ошибка выполнения SQL: {error_text}")
-                QMessageBox.critical(self, "Ошибка", f"Ошибка при получении данных: {error_text}")
+            # Статистика по услугам договора читается из снимка только для чтения.
+            # Без архива – из свода свод_договор_услуга_вагон (строк столько, сколько
+            # услуг); своды описывают только рабочий файл, поэтому с архивом – по сырым работам
+            include_archive = self.include_archive_check.isChecked()
+            try:
+                with report_snapshot(self.db, include_archive) as conn:
+                    services = contract_services(conn, int(contract_id),
+                                                 ARCHIVE_VIEW if include_archive else None)
+            except Exception as e:
+                reports_log.error("Ошибка выполнения SQL: %s", e)
+                QMessageBox.critical(self, "Ошибка", f"Ошибка при получении данных: {e}")
                 return
-                
-            # --- Добавлено логирование --- 
-            print("DEBUG: SQL выполнен успешно, начинаем сбор данных.")
-            
-            # Собираем данные в список словарей
-            raw_data = []
-            while query.next():
-                raw_data.append({
-                    "id_услуги": query.value(0),
-                    "Наименование услуги": query.value(1),
-                    "Стоимость за ед. без НДС": float(query.value(2) or 0),
-                    "Стоимость за ед. с НДС": float(query.value(3) or 0),
-                    "Номер вагона": query.value(4)
-                })
-            
-            if not raw_data:
+
+            df = contract_frame(services)
+            if df is None:
                 QMessageBox.warning(self, "Предупреждение", "Нет данных о выполненных работах по выбранному договору")
                 return
-                
-            # Создаем DataFrame из необработанных данных
-            raw_df = pd.DataFrame(raw_data)
-            
-            # Выполняем агрегацию с помощью pandas
-            grouped = raw_df.groupby([
-                'id_услуги', 
-                'Наименование услуги', 
-                'Стоимость за ед. без НДС', 
-                'Стоимость за ед. с НДС'
-            ])
-            
-            # Считаем количество уникальных вагонов и собираем их номера
-            aggregated_data = grouped['Номер вагона'].agg(
-                Количество='nunique', 
-                Номера_вагонов=lambda x: ', '.join(x.unique())
-            ).reset_index()
-            
-            # Переименовываем колонку для соответствия отчету
-            aggregated_data.rename(columns={'Номера_вагонов': 'Номера вагонов'}, inplace=True)
-            
-            # Вычисляем итоговые суммы для каждой услуги
-            aggregated_data['Итого без НДС'] = aggregated_data['Стоимость за ед. без НДС'] * aggregated_data['Количество']
-            aggregated_data['Итого с НДС'] = aggregated_data['Стоимость за ед. с НДС'] * aggregated_data['Количество']
-            
-            # Убираем id_услуги, так как он не нужен в финальном отчете
-            df = aggregated_data.drop(columns=['id_услуги'])
-            
-            # Вычисляем общие итоговые суммы
-            total_without_vat = df['Итого без НДС'].sum()
-            total_with_vat = df['Итого с НДС'].sum()
-            
-            # Добавляем строку с итоговой суммой
-            summary_row = pd.DataFrame([{
-                "Наименование услуги": "ИТОГО:",
-                "Стоимость за ед. без НДС": "",
-                "Стоимость за ед. с НДС": "",
-                "Количество": "",
-                "Номера вагонов": "",
-                "Итого без НДС": total_without_vat,
-                "Итого с НДС": total_with_vat
-            }])
-            
-            # Объединяем основной DataFrame с итоговой строкой
-            df = pd.concat([df, summary_row], ignore_index=True)
-            
+
             # Формируем имя файла
             current_date = datetime.now().strftime("%Y-%m-%d")
             filename = f"Отчет_по_договору_{contract_number.replace('.', '_')}_{current_date}.xlsx"
             file_path = os.path.join(output_dir, filename)
             
             # Записываем в Excel
-            with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
+            with metrics.span("ContractReportDialog.save"), pd.ExcelWriter(file_path, engine='openpyxl') as writer:
                 df.to_excel(writer, sheet_name='Отчет по договору', index=False)
                 
                 # Получаем рабочий лист для форматирования
@@ -1030,6 +1162,7 @@ class ContractReportDialog(QDialog):
 class ManageOwnersDialog(QDialog):
     def __init__(self, settings, parent=None):
         super().__init__(parent)
+        FirstPaintSpan(self)
         self.settings = settings
         self.setWindowTitle("Управление списком собственников")
         self.setup_ui()
@@ -1062,6 +1195,7 @@ class ManageOwnersDialog(QDialog):
         buttons_layout.addWidget(close_btn)
         layout.addLayout(buttons_layout)
 
+    @metrics.timed
     def load_owners(self):
         owners = self.settings.value("owners", ["ДОСС", "ФПК", "Гранд Экспресс"], type=list)
         self.owners_list.clear()
@@ -1097,6 +1231,7 @@ class ManageOwnersDialog(QDialog):
 class ManageDivisionsDialog(QDialog):
     def __init__(self, settings, parent=None):
         super().__init__(parent)
+        FirstPaintSpan(self)
         self.settings = settings
         self.setWindowTitle("Управление списком подразделений")
         self.setup_ui()
@@ -1129,6 +1264,7 @@ class ManageDivisionsDialog(QDialog):
         buttons_layout.addWidget(close_btn)
         layout.addLayout(buttons_layout)
 
+    @metrics.timed
     def load_divisions(self):
         divisions = self.settings.value("divisions", ["ЛВЧ-1", "ЛВЧ-2", "ЛВЧД-1", "ЛВЧД-2"], type=list)
         self.divisions_list.clear()
@@ -1164,6 +1300,7 @@ class ManageDivisionsDialog(QDialog):
 class ManageRepairTypesDialog(QDialog):
     def __init__(self, settings, parent=None):
         super().__init__(parent)
+        FirstPaintSpan(self)
         self.settings = settings
         self.setWindowTitle("Управление типами ремонта")
         self.setup_ui()
@@ -1192,6 +1329,7 @@ class ManageRepairTypesDialog(QDialog):
         buttons_layout.addWidget(cancel_btn)
         layout.addLayout(buttons_layout)
 
+    @metrics.timed
     def load_repair_types(self):
         repair_types = self.settings.value("repair_types", ["КР", "КР1", "КВР", "КР1"], type=list)
         self.repair_type1.setText(repair_types[0] if len(repair_types) > 0 else "КР")
@@ -1212,7 +1350,9 @@ class ManageRepairTypesDialog(QDialog):
 class AddWagonDialog(QDialog):
     def __init__(self, db, parent=None):
         super().__init__(parent)
+        FirstPaintSpan(self)
         self.db = db
+        self.new_id = None
         self.settings = QSettings("MyCompany", "WagonApp")
         self.setWindowTitle("Добавление вагона")
         # Store references to the label widgets for repair dates for easier updating
@@ -1336,6 +1476,7 @@ class AddWagonDialog(QDialog):
             # Обновляем метки полей дат в основном layout
             self.update_repair_date_labels() # This will now update existing labels or re-create if needed
 
+    @metrics.timed
     def load_owners(self):
         owners = self.settings.value("owners", ["ДОСС", "ФПК", "Гранд Экспресс"], type=list)
         self.owner_combo.clear()
@@ -1343,6 +1484,7 @@ class AddWagonDialog(QDialog):
         self.owner_combo.insertItem(0, "")
         self.owner_combo.setCurrentIndex(0)
 
+    @metrics.timed
     def load_divisions(self):
         divisions = self.settings.value("divisions", ["ЛВЧ-1", "ЛВЧ-2", "ЛВЧД-1", "ЛВЧД-2"], type=list)
         self.division_combo.clear()
@@ -1374,7 +1516,7 @@ class AddWagonDialog(QDialog):
             QMessageBox.warning(self, "Ошибка", "Номер вагона обязателен для заполнения")
             return
 
-        query = QtSql.QSqlQuery(self.db)
+        query = TracedQuery(self.db)
         sql_statement = """
             INSERT INTO вагоны (номер, собственник, подразделение, дата_кр, дата_кр1, дата_квр, дата_др)
             VALUES (?, ?, ?, ?, ?, ?, ?)
@@ -1389,33 +1531,28 @@ class AddWagonDialog(QDialog):
         query.addBindValue(self.owner_combo.currentText())
         query.addBindValue(self.division_combo.currentText())
         
-        print(f"Перед связыванием дат, количество элементов в self.repair_dates: {len(self.repair_dates)}") # DEBUG PRINT
+        log.debug("Перед связыванием дат, количество элементов в self.repair_dates: %s", len(self.repair_dates))
         if len(self.repair_dates) != 4:
             QMessageBox.critical(self, "Ошибка данных", 
                                  f"Внутренняя ошибка: ожидалось 4 элемента для дат ремонта, найдено {len(self.repair_dates)}.")
             return
 
-        print("Сохранение дат ремонта:") # DEBUG PRINT
+        log.debug("Сохранение дат ремонта:")
         current_repair_types = self.settings.value("repair_types", ["КР", "КР1", "КВР", "ДР"], type=list)
         for i, (date_edit, _) in enumerate(self.repair_dates):
             date = date_edit.date()
             value_to_bind = None if self.is_date_empty(date) else date.toString("yyyy-MM-dd")
             query.addBindValue(value_to_bind)
             repair_type_name = current_repair_types[i] if i < len(current_repair_types) else f"Тип {i+1}"
-            print(f"  Дата {i+1} ({repair_type_name}): {value_to_bind}") # DEBUG PRINT
-
+            log.debug("  Дата %s (%s): %s", i+1, repair_type_name, value_to_bind)
         if query.exec_():
+            # id только что добавленного вагона – без отдельного SELECT MAX(id)
+            self.new_id = query.lastInsertId()
             QMessageBox.information(self, "Успех", "Вагон успешно добавлен")
             # Регистрируем undo
             parent = self.parent()
             if parent and hasattr(parent, 'register_undo_add'):
-                # Получаем id только что добавленного вагона
-                last_id = None
-                q = QtSql.QSqlQuery(self.db)
-                q.exec_("SELECT MAX(id) FROM вагоны")
-                if q.next():
-                    last_id = q.value(0)
-                parent.register_undo_add("вагоны", last_id)
+                parent.register_undo_add("вагоны", self.new_id)
             self.accept()
         else:
             QMessageBox.critical(self, "Ошибка при добавлении вагона", 
@@ -1433,15 +1570,35 @@ class SQLiteEditor(QWidget):
 
     def __init__(self):
         super().__init__()
+        FirstPaintSpan(self)
         self.db = None
         self.model = None
         self.settings = QSettings("MyCompany", "WagonApp")
         # Track last operation for undo
         self.last_operation = None
         self.last_operation_data = None
+        self.backup_thread = None
+        self.backup_progress = None
+        self.maintenance_thread = None
+        self.fill_thread = None
+        self.open_thread = None
+        self.warm_up_thread = None
+        self.row_count_thread = None
+        self.row_count_generation = 0
+        # Условия панели фильтра текущей таблицы (см. table_filter.py)
+        self.filter_conditions = []
+        # Модели таблиц, из которых переключились: имя таблицы → CachedTable
+        self.table_models = OrderedDict()
+        self.model_version = None
+        self.last_activity = time.monotonic()
         self.init_ui()
         self.apply_styles()
-        self.load_last_database()
+        # Последняя БД открывается после показа окна
+        QTimer.singleShot(0, self.load_last_database)
+        if os.environ.get("WAGON_WARMUP", "1") != "0":
+            QTimer.singleShot(WARM_UP_DELAY_MS, self.warm_up_modules)
+        self.apply_backup_schedule()
+        QApplication.instance().installEventFilter(self)
 
     def apply_styles(self):
         app = QApplication.instance()
@@ -1620,6 +1777,34 @@ class SQLiteEditor(QWidget):
         delete_db_btn.clicked.connect(self.delete_database)
         db_buttons_layout.addWidget(delete_db_btn, 1, 1)
 
+        # Третий ряд – резервное копирование
+        self.backup_btn = QPushButton("Резервная копия")
+        self.backup_btn.setToolTip("Снять копию БД без остановки работы (папка «Резервные копии» рядом с БД)")
+        self.backup_btn.clicked.connect(lambda: self.backup_database())
+        self.backup_btn.setEnabled(False)
+        db_buttons_layout.addWidget(self.backup_btn, 2, 0)
+
+        self.backup_schedule_btn = QPushButton("Расписание копий")
+        self.backup_schedule_btn.setToolTip("Настроить автоматические резервные копии и число хранимых снимков")
+        self.backup_schedule_btn.clicked.connect(self.configure_backup_schedule)
+        db_buttons_layout.addWidget(self.backup_schedule_btn, 2, 1)
+
+        self.backup_timer = QTimer(self)
+        self.backup_timer.timeout.connect(lambda: self.backup_database(scheduled=True))
+
+        # Четвёртый ряд – обслуживание
+        self.maintenance_btn = QPushButton("Обслуживание БД")
+        self.maintenance_btn.setToolTip("ANALYZE, возврат свободного места и проверка целостности. "
+                                        "Журнал – файл <БД>_обслуживание.log рядом с БД")
+        self.maintenance_btn.clicked.connect(lambda: self.maintain_database())
+        self.maintenance_btn.setEnabled(False)
+        db_buttons_layout.addWidget(self.maintenance_btn, 3, 0, 1, 2)
+
+        # Короткий прогон в простое: не чаще раза в MAINTENANCE_INTERVAL_HOURS
+        self.maintenance_timer = QTimer(self)
+        self.maintenance_timer.timeout.connect(self.maintain_if_idle)
+        self.maintenance_timer.start(60 * 1000)
+
         # Добавляем кнопки DB в основной layout
         main_layout.addLayout(db_buttons_layout)
         
@@ -1681,6 +1866,31 @@ class SQLiteEditor(QWidget):
         self.table_combo.currentIndexChanged.connect(self.load_table)
         left_panel_layout.addWidget(self.table_combo)
 
+        # Глобальный поиск по вагонам, договорам, услугам и исполнителям (см. search.py)
+        search_label = QLabel("Поиск:")
+        left_panel_layout.addWidget(search_label)
+
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Вагон, договор, услуга, исполнитель…")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.setEnabled(False)
+        left_panel_layout.addWidget(self.search_edit)
+
+        # Поиск запускается после паузы в наборе, а не на каждую букву
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(200)
+        self.search_timer.timeout.connect(self.run_search)
+        self.search_edit.textChanged.connect(lambda _text: self.search_timer.start())
+        self.search_edit.returnPressed.connect(self.run_search)
+
+        self.search_results = QtWidgets.QListWidget()
+        self.search_results.setMaximumHeight(200)
+        self.search_results.setVisible(False)
+        self.search_results.itemClicked.connect(self.open_search_hit)
+        self.search_results.itemActivated.connect(self.open_search_hit)
+        left_panel_layout.addWidget(self.search_results)
+
         left_panel_layout.addSpacerItem(QSpacerItem(20, 20, QSizePolicy.Minimum, QSizePolicy.Fixed))
 
         record_control_label = QLabel("Управление записями:")
@@ -1739,6 +1949,51 @@ class SQLiteEditor(QWidget):
         right_panel_layout = QVBoxLayout(right_panel_widget)
         right_panel_layout.setContentsMargins(5, 0, 0, 0)
 
+        # Панель фильтра: быстрый поиск и условия по колонкам → WHERE модели (см. table_filter.py)
+        filter_layout = QHBoxLayout()
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("Быстрый поиск в таблице…")
+        self.filter_edit.setClearButtonEnabled(True)
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(300)
+        self.filter_timer.timeout.connect(self.apply_filter)
+        self.filter_edit.textChanged.connect(lambda _text: self.filter_timer.start())
+        self.filter_edit.returnPressed.connect(self.apply_filter)
+        filter_layout.addWidget(self.filter_edit, 2)
+
+        self.filter_column_combo = QComboBox()
+        self.filter_column_combo.setToolTip("Колонка условия")
+        filter_layout.addWidget(self.filter_column_combo, 1)
+
+        self.filter_value_edit = QLineEdit()
+        self.filter_value_edit.setPlaceholderText("024-06064, 024-06*, 100..200, 05.2025")
+        self.filter_value_edit.setToolTip(
+            "Равно: 024-06064\n"
+            "Начинается с: 024-06*\n"
+            "Диапазон: 100..200, 100.., ..200\n"
+            "Даты: 03.05.2025 (день), 05.2025 (месяц), 01.05.2025..15.05.2025")
+        self.filter_value_edit.returnPressed.connect(self.add_filter_condition)
+        filter_layout.addWidget(self.filter_value_edit, 2)
+
+        self.add_filter_btn = QPushButton("Добавить условие")
+        self.add_filter_btn.clicked.connect(self.add_filter_condition)
+        filter_layout.addWidget(self.add_filter_btn)
+
+        self.clear_filter_btn = QPushButton("Сбросить")
+        self.clear_filter_btn.setToolTip("Убрать все условия и быстрый поиск")
+        self.clear_filter_btn.clicked.connect(self.clear_filter)
+        filter_layout.addWidget(self.clear_filter_btn)
+        right_panel_layout.addLayout(filter_layout)
+
+        filter_status_layout = QHBoxLayout()
+        self.filter_label = QLabel("")
+        self.filter_label.setWordWrap(True)
+        filter_status_layout.addWidget(self.filter_label, 1)
+        self.row_count_label = QLabel("")
+        filter_status_layout.addWidget(self.row_count_label)
+        right_panel_layout.addLayout(filter_status_layout)
+
         self.table_view = QTableView()
         self.table_view.setSortingEnabled(True)
         self.table_view.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
@@ -1755,13 +2010,125 @@ class SQLiteEditor(QWidget):
 
         data_tab_layout.addWidget(splitter)
 
+        self.init_diagnostics_tab()
+
+    def init_diagnostics_tab(self):
+        """Вкладка «Диагностика»: самые затратные SQL-запросы сеанса (см. sqltrace.py)."""
+        self.diagnostics_tab = QWidget()
+        self.tab_widget.addTab(self.diagnostics_tab, "Диагностика")
+        layout = QVBoxLayout(self.diagnostics_tab)
+        layout.setContentsMargins(5, 10, 5, 5)
+
+        controls = QHBoxLayout()
+        self.diagnostics_order_combo = QComboBox()
+        for order, title in (("seconds", "по общему времени"), ("max_seconds", "по максимальному времени"),
+                             ("calls", "по числу вызовов"), ("rows", "по числу строк")):
+            self.diagnostics_order_combo.addItem(title, order)
+        self.diagnostics_order_combo.currentIndexChanged.connect(self.refresh_diagnostics)
+        controls.addWidget(QLabel("Запросы"))
+        controls.addWidget(self.diagnostics_order_combo)
+        controls.addStretch()
+        refresh_btn = QPushButton("Обновить")
+        refresh_btn.clicked.connect(self.refresh_diagnostics)
+        controls.addWidget(refresh_btn)
+        reset_btn = QPushButton("Сбросить")
+        reset_btn.setToolTip("Обнулить накопленную статистику запросов")
+        reset_btn.clicked.connect(lambda: (sqltrace.reset(), self.refresh_diagnostics()))
+        controls.addWidget(reset_btn)
+        self.debug_log_check = QCheckBox("Подробный журнал (DEBUG)")
+        self.debug_log_check.setToolTip("Писать в журнал построчную трассировку импорта, Word и отчётов")
+        self.debug_log_check.setChecked(logs.is_debug())
+        self.debug_log_check.toggled.connect(logs.set_debug)
+        controls.addWidget(self.debug_log_check)
+        self.profile_check = QCheckBox("Профилировать действия")
+        self.profile_check.setToolTip(
+            "Отчёты, заполнение Word, импорт, открытие таблиц и расчёт оплаты выполняются под "
+            "cProfile и tracemalloc; профили и сводки сохраняются в папку «Диагностика» рядом с БД")
+        self.profile_check.setChecked(profiling.enabled)
+        self.profile_check.toggled.connect(self.toggle_profiling)
+        controls.addWidget(self.profile_check)
+        audit_btn = QPushButton("Планы запросов")
+        audit_btn.setToolTip("EXPLAIN QUERY PLAN для всех запросов сеанса: полные просмотры и временные сортировки")
+        audit_btn.clicked.connect(self.audit_query_plans)
+        controls.addWidget(audit_btn)
+        layout.addLayout(controls)
+
+        self.diagnostics_table = QTableWidget(0, 7)
+        self.diagnostics_table.setHorizontalHeaderLabels(
+            ["Запрос", "Вызовов", "Всего, мс", "Среднее, мс", "Макс., мс", "Строк", "Откуда"])
+        self.diagnostics_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.diagnostics_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.diagnostics_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        layout.addWidget(self.diagnostics_table)
+
+        self.diagnostics_label = QLabel()
+        self.diagnostics_label.setWordWrap(True)
+        layout.addWidget(self.diagnostics_label)
+
+        self.tab_widget.currentChanged.connect(
+            lambda index: self.refresh_diagnostics() if self.tab_widget.widget(index) is self.diagnostics_tab else None)
+
+    def audit_query_plans(self):
+        if not self.db or not self.db.isOpen():
+            QMessageBox.warning(self, "Планы запросов", "Откройте базу данных")
+            return
+        db_path = Path(self.db.databaseName())
+        try:
+            conn = sqlaudit._open_read_only(db_path)
+            try:
+                results = sqlaudit.audit(conn, sqlaudit.session_statements())
+            finally:
+                conn.close()
+            report = sqlaudit.describe(results, sqlaudit.load_baseline(sqlaudit.BASELINE_FILE))
+            profiling.folder.mkdir(parents=True, exist_ok=True)
+            report_path = profiling.folder / f"{datetime.now():%Y%m%d_%H%M%S}_планы_запросов.txt"
+            report_path.write_text(report, encoding="utf-8")
+        except (sqlite3.Error, OSError) as e:
+            QMessageBox.critical(self, "Планы запросов", f"Не удалось проверить планы запросов: {e}")
+            return
+        big_scans = sum(1 for r in results for f in r.findings if f.kind == "SCAN" and f.big)
+        QMessageBox.information(self, "Планы запросов",
+                                f"Проверено запросов: {len(results)}\n"
+                                f"Полных просмотров больших таблиц: {big_scans}\n\n"
+                                f"Отчёт: {report_path}")
+
+    def toggle_profiling(self, checked):
+        profiling.set_enabled(checked)
+        self.refresh_diagnostics()
+
+    def refresh_diagnostics(self):
+        stats = sqltrace.top(200, self.diagnostics_order_combo.currentData() or "seconds")
+        self.diagnostics_table.setRowCount(len(stats))
+        for row, item in enumerate(stats):
+            values = [item.sql, item.calls, f"{item.seconds * 1000:.1f}", f"{item.avg_ms:.2f}",
+                      f"{item.max_seconds * 1000:.1f}", item.rows, ", ".join(item.callers[:3])]
+            for column, value in enumerate(values):
+                cell = QTableWidgetItem(str(value))
+                if column in (1, 2, 3, 4, 5):
+                    cell.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                if column == 0:
+                    cell.setToolTip(f"{item.sql}\n\nПараметры: {'; '.join(item.shapes)}")
+                self.diagnostics_table.setItem(row, column, cell)
+        slow_file = next((h.baseFilename for h in sqltrace.slow_log.handlers), None)
+        text = (f"Запросы дольше {sqltrace.SLOW_QUERY_MS} мс пишутся в журнал: {slow_file}" if slow_file
+                else "Журнал медленных запросов ведётся для открытой базы данных.")
+        if profiling.enabled:
+            text += f"\nПрофили действий сохраняются в {profiling.folder}"
+            if profiling.last_summary:
+                text += f" (последний: {profiling.last_summary.name})"
+        self.diagnostics_label.setText(text)
+
+    def warm_up_modules(self):
+        self.warm_up_thread = WarmUpThread(self)
+        self.warm_up_thread.start()
+
     def load_last_database(self):
         last_db_path = self.settings.value("database/lastOpened", "")
         if last_db_path and os.path.exists(last_db_path):
-            print(f"Загрузка последней использованной БД: {last_db_path}")
+            log.info("Загрузка последней использованной БД: %s", last_db_path)
             self.open_database_file(last_db_path)
         else:
-            print("Последняя БД не найдена или путь некорректен.")
+            log.warning("Последняя БД не найдена или путь некорректен.")
 
     def create_database(self):
         path, _ = QFileDialog.getSaveFileName(
@@ -1772,15 +2139,15 @@ class SQLiteEditor(QWidget):
                 path += ".db"
             if self.db and self.db.isOpen():
                 table_name = self.table_combo.currentText()
-                if self.model:
-                    self.model.clear()
+                self.drop_table_models()
                 self.db.close()
-                print(f"Закрыта база данных: {self.db.databaseName()}")
+                log.info("Закрыта база данных: %s", self.db.databaseName())
                 QtSql.QSqlDatabase.removeDatabase('qt_sql_default_connection')
                 self.db = None
                 self.model = None
                 self.table_combo.clear()
                 self.table_view.setModel(None)
+                self.start_row_count()
                 self.update_button_states(db_open=False)
 
             try:
@@ -1801,15 +2168,39 @@ class SQLiteEditor(QWidget):
     def open_database_file(self, path):
         if self.db and self.db.isOpen():
             table_name = self.table_combo.currentText()
-            if self.model:
-                self.model.clear()
+            self.drop_table_models()
             self.db.close()
-            print(f"Закрыта база данных: {self.db.databaseName()}")
+            log.info("Закрыта база данных: %s", self.db.databaseName())
             QtSql.QSqlDatabase.removeDatabase('qt_sql_default_connection')
             self.db = None
             self.model = None
             self.table_combo.clear()
             self.table_view.setModel(None)
+            self.start_row_count()
+
+        if self.open_thread and self.open_thread.isRunning():
+            self.open_thread.wait()
+        # Доводим схему файла до текущей версии в фоне; Qt открывает файл после этого
+        self.update_button_states(db_open=False)
+        QApplication.setOverrideCursor(Qt.BusyCursor)
+        self.open_thread = OpenDatabaseThread(path, self)
+        self.open_thread.done.connect(self.on_database_migrated)
+        self.open_thread.failed.connect(self.on_database_migration_failed)
+        self.open_thread.start()
+
+    def on_database_migration_failed(self, path, message):
+        QApplication.restoreOverrideCursor()
+        QMessageBox.critical(self, "Ошибка миграции", f"Не удалось обновить схему базы данных {path}: {message}")
+        self.update_button_states(db_open=False)
+
+    def on_database_migrated(self, path, applied):
+        QApplication.restoreOverrideCursor()
+        if applied:
+            report = "\n".join(f"{number}. {description} – {elapsed:.2f} с"
+                               for number, description, elapsed in applied)
+            log.info("Применены миграции схемы:\n%s", report)
+            QMessageBox.information(self, "Обновление базы данных",
+                                    f"Схема базы данных обновлена:\n{report}")
 
         self.db = QtSql.QSqlDatabase.addDatabase('QSQLITE', 'qt_sql_default_connection')
         self.db.setDatabaseName(path)
@@ -1819,7 +2210,13 @@ class SQLiteEditor(QWidget):
             self.update_button_states(db_open=False)
             return
 
-        print(f"Открыта база данных: {path}")
+        configure_qt(self.db)
+        # Файл могли заменить (восстановление копии) – версии справочников не сравнимы
+        relation_cache.invalidate(path)
+        sqltrace.configure_slow_log(sqltrace.slow_log_path(path))
+        profiling.configure(path)
+        metrics.configure(path)
+        log.info("Открыта база данных: %s", path)
         self.settings.setValue("database/lastOpened", path)
         self.load_tables()
         self.update_button_states(db_open=True)
@@ -1853,10 +2250,68 @@ class SQLiteEditor(QWidget):
         if not db_open:
             self.table_view.setModel(None)
 
+    def run_search(self):
+        self.search_timer.stop()
+        self.search_results.clear()
+        search = search_query(self.search_edit.text())
+        if search is None or not self.db or not self.db.isOpen():
+            self.search_results.setVisible(False)
+            return
+
+        sql, params = search
+        query = TracedQuery(self.db)
+        query.prepare(sql)
+        for value in params:
+            query.addBindValue(value)
+        if not query.exec_():
+            log.error("Ошибка поиска: %s", query.lastError().text())
+            self.search_results.setVisible(False)
+            return
+
+        while query.next():
+            table_name = entity_table(query.value(0))
+            text = f"{self.TABLES_RUSSIAN_NAMES.get(table_name, table_name)}: {query.value(2)}"
+            if query.value(3):
+                text += f" — {original_snippet(query.value(3), query.value(4))}"
+            item = QtWidgets.QListWidgetItem(text)
+            item.setData(Qt.UserRole, (table_name, query.value(1)))
+            self.search_results.addItem(item)
+
+        if self.search_results.count() == 0:
+            self.search_results.addItem("Ничего не найдено")
+        self.search_results.setVisible(True)
+
+    def open_search_hit(self, item):
+        hit = item.data(Qt.UserRole)
+        if not hit:
+            return
+        table_name, record_id = hit
+        combo_index = self.table_combo.findData(table_name)
+        if combo_index < 0:
+            return
+        if combo_index != self.table_combo.currentIndex():
+            self.table_combo.setCurrentIndex(combo_index)  # load_table через сигнал
+        if not self.select_record(record_id):
+            QMessageBox.information(self, "Поиск", "Запись не найдена в таблице – возможно, она удалена.")
+
+    def select_record(self, record_id):
+        """Выделяет строку с данным id в текущей таблице, при необходимости догружая модель."""
+        if not self.model:
+            return False
+        id_column = self.model.fieldIndex("id")
+        if id_column < 0:
+            return False
+        row = self.model.row_of_id(record_id)
+        if row < 0:
+            return False
+        self.table_view.selectRow(row)
+        self.table_view.scrollTo(self.model.index(row, id_column), QAbstractItemView.PositionAtCenter)
+        return True
+
     def load_tables(self):
         if not self.db or not self.db.isOpen():
             return
-        tables = self.db.tables()
+        tables = [name for name in self.db.tables() if not is_service_table(name)]
         self.table_combo.clear()
         for table_name in tables:
             display_name = self.TABLES_RUSSIAN_NAMES.get(table_name, table_name)
@@ -1867,29 +2322,36 @@ class SQLiteEditor(QWidget):
              self.load_table(0)
         self.update_button_states(db_open=True)
 
+    @action("load_table")
     def load_table(self, index):
         table_name = self.table_combo.itemData(index) 
+        self.park_table_model()
         if not table_name or not self.db or not self.db.isOpen():
             self.table_view.setModel(None)
             self.update_button_states(db_open=bool(self.db and self.db.isOpen()))
             return
 
-        print(f"Загрузка таблицы: {table_name}")
-
-        if self.model:
-            self.model.clear()
-            try:
-                self.model.dataChanged.disconnect()
-                self.model.rowsInserted.disconnect()
-                self.model.rowsRemoved.disconnect()
-            except TypeError:
-                pass 
-        
-        # Для таблицы "выполненные_работы" используем QSqlRelationalTableModel для связи с другими таблицами
+        # Модель из кэша годится, если с её select() в БД ничего не записывали
+        cached = self.table_models.pop(table_name, None)
+        if cached and cached.version is not None and cached.version == cached.model.data_version():
+            log.info("Таблица из кэша: %s", table_name)
+            self.show_cached_table(table_name, cached)
+            return
+        if cached:
+            cached.model.clear()
+            cached.model.deleteLater()
+
+        log.info("Загрузка таблицы: %s", table_name)
+        self.filter_conditions = []
+        self.filter_edit.blockSignals(True)
+        self.filter_edit.clear()
+        self.filter_edit.blockSignals(False)
+
+        # Таблица читается окнами по мере прокрутки (см. paged_model.py);
+        # для "выполненные_работы" показываем связанные значения других таблиц
         if table_name == "выполненные_работы":
-            # Используем ReadOnlyRelationalTableModel для выполненных_работ
-            self.model = ReadOnlyRelationalTableModel(self, self.db, 
-                                                  read_only_columns_by_name=["id_вагона", "id_договора", "id_услуги", "id_исполнителя"])
+            self.model = PagedTableModel(self, self.db, query_class=TracedQuery,
+                                         read_only_columns=["id_вагона", "id_договора", "id_услуги", "id_исполнителя"])
             self.model.setTable(table_name)
             
             # Устанавливаем связи с другими таблицами
@@ -1912,7 +2374,7 @@ class SQLiteEditor(QWidget):
             self.model.setHeaderData(self.model.fieldIndex("дата_окончания_"), Qt.Horizontal, "Дата окончания")
             self.model.setHeaderData(self.model.fieldIndex("подписант"), Qt.Horizontal, "Подписант")
         elif table_name == "договорные_услуги":
-            self.model = QtSql.QSqlRelationalTableModel(self, self.db)
+            self.model = PagedTableModel(self, self.db, query_class=TracedQuery)
             self.model.setTable(table_name)
             
             # Связь для id_договора (поле с индексом 1 в таблице договорные_услуги) с таблицей договоры
@@ -1925,8 +2387,7 @@ class SQLiteEditor(QWidget):
             self.model.setHeaderData(self.model.fieldIndex("id_договора"), Qt.Horizontal, "Договор") # Будет отображать номер договора
             self.model.setHeaderData(self.model.fieldIndex("id_услуги"), Qt.Horizontal, "Услуга") # Будет отображать наименование услуги
         else:
-            # Для остальных таблиц используем стандартную модель
-            self.model = QtSql.QSqlTableModel(self, self.db)
+            self.model = PagedTableModel(self, self.db, query_class=TracedQuery)
             self.model.setTable(table_name)
         
         self.model.setEditStrategy(QtSql.QSqlTableModel.OnFieldChange)
@@ -1941,7 +2402,7 @@ class SQLiteEditor(QWidget):
                 col_name = header(col, Qt.Horizontal, Qt.DisplayRole)
                 if col_name in ["дата_кр", "дата_кр1", "дата_квр", "дата_др"]:
                     self.table_view.setItemDelegateForColumn(col, date_delegate)
-                    print(f"Установлен DateDelegate для колонки: {col_name} (индекс {col})")
+                    log.info("Установлен DateDelegate для колонки: %s (индекс %s)", col_name, col)
                 # Сбрасываем делегат для других колонок, если он был установлен ранее
                 elif self.table_view.itemDelegateForColumn(col) == date_delegate:
                      self.table_view.setItemDelegateForColumn(col, QStyledItemDelegate(self.table_view))
@@ -1949,22 +2410,34 @@ class SQLiteEditor(QWidget):
         # Ensure editing is enabled in the view
         self.table_view.setEditTriggers(QAbstractItemView.DoubleClicked | QAbstractItemView.EditKeyPressed)
         
-        self.model.select()
+        select_model(self.model, f"SQLiteEditor.select {table_name}")
+        self.model_version = None
 
         if self.model.lastError().isValid():
             QMessageBox.critical(self, "Ошибка загрузки таблицы", 
                                  f"Не удалось загрузить таблицу '{table_name}': {self.model.lastError().text()}")
             self.table_view.setModel(None)
         else:
+            self.model_version = self.model.data_version()
             self.table_view.setModel(self.model)
             
-            # Для таблицы "выполненные_работы" используем QSqlRelationalDelegate для правильного отображения связанных таблиц
-            if table_name == "выполненные_работы":
-                self.table_view.setItemDelegate(QtSql.QSqlRelationalDelegate(self.table_view))
-            # Generalize delegate setting for any QSqlRelationalTableModel
-            if isinstance(self.model, QtSql.QSqlRelationalTableModel):
-                self.table_view.setItemDelegate(QtSql.QSqlRelationalDelegate(self.table_view))
+            # Связанные колонки правятся выпадающим списком значений связанной таблицы
+            self.table_view.setItemDelegate(RelationDelegate(self.table_view))
+            self.fill_filter_columns()
+            self.update_filter_label()
+            self.start_row_count()
             
+        self.set_date_delegates(table_name)
+        if cached:
+            # Таблица изменилась и перечитана; ширины колонок остаются прежними
+            self.restore_column_widths(cached.widths)
+        else:
+            with metrics.span(f"SQLiteEditor.resizeColumnsToContents {table_name}"):
+                self.table_view.resizeColumnsToContents()
+        
+        self.update_button_states(db_open=True)
+
+    def set_date_delegates(self, table_name):
         # После установки модели и данных, применяем делегаты (если select() сбрасывает их)
         if table_name == "вагоны":
             date_delegate = DateDelegate(self.table_view)
@@ -1978,9 +2451,167 @@ class SQLiteEditor(QWidget):
                 # elif self.table_view.itemDelegateForColumn(col) == date_delegate:
                 #      self.table_view.setItemDelegateForColumn(col, QStyledItemDelegate(self.table_view))
 
-        self.table_view.resizeColumnsToContents()
-        
+    def fill_filter_columns(self):
+        self.filter_column_combo.clear()
+        for col in range(self.model.columnCount()):
+            self.filter_column_combo.addItem(str(self.model.headerData(col, Qt.Horizontal)),
+                                             self.model.record().fieldName(col))
+
+    def park_table_model(self):
+        """Убирает текущую модель в кэш вместе с фильтром, ширинами колонок и прокруткой."""
+        model, self.model = self.model, None
+        if not isinstance(model, PagedTableModel) or not model.tableName() or self.table_view.model() is not model:
+            if model is not None:
+                model.clear()
+            return
+        counted = self.row_count_label.text()
+        self.table_models[model.tableName()] = CachedTable(
+            model, self.model_version, list(self.filter_conditions), self.filter_edit.text(),
+            [self.table_view.columnWidth(col) for col in range(model.columnCount())],
+            (self.table_view.verticalScrollBar().value(), self.table_view.horizontalScrollBar().value()),
+            counted if counted.startswith("Строк: ") and counted[-1].isdigit() else "")
+        self.table_models.move_to_end(model.tableName())
+        while len(self.table_models) > MODEL_CACHE_SIZE:
+            _, evicted = self.table_models.popitem(last=False)
+            evicted.model.clear()
+            evicted.model.deleteLater()
+
+    def drop_table_models(self):
+        """Закрывает текущую модель и модели кэша (перед закрытием БД)."""
+        if self.model:
+            self.model.clear()
+        for cached in self.table_models.values():
+            cached.model.clear()
+            cached.model.deleteLater()
+        self.table_models.clear()
+
+    def show_cached_table(self, table_name, cached):
+        """Показывает модель из кэша без select(): фильтр, ширины колонок и прокрутка – как были."""
+        started = time.perf_counter()
+        self.model = cached.model
+        self.model_version = cached.version
+        self.filter_conditions = list(cached.filter_conditions)
+        self.filter_edit.blockSignals(True)
+        self.filter_edit.setText(cached.filter_text)
+        self.filter_edit.blockSignals(False)
+        self.table_view.setModel(self.model)
+        self.table_view.setItemDelegate(RelationDelegate(self.table_view))
+        self.table_view.setEditTriggers(QAbstractItemView.DoubleClicked | QAbstractItemView.EditKeyPressed)
+        self.fill_filter_columns()
+        self.update_filter_label()
+        self.start_row_count(known=cached.row_count)
+        self.set_date_delegates(table_name)
+        self.restore_column_widths(cached.widths)
+        # Диапазон полос прокрутки пересчитывается после раскладки – значение ставится следом
+        vertical, horizontal = cached.scroll
+        QTimer.singleShot(0, lambda: (self.table_view.verticalScrollBar().setValue(vertical),
+                                      self.table_view.horizontalScrollBar().setValue(horizontal)))
         self.update_button_states(db_open=True)
+        metrics.record(f"SQLiteEditor.cached {table_name}", time.perf_counter() - started)
+
+    def restore_column_widths(self, widths):
+        for col, width in enumerate(widths[:self.model.columnCount()]):
+            self.table_view.setColumnWidth(col, width)
+
+    def filter_titles(self):
+        """{колонка: заголовок} текущей модели – для подписи условий."""
+        return {self.model.record().fieldName(col): str(self.model.headerData(col, Qt.Horizontal))
+                for col in range(self.model.columnCount())}
+
+    def add_filter_condition(self):
+        column = self.filter_column_combo.currentData()
+        text = self.filter_value_edit.text().strip()
+        if not self.model or not column or not text:
+            return
+        self.filter_conditions.append(Condition(column, text))
+        if self.apply_filter():
+            self.filter_value_edit.clear()
+        else:
+            self.filter_conditions.pop()
+
+    def clear_filter(self):
+        self.filter_conditions = []
+        self.filter_edit.blockSignals(True)
+        self.filter_edit.clear()
+        self.filter_edit.blockSignals(False)
+        self.apply_filter()
+
+    def apply_filter(self):
+        """
+        Собирает WHERE из условий и быстрого поиска, перечитывает модель с
+        первого окна и запускает подсчёт строк в фоне. False – условие не разобрано.
+        """
+        self.filter_timer.stop()
+        if not self.model or not self.model.tableName():
+            return False
+        text = self.filter_edit.text()
+        hit_codes = None
+        hits = hit_sources_query(text)
+        if hits:
+            query = TracedQuery(self.db)
+            query.prepare(hits[0])
+            for value in hits[1]:
+                query.addBindValue(value)
+            if query.exec_():
+                hit_codes = set()
+                while query.next():
+                    hit_codes.add(query.value(0))
+        try:
+            where = build_where(self.model.tableName(), self.model.column_types(), self.model.relations(),
+                                self.filter_conditions, text, hit_codes)
+        except ValueError as e:
+            QMessageBox.warning(self, "Фильтр", str(e))
+            return False
+        self.model.setFilter(where.sql, where.params)
+        select_model(self.model, f"SQLiteEditor.filter {self.model.tableName()}")
+        if self.model.lastError().isValid():
+            QMessageBox.critical(self, "Фильтр", f"Не удалось применить фильтр: {self.model.lastError().text()}")
+            return False
+        self.update_filter_label()
+        self.start_row_count()
+        return True
+
+    def update_filter_label(self):
+        self.filter_label.setText(describe_filter(self.filter_conditions, self.filter_titles())
+                                  if self.model and self.filter_conditions else "")
+
+    def start_row_count(self, known=""):
+        """
+        Число строк с текущим фильтром – в фоне; результат прошлого подсчёта
+        отбрасывается. known – подпись, посчитанная раньше (модель из кэша).
+        """
+        if self.row_count_thread and self.row_count_thread.isRunning():
+            self.row_count_thread.cancel()
+        self.row_count_generation += 1
+        if not self.model or not self.model.tableName():
+            self.row_count_label.setText("")
+            return
+        if known:
+            self.row_count_label.setText(known)
+            return
+        self.row_count_label.setText("Строк: считается…")
+        sql, params = self.model.count_query()
+        self.row_count_thread = RowCountThread(self.row_count_generation, self.db.databaseName(), sql, params,
+                                               f"SQLiteEditor.count {self.model.tableName()}", self)
+        self.row_count_thread.done.connect(self.on_row_count)
+        self.row_count_thread.failed.connect(self.on_row_count_failed)
+        self.row_count_thread.finished.connect(self.on_row_count_finished)
+        self.row_count_thread.start()
+
+    def on_row_count(self, generation, count):
+        if generation == self.row_count_generation:
+            self.row_count_label.setText(f"Строк: {count:,}".replace(",", " "))
+
+    def on_row_count_failed(self, generation, error):
+        if generation == self.row_count_generation:
+            self.row_count_label.setText("Строк: ?")
+            log.warning("Не удалось посчитать строки: %s", error)
+
+    def on_row_count_finished(self):
+        thread = self.sender()
+        if thread is self.row_count_thread:
+            self.row_count_thread = None
+        thread.deleteLater()
 
     def show_add_work_dialog(self):
         if not self.db or not self.db.isOpen():
@@ -1988,9 +2619,19 @@ class SQLiteEditor(QWidget):
             return
         dialog = AddWorkDialog(self.db, self)
         if dialog.exec_() == QDialog.Accepted:
-            current_table_name = self.table_combo.itemData(self.table_combo.currentIndex())
-            if current_table_name == "выполненные_работы" and self.model:
-                self.model.select()
+            self.refresh_table_rows("выполненные_работы", inserted=[dialog.new_id])
+
+    def refresh_table_rows(self, table_name, changed=(), inserted=(), deleted=()):
+        """
+        Записи table_name, изменённые в обход модели (диалоги, отмена), – в
+        текущей таблице обновляются только их строки (PagedTableModel.refresh_rows).
+        Модели других таблиц в кэше увидят запись по data_version.
+        """
+        if not self.model or self.model.tableName() != table_name:
+            return
+        self.model.refresh_rows(changed, inserted, deleted)
+        if inserted or deleted:
+            self.start_row_count()
     
     def show_manage_contract_services_dialog(self):
         if not self.db or not self.db.isOpen():
@@ -1999,11 +2640,9 @@ class SQLiteEditor(QWidget):
         
         # contract_id is set to None, so the dialog will use its internal QComboBox for contract selection.
         dialog = ManageContractServicesDialog(self.db, contract_id=None, parent=self)
-        if dialog.exec_() == QDialog.Accepted:
-            # If changes were made, refresh the current table if it's 'договорные_услуги'
-            current_table_data_name = self.table_combo.itemData(self.table_combo.currentIndex())
-            if self.model and current_table_data_name == "договорные_услуги":
-                self.model.select() 
+        # Диалог записывает изменения сразу, поэтому строки обновляются и после «Отмены»
+        dialog.exec_()
+        self.refresh_table_rows("договорные_услуги", inserted=dialog.inserted_ids, deleted=dialog.deleted_ids)
 
     def add_record(self):
         if not self.model:
@@ -2011,8 +2650,7 @@ class SQLiteEditor(QWidget):
             return
 
         current_table_name = self.table_combo.itemData(self.table_combo.currentIndex())
-        print(f"DEBUG: Adding record to table: {current_table_name}")  # Debug log
-
+        log.debug("Adding record to table: %s", current_table_name)
         # Используем специальные диалоги для определенных таблиц
         if current_table_name == "выполненные_работы":
             self.show_add_work_dialog()
@@ -2020,25 +2658,25 @@ class SQLiteEditor(QWidget):
         elif current_table_name == "вагоны":
             dialog = AddWagonDialog(self.db, self)
             if dialog.exec_() == QDialog.Accepted:
-                self.model.select()
+                self.refresh_table_rows(current_table_name, inserted=[dialog.new_id])
             return
         elif current_table_name == "договоры":
             dialog = AddContractDialog(self.db, self)
             if dialog.exec_() == QDialog.Accepted:
-                self.model.select()
+                self.refresh_table_rows(current_table_name, inserted=[dialog.new_id])
             return
         elif current_table_name == "услуги":
             # Для услуг показываем диалог для ввода данных до вставки
             dialog = AddServiceDialog(self.db, self)
             if dialog.exec_() == QDialog.Accepted:
-                self.model.select()
+                self.refresh_table_rows(current_table_name, inserted=[dialog.new_id])
             return
         elif current_table_name == "договорные_услуги":
             # Для договорных услуг требуется выбор существующего договора и услуги
             contract_id = None
             
             # Выбор договора
-            contract_query = QtSql.QSqlQuery(self.db)
+            contract_query = TracedQuery(self.db)
             contract_query.exec_("SELECT id, номер FROM договоры ORDER BY номер")
             contracts = []
             while contract_query.next():
@@ -2058,7 +2696,7 @@ class SQLiteEditor(QWidget):
             contract_id = contracts[contract_items.index(contract_item)][0]
             
             # Выбор услуги
-            service_query = QtSql.QSqlQuery(self.db)
+            service_query = TracedQuery(self.db)
             service_query.exec_("SELECT id, наименование FROM услуги ORDER BY наименование")
             services = []
             while service_query.next():
@@ -2078,7 +2716,7 @@ class SQLiteEditor(QWidget):
             service_id = services[service_items.index(service_item)][0]
             
             # Проверка на дубликат
-            check_query = QtSql.QSqlQuery(self.db)
+            check_query = TracedQuery(self.db)
             check_query.prepare(
                 "SELECT COUNT(*) FROM договорные_услуги WHERE id_договора = ? AND id_услуги = ?")
             check_query.addBindValue(contract_id)
@@ -2090,14 +2728,14 @@ class SQLiteEditor(QWidget):
                 return
             
             # Добавление записи
-            insert_query = QtSql.QSqlQuery(self.db)
+            insert_query = TracedQuery(self.db)
             insert_query.prepare(
                 "INSERT INTO договорные_услуги (id_договора, id_услуги) VALUES (?, ?)")
             insert_query.addBindValue(contract_id)
             insert_query.addBindValue(service_id)
             
             if insert_query.exec_():
-                self.model.select()
+                self.refresh_table_rows(current_table_name, inserted=[insert_query.lastInsertId()])
                 QMessageBox.information(self, "Успех", "Услуга успешно добавлена к договору")
             else:
                 QMessageBox.critical(self, "Ошибка", 
@@ -2106,13 +2744,12 @@ class SQLiteEditor(QWidget):
 
         # Для остальных таблиц (без жестких ограничений) используем стандартную вставку
         row = self.model.rowCount()
-        print(f"DEBUG: Attempting to insert row at index: {row}")  # Debug log
-        
+        log.debug("Attempting to insert row at index: %s", row)
         if self.model.insertRow(row):
             # Store operation for undo
             self.last_operation = "add"
             self.last_operation_data = {"row": row, "table": current_table_name}
-            print(f"DEBUG: Stored add operation data: {self.last_operation_data}")  # Debug log
+            log.debug("Stored add operation data: %s", self.last_operation_data)
             self.undo_btn.setEnabled(True)
             
             # Select new row
@@ -2122,7 +2759,7 @@ class SQLiteEditor(QWidget):
             
             # Submit changes immediately
             if not self.model.submitAll():
-                print(f"DEBUG: Error submitting new row: {self.model.lastError().text()}")  # Debug log
+                log.error("Error submitting new row: %s", self.model.lastError().text())
                 QMessageBox.critical(self, "Ошибка добавления", 
                                    f"Не удалось сохранить новую запись: {self.model.lastError().text()}")
                 self.model.revertAll()
@@ -2131,9 +2768,9 @@ class SQLiteEditor(QWidget):
                 self.undo_btn.setEnabled(False)
                 return
                 
-            print("DEBUG: Successfully added and submitted new row")  # Debug log
+            log.debug("Successfully added and submitted new row")
         else:
-            print(f"DEBUG: Failed to insert row: {self.model.lastError().text()}")  # Debug log
+            log.error("Failed to insert row: %s", self.model.lastError().text())
             QMessageBox.critical(self, "Ошибка добавления",
                                f"Не удалось добавить запись: {self.model.lastError().text()}")
 
@@ -2153,8 +2790,7 @@ class SQLiteEditor(QWidget):
         else:
             rows = sorted({idx.row() for idx in selected_rows}, reverse=True)
 
-        print(f"DEBUG: Attempting to delete rows: {rows}")  # Debug log
-
+        log.debug("Attempting to delete rows: %s", rows)
         reply = QMessageBox.question(self, "Подтверждение удаления",
                                    f"Вы уверены, что хотите удалить {len(rows)} запись(ей)?",
                                    QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
@@ -2168,37 +2804,35 @@ class SQLiteEditor(QWidget):
                 for col in range(self.model.columnCount()):
                     index = self.model.index(row, col)
                     header = self.model.headerData(col, Qt.Horizontal)
-                    value = self.model.data(index)
-                    row_data[header] = value
-                    print(f"DEBUG: Storing data for undo - Row {row}, Col {header}: {value}")  # Debug log
+                    row_data[header] = self.model.data(index)
                 deleted_data.append(row_data)
             
-            print(f"DEBUG: Stored delete operation data: {deleted_data}")  # Debug log
-            
+            log.debug("Stored delete operation data: %s", deleted_data)
             self.model.database().transaction()
             try:
                 success = True
                 for row in rows:
                     if not self.model.removeRow(row):
-                        print(f"DEBUG: Error removing row {row}: {self.model.lastError().text()}")  # Debug log
+                        log.error("Error removing row %s: %s", row, self.model.lastError().text())
                         success = False
                         break
                 
                 if success:
                     if self.model.submitAll():
                         self.model.database().commit()
-                        print(f"DEBUG: Successfully deleted {len(rows)} rows")  # Debug log
+                        log.debug("Successfully deleted %s rows", len(rows))
                         # Store operation for undo
                         self.last_operation = "delete"
                         self.last_operation_data = {
                             "table": current_table_name,
                             "data": deleted_data
                         }
-                        print(f"DEBUG: Set last operation to delete with data: {self.last_operation_data}")  # Debug log
+                        log.debug("Set last operation to delete with data: %s", self.last_operation_data)
                         self.undo_btn.setEnabled(True)
-                        self.model.select()
+                        # removeRow уже убрал строки из модели – перечитывать таблицу не нужно
+                        self.start_row_count()
                     else:
-                        print(f"DEBUG: Error submitting delete changes: {self.model.lastError().text()}")  # Debug log
+                        log.error("Error submitting delete changes: %s", self.model.lastError().text())
                         self.model.database().rollback()
                         QMessageBox.critical(self, "Ошибка удаления", 
                                            f"Не удалось сохранить изменения после удаления: {self.model.lastError().text()}")
@@ -2208,7 +2842,7 @@ class SQLiteEditor(QWidget):
                                        f"Не удалось удалить одну из строк: {self.model.lastError().text()}")
 
             except Exception as e:
-                print(f"DEBUG: Exception during delete: {str(e)}")  # Debug log
+                log.error("Exception during delete: %s", str(e))
                 self.model.database().rollback()
                 QMessageBox.critical(self, "Ошибка транзакции", f"Произошла ошибка во время удаления: {e}")
 
@@ -2216,19 +2850,53 @@ class SQLiteEditor(QWidget):
         if not self.db or not self.db.isOpen():
             QMessageBox.warning(self, "Нет базы данных", "Пожалуйста, сначала откройте или создайте базу данных.")
             return
-        
+
+        scales = {
+            f"{name}: {size.works:,} работ, {size.wagons:,} вагонов, {size.contracts:,} договоров".replace(",", " "): size
+            for name, size in SCALES.items()
+        }
+        scale, ok = QtWidgets.QInputDialog.getItem(
+            self, "Заполнение тестовыми данными", "Объём данных:", list(scales), 0, False)
+        if not ok:
+            return
+
         reply = QMessageBox.question(self, "Заполнение тестовыми данными",
                                      "Это действие перезапишет существующие данные в базе.\nВы уверены, что хотите продолжить?",
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
-        if reply == QMessageBox.Yes:
-            db_path = self.db.databaseName()
-            try:
-                fill_test_data(db_path)
-                QMessageBox.information(self, "Успех", "База данных заполнена тестовыми данными.")
-                if self.model:
-                    self.model.select()
-            except Exception as e:
-                 QMessageBox.critical(self, "Ошибка", f"Не удалось заполнить базу данных: {e}")
+        if reply != QMessageBox.Yes:
+            return
+
+        # Окно остаётся отзывчивым, но править данные во время загрузки нельзя
+        progress = QtWidgets.QProgressDialog("Подготовка…", None, 0, 100, self)
+        progress.setWindowTitle("Заполнение тестовыми данными")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(0)
+
+        def on_progress(stage, done, total):
+            progress.setLabelText(f"{stage}: {done:,} из {total:,}".replace(",", " "))
+            progress.setValue(done * 100 // total if total else 100)
+
+        def finish():
+            progress.close()
+            # Справочники перезаписаны целиком – словари кэша не годятся
+            relation_cache.invalidate(self.db.databaseName())
+            if self.model:
+                self.model.select()
+
+        def on_done(counts):
+            finish()
+            log.info("База данных заполнена тестовыми данными: %s", counts)
+            QMessageBox.information(self, "Успех", "База данных заполнена тестовыми данными.")
+
+        def on_failed(error):
+            finish()
+            QMessageBox.critical(self, "Ошибка", f"Не удалось заполнить базу данных: {error}")
+
+        self.fill_thread = FillTestDataThread(self.db.databaseName(), scales[scale], self)
+        self.fill_thread.progress.connect(on_progress)
+        self.fill_thread.done.connect(on_done)
+        self.fill_thread.failed.connect(on_failed)
+        self.fill_thread.start()
 
     def delete_database(self):
         if not self.db or not self.db.isOpen():
@@ -2242,21 +2910,25 @@ class SQLiteEditor(QWidget):
 
         if reply == QMessageBox.Yes:
             table_name = self.table_combo.currentText()
-            if self.model:
-                self.model.clear()
+            self.drop_table_models()
             self.db.close()
-            print(f"Закрыта база данных перед удалением: {db_path}")
+            log.info("Закрыта база данных перед удалением: %s", db_path)
             connection_name = self.db.connectionName()
             QtSql.QSqlDatabase.removeDatabase(connection_name)
             self.db = None
             self.model = None
             self.table_combo.clear()
             self.table_view.setModel(None)
+            self.start_row_count()
             self.settings.remove("database/lastOpened")
             self.update_button_states(db_open=False)
 
             try:
                 os.remove(db_path)
+                # В режиме WAL рядом с файлом БД лежат журнал и разделяемая память
+                for suffix in ("-wal", "-shm"):
+                    if os.path.exists(db_path + suffix):
+                        os.remove(db_path + suffix)
                 QMessageBox.information(self, "Успех", f"Файл базы данных удален: {db_path}")
                 self.setWindowTitle("Система управления ремонта вагонного оборудования")
 
@@ -2265,6 +2937,135 @@ class SQLiteEditor(QWidget):
             except Exception as e:
                 QMessageBox.critical(self, "Ошибка", f"Произошла ошибка при удалении файла: {e}")
 
+    def backup_database(self, scheduled=False):
+        if not self.db or not self.db.isOpen():
+            if not scheduled:
+                QMessageBox.warning(self, "Нет базы данных", "Сначала откройте базу данных.")
+            return
+        if self.backup_thread and self.backup_thread.isRunning():
+            if not scheduled:
+                QMessageBox.information(self, "Резервная копия", "Копирование уже выполняется.")
+            return
+
+        keep = int(self.settings.value("backup/keep", BACKUP_KEEP))
+        self.backup_thread = BackupThread(self.db.databaseName(), keep, self)
+        self.backup_thread.done.connect(lambda result: self.on_backup_done(result, scheduled))
+        self.backup_thread.failed.connect(lambda error: self.on_backup_failed(error, scheduled))
+
+        if not scheduled:
+            # Немодальный прогресс: с таблицами можно работать во время копирования
+            self.backup_progress = QtWidgets.QProgressDialog("Создание резервной копии…", None, 0, 100, self)
+            self.backup_progress.setWindowTitle("Резервная копия")
+            self.backup_progress.setWindowModality(Qt.NonModal)
+            self.backup_progress.setMinimumDuration(500)
+            self.backup_thread.progress.connect(
+                lambda done, total: self.backup_progress.setValue(done * 100 // total if total else 0))
+
+        log.info("Резервное копирование %sначато: %s", 'по расписанию ' if scheduled else '', self.db.databaseName())
+        self.backup_thread.start()
+
+    def on_backup_done(self, result, scheduled):
+        if self.backup_progress:
+            self.backup_progress.close()
+            self.backup_progress = None
+        log.info("Резервная копия создана: %s", describe_backup(result))
+        if not scheduled:
+            QMessageBox.information(self, "Резервная копия",
+                                    f"Копия создана и проверена:\n{result.path}\n\n{describe_backup(result)}")
+
+    def on_backup_failed(self, error, scheduled):
+        if self.backup_progress:
+            self.backup_progress.close()
+            self.backup_progress = None
+        log.error("Ошибка резервного копирования: %s", error)
+        if not scheduled:
+            QMessageBox.critical(self, "Резервная копия", f"Не удалось создать копию: {error}")
+
+    def configure_backup_schedule(self):
+        minutes, ok = QtWidgets.QInputDialog.getInt(
+            self, "Расписание копий", "Интервал между копиями, минут (0 – отключить):",
+            int(self.settings.value("backup/intervalMinutes", 0)), 0, 24 * 60)
+        if not ok:
+            return
+        keep, ok = QtWidgets.QInputDialog.getInt(
+            self, "Расписание копий", "Сколько последних копий хранить:",
+            int(self.settings.value("backup/keep", BACKUP_KEEP)), 1, 1000)
+        if not ok:
+            return
+        self.settings.setValue("backup/intervalMinutes", minutes)
+        self.settings.setValue("backup/keep", keep)
+        self.apply_backup_schedule()
+
+    def apply_backup_schedule(self):
+        minutes = int(self.settings.value("backup/intervalMinutes", 0))
+        if minutes > 0:
+            self.backup_timer.start(minutes * 60 * 1000)
+            log.info("Резервные копии по расписанию: каждые %s мин", minutes)
+        else:
+            self.backup_timer.stop()
+
+    def maintain_database(self, scheduled=False):
+        if not self.db or not self.db.isOpen():
+            if not scheduled:
+                QMessageBox.warning(self, "Нет базы данных", "Сначала откройте базу данных.")
+            return
+        if self.maintenance_thread and self.maintenance_thread.isRunning():
+            if not scheduled:
+                QMessageBox.information(self, "Обслуживание БД", "Обслуживание уже выполняется.")
+            return
+
+        switch_incremental = False
+        if not scheduled:
+            query = TracedQuery("PRAGMA auto_vacuum", self.db)
+            if query.next() and query.value(0) != 2:
+                switch_incremental = QMessageBox.question(
+                    self, "Обслуживание БД",
+                    "База создана без auto_vacuum=INCREMENTAL, поэтому место от удалённых записей "
+                    "не возвращается.\n\nПеревести её в этот режим? Потребуется полный VACUUM; "
+                    "на время его выполнения база будет занята.",
+                    QMessageBox.Yes | QMessageBox.No) == QMessageBox.Yes
+
+        self.maintenance_thread = MaintenanceThread(
+            self.db.databaseName(), full=not scheduled, switch_incremental=switch_incremental, parent=self)
+        self.maintenance_thread.done.connect(lambda report: self.on_maintenance_done(report, scheduled))
+        self.maintenance_thread.failed.connect(lambda error: self.on_maintenance_failed(error, scheduled))
+        if not scheduled:
+            self.maintenance_btn.setEnabled(False)
+            self.maintenance_btn.setText("Обслуживание…")
+        log.info("Обслуживание БД %sначато: %s", 'в простое ' if scheduled else '', self.db.databaseName())
+        self.maintenance_thread.start()
+
+    def on_maintenance_done(self, report, scheduled):
+        self.settings.setValue("maintenance/lastRun", time.time())
+        self.maintenance_btn.setText("Обслуживание БД")
+        self.maintenance_btn.setEnabled(bool(self.db and self.db.isOpen()))
+        log.info("%s", describe_maintenance(report, datetime.now()))
+        if not scheduled:
+            QMessageBox.information(self, "Обслуживание БД", describe_maintenance(report))
+
+    def on_maintenance_failed(self, error, scheduled):
+        self.maintenance_btn.setText("Обслуживание БД")
+        self.maintenance_btn.setEnabled(bool(self.db and self.db.isOpen()))
+        log.error("Ошибка обслуживания БД: %s", error)
+        if not scheduled:
+            QMessageBox.critical(self, "Обслуживание БД", f"Не удалось выполнить обслуживание: {error}")
+
+    def maintain_if_idle(self):
+        """Запускает короткий прогон, если пользователь давно бездействует и прогона давно не было."""
+        if time.monotonic() - self.last_activity < MAINTENANCE_IDLE_MINUTES * 60:
+            return
+        last_run = float(self.settings.value("maintenance/lastRun", 0))
+        if time.time() - last_run < MAINTENANCE_INTERVAL_HOURS * 3600:
+            return
+        if self.backup_thread and self.backup_thread.isRunning():
+            return
+        self.maintain_database(scheduled=True)
+
+    def eventFilter(self, obj, event):
+        if event.type() in (QEvent.MouseButtonPress, QEvent.KeyPress, QEvent.Wheel):
+            self.last_activity = time.monotonic()
+        return False
+
     def show_worker_payment_dialog(self):
         if not self.db or not self.db.isOpen():
             QMessageBox.warning(self, "Нет базы данных", "Пожалуйста, сначала откройте или создайте базу данных.")
@@ -2286,8 +3087,10 @@ class SQLiteEditor(QWidget):
         dialog = ContractReportDialog(self.db, self)
         dialog.exec_()
 
+    @action("show_fill_word_dialog")
     def show_fill_word_dialog(self):
-        print("DEBUG: Метод show_fill_word_dialog вызван")
+        from word import extract_placeholders, replace_placeholders
+        log.debug("Метод show_fill_word_dialog вызван")
         
         if not self.db or not self.db.isOpen():
             QMessageBox.warning(self, "Нет базы данных", "Пожалуйста, сначала откройте или создайте базу данных.")
@@ -2303,19 +3106,19 @@ class SQLiteEditor(QWidget):
             template_path, _ = QFileDialog.getOpenFileName(
                 self, "Выберите шаблон Word (.docx)", "", "Word Documents (*.docx)"
             )
-            print(f"DEBUG: Выбран шаблон: {template_path}")
+            log.debug("Выбран шаблон: %s", template_path)
             if not template_path:
-                print("DEBUG: Пользователь отменил выбор шаблона")
+                log.debug("Пользователь отменил выбор шаблона")
                 return
 
             try:
                 placeholders = extract_placeholders(template_path)
-                print(f"DEBUG: Найдены маркеры: {placeholders}")
+                log.debug("Найдены маркеры: %s", placeholders)
                 if not placeholders:
                     QMessageBox.information(self, "Нет маркеров", "В выбранном шаблоне не найдено маркеров вида [имя_маркера].")
                     return
             except Exception as e:
-                print(f"DEBUG: Ошибка при извлечении маркеров: {e}")
+                log.error("Ошибка при извлечении маркеров: %s", e)
                 QMessageBox.critical(self, "Ошибка чтения шаблона", f"Не удалось прочитать маркеры из шаблона: {e}")
                 return
 
@@ -2333,7 +3136,7 @@ class SQLiteEditor(QWidget):
             
             # Выбор договора
             contract_combo = QComboBox()
-            query = QtSql.QSqlQuery(self.db)
+            query = TracedQuery(self.db)
             query.exec_("SELECT id, номер, дата FROM договоры ORDER BY номер")
             while query.next():
                 contract_id = query.value(0)
@@ -2423,7 +3226,7 @@ class SQLiteEditor(QWidget):
                 
             # Показываем диалог выбора
             if selection_dialog.exec_() != QDialog.Accepted:
-                print("DEBUG: Пользователь отменил ввод данных")
+                log.debug("Пользователь отменил ввод данных")
                 return
             
             # Получаем выбранные значения
@@ -2448,13 +3251,46 @@ class SQLiteEditor(QWidget):
                     elif isinstance(widget, QLineEdit):
                         mapping[key] = widget.text()
             
+            # Все данные для маркеров читаются одним снимком только для чтения,
+            # чтобы договор, вагон, работа и услуги были согласованы между собой
+            with report_snapshot(self.db) as conn:
+                contract_row = conn.execute("SELECT номер, дата FROM договоры WHERE id = ?",
+                                            (contract_id,)).fetchone()
+                wagon_row = conn.execute(
+                    "SELECT номер, собственник, подразделение, дата_кр, дата_кр1, дата_квр, дата_др "
+                    "FROM вагоны WHERE id = ?", (wagon_id,)).fetchone()
+                work_row = conn.execute("""
+                    SELECT 
+                        вр.id, 
+                        вр.дата_начала_, 
+                        вр.дата_окончания_, 
+                        вр.подписант,
+                        и.фио AS исполнитель_фио,
+                        д.номер AS договор_номер,
+                        в.номер AS вагон_номер,
+                        у.наименование AS услуга_название
+                    FROM 
+                        выполненные_работы вр
+                        JOIN договоры д ON вр.id_договора = д.id
+                        JOIN вагоны в ON вр.id_вагона = в.id
+                        JOIN услуги у ON вр.id_услуги = у.id
+                        JOIN исполнители и ON вр.id_исполнителя = и.id
+                    WHERE 
+                        вр.id_вагона = ? AND вр.id_договора = ?
+                    ORDER BY 
+                        вр.ts_начала DESC
+                    LIMIT 1
+                """, (wagon_id, contract_id)).fetchone()
+                service_rows = conn.execute("""
+                    SELECT у.наименование, у.стоимость_без_ндс, у.стоимость_с_ндс
+                    FROM услуги у
+                    JOIN договорные_услуги ду ON у.id = ду.id_услуги
+                    WHERE ду.id_договора = ?
+                """, (contract_id,)).fetchall()
+
             # Получаем данные договора
-            query = QtSql.QSqlQuery(self.db)
-            query.prepare("SELECT номер, дата FROM договоры WHERE id = ?")
-            query.addBindValue(contract_id)
-            if query.exec_() and query.next():
-                contract_number = query.value(0)
-                contract_date = query.value(1)
+            if contract_row:
+                contract_number, contract_date = contract_row
                 mapping['договоры.номер'] = contract_number
                 mapping['договор.номер'] = contract_number
                 mapping['договор'] = contract_number
@@ -2465,12 +3301,10 @@ class SQLiteEditor(QWidget):
                 mapping['договор.дата'] = formatted_date
             
             # Получаем данные вагона
-            query.prepare("SELECT номер, собственник, подразделение, дата_кр, дата_кр1, дата_квр, дата_др FROM вагоны WHERE id = ?")
-            query.addBindValue(wagon_id)
-            if query.exec_() and query.next():
-                wagon_number = query.value(0)
-                wagon_owner = query.value(1)
-                wagon_division = query.value(2)
+            if wagon_row:
+                wagon_number = wagon_row[0]
+                wagon_owner = wagon_row[1]
+                wagon_division = wagon_row[2]
                 
                 mapping['вагоны.номер'] = wagon_number
                 mapping['вагон.номер'] = wagon_number
@@ -2482,14 +3316,14 @@ class SQLiteEditor(QWidget):
                 
                 # Обрабатываем все возможные даты ремонта
                 date_fields = {
-                    'вагоны.дата_кр': query.value(3),
-                    'вагон.дата_кр': query.value(3),
-                    'вагоны.дата_кр1': query.value(4),
-                    'вагон.дата_кр1': query.value(4),
-                    'вагоны.дата_квр': query.value(5),
-                    'вагон.дата_квр': query.value(5),
-                    'вагоны.дата_др': query.value(6),
-                    'вагон.дата_др': query.value(6)
+                    'вагоны.дата_кр': wagon_row[3],
+                    'вагон.дата_кр': wagon_row[3],
+                    'вагоны.дата_кр1': wagon_row[4],
+                    'вагон.дата_кр1': wagon_row[4],
+                    'вагоны.дата_квр': wagon_row[5],
+                    'вагон.дата_квр': wagon_row[5],
+                    'вагоны.дата_др': wagon_row[6],
+                    'вагон.дата_др': wagon_row[6]
                 }
                 
                 for field_name, date_value in date_fields.items():
@@ -2499,38 +3333,12 @@ class SQLiteEditor(QWidget):
                         mapping[field_name] = ""
             
             # Получаем данные о выполненных работах по выбранному договору и вагону
-            work_query = QtSql.QSqlQuery(self.db)
-            work_query.prepare("""
-                SELECT 
-                    вр.id, 
-                    вр.дата_начала, 
-                    вр.дата_окончания, 
-                    вр.подписант,
-                    и.фио AS исполнитель_фио,
-                    д.номер AS договор_номер,
-                    в.номер AS вагон_номер,
-                    у.наименование AS услуга_название
-                FROM 
-                    выполненные_работы вр
-                    JOIN договоры д ON вр.id_договора = д.id
-                    JOIN вагоны в ON вр.id_вагона = в.id
-                    JOIN услуги у ON вр.id_услуги = у.id
-                    JOIN исполнители и ON вр.id_исполнителя = и.id
-                WHERE 
-                    вр.id_договора = ? AND вр.id_вагона = ?
-                ORDER BY 
-                    вр.дата_начала DESC
-                LIMIT 1
-            """)
-            work_query.addBindValue(contract_id)
-            work_query.addBindValue(wagon_id)
-            
-            if work_query.exec_() and work_query.next():
+            if work_row:
                 # Извлекаем данные о выполненной работе
-                work_date_start = work_query.value(1)
-                work_date_end = work_query.value(2)
-                work_signer = work_query.value(3) or ""
-                worker_name = work_query.value(4) or ""
+                work_date_start = work_row[1]
+                work_date_end = work_row[2]
+                work_signer = work_row[3] or ""
+                worker_name = work_row[4] or ""
                 
                 # Функция для безопасного форматирования даты
                 def safe_format_datetime(date_str):
@@ -2592,28 +3400,14 @@ class SQLiteEditor(QWidget):
                 mapping['Дата_акта'] = formatted_date_end
             
             # Получаем услуги по договору
-            services_query = QtSql.QSqlQuery(self.db)
-            services_query.prepare("""
-                SELECT у.наименование, у.стоимость_без_ндс, у.стоимость_с_ндс
-                            FROM услуги у 
-                            JOIN договорные_услуги ду ON у.id = ду.id_услуги
-                            WHERE ду.id_договора = ?
-                        """)
-            services_query.addBindValue(contract_id)
-            
             services_list = []
             total_cost_without_vat = 0
             total_cost_with_vat = 0
             
-            if services_query.exec_():
-                while services_query.next():
-                    service_name = services_query.value(0)
-                    cost_without_vat = float(services_query.value(1) or 0)
-                    cost_with_vat = float(services_query.value(2) or 0)
-                    
-                    services_list.append(service_name)
-                    total_cost_without_vat += cost_without_vat
-                    total_cost_with_vat += cost_with_vat
+            for service_name, cost_without_vat, cost_with_vat in service_rows:
+                services_list.append(service_name)
+                total_cost_without_vat += float(cost_without_vat or 0)
+                total_cost_with_vat += float(cost_with_vat or 0)
             
             # Добавляем список услуг и суммы
             service_list_str = "LIST:" + "|".join(services_list) if services_list else "Нет услуг по договору"
@@ -2636,18 +3430,18 @@ class SQLiteEditor(QWidget):
             # Весь блок кода создания дополнительного диалога удален, так как мы реализовали единый экран
             # для ввода всех необходимых данных выше
             
-            print("--- Данные для заполнения документа ---")
+            log.debug("--- Данные для заполнения документа ---")
             for k, v in mapping.items():
-                print(f"[{k}] -> {v}")
-            print("-----------------------------------")
+                log.debug("[%s] -> %s", k, v)
+            log.debug("-----------------------------------")
                 
             # Запрашиваем путь для сохранения заполненного документа
             output_path, _ = QFileDialog.getSaveFileName(
                 self, "Сохранить заполненный документ Word", "", "Word Documents (*.docx)"
             )
-            print(f"DEBUG: Выбран выходной файл: {output_path}")
+            log.debug("Выбран выходной файл: %s", output_path)
             if not output_path:
-                print("DEBUG: Пользователь отменил выбор выходного файла")
+                log.debug("Пользователь отменил выбор выходного файла")
                 return
             if not output_path.endswith(".docx"):
                 output_path += ".docx"
@@ -2666,190 +3460,163 @@ class SQLiteEditor(QWidget):
         
         finally:
             # Восстанавливаем нормальное состояние кнопки
-            print("DEBUG: Восстанавливаем состояние кнопки")
+            log.debug("Восстанавливаем состояние кнопки")
             self.word_report_btn.setEnabled(True)
             self.word_report_btn.clicked.connect(self.show_fill_word_dialog)
 
     def closeEvent(self, event):
         self.settings.setValue("geometry", self.saveGeometry())
+        if self.backup_thread and self.backup_thread.isRunning():
+            log.info("Ожидание завершения резервного копирования…")
+            self.backup_thread.wait()
+        if self.fill_thread and self.fill_thread.isRunning():
+            log.info("Ожидание завершения заполнения тестовыми данными…")
+            self.fill_thread.wait()
+        if self.open_thread and self.open_thread.isRunning():
+            self.open_thread.wait()
+        if self.row_count_thread and self.row_count_thread.isRunning():
+            self.row_count_thread.cancel()
+            self.row_count_thread.wait()
+        # Останавливает построение перестановок сортировки
+        self.drop_table_models()
+        if self.warm_up_thread and self.warm_up_thread.isRunning():
+            self.warm_up_thread.wait()
+        if self.maintenance_thread and self.maintenance_thread.isRunning():
+            log.info("Ожидание завершения обслуживания БД…")
+            self.maintenance_thread.wait()
         if self.db and self.db.isOpen():
             self.db.close()
-            print(f"Закрыта база данных при выходе: {self.db.databaseName()}")
+            log.info("Закрыта база данных при выходе: %s", self.db.databaseName())
+        metrics.flush()
         event.accept()
 
+    @action("import_from_excel")
     def import_from_excel(self):
+        import pandas as pd
+        from excel_import import excel_value, map_columns
         if not self.db or not self.db.isOpen() or not self.model:
             QMessageBox.warning(self, "Импорт из Excel", "Пожалуйста, сначала откройте базу данных и выберите таблицу.")
             return
 
-        print("DEBUG: Entered import_from_excel") # 1
-
+        import_log.debug("Entered import_from_excel")
         current_table_name = self.table_combo.itemData(self.table_combo.currentIndex())
         if not current_table_name:
             QMessageBox.warning(self, "Импорт из Excel", "Не выбрана таблица для импорта.")
-            print("DEBUG: No table selected for import. Exiting import_from_excel.") # Added
+            import_log.debug("No table selected for import. Exiting import_from_excel.")
             return
-        print(f"DEBUG: Current table for import: {current_table_name}") # 2
-
+        import_log.debug("Current table for import: %s", current_table_name)
         excel_path, _ = QFileDialog.getOpenFileName(
             self, "Выберите файл Excel", "", "Excel Files (*.xlsx *.xls)"
         )
         if not excel_path:
-            print("DEBUG: No Excel file selected by user. Exiting import_from_excel.") # 3
+            import_log.debug("No Excel file selected by user. Exiting import_from_excel.")
             return
-        print(f"DEBUG: Excel file path selected: {excel_path}") # 4
-
+        import_log.debug("Excel file path selected: %s", excel_path)
         try:
-            print("DEBUG: Top-level try block in import_from_excel entered.") # 5
+            import_log.debug("Top-level try block in import_from_excel entered.")
             xls = pd.ExcelFile(excel_path)
             sheet_names = xls.sheet_names
-            print(f"DEBUG: pd.ExcelFile successful. Sheet names: {sheet_names}") # 6
-
+            import_log.debug("pd.ExcelFile successful. Sheet names: %s", sheet_names)
             if not sheet_names:
                 QMessageBox.warning(self, "Импорт из Excel", "В Excel файле не найдено листов.")
-                print("DEBUG: No sheets found in Excel file. Exiting.") # Added
+                import_log.debug("No sheets found in Excel file. Exiting.")
                 return
 
             sheet_name_to_import = sheet_names[0]
             if len(sheet_names) > 1:
-                print("DEBUG: Multiple sheets found. Prompting user for selection.") # Added
+                import_log.debug("Multiple sheets found. Prompting user for selection.")
                 sheet_name_to_import, ok = QtWidgets.QInputDialog.getItem(
                     self, "Выбор листа", "Выберите лист для импорта:", sheet_names, 0, False
                 )
                 if not ok or not sheet_name_to_import:
-                    print("DEBUG: User cancelled sheet selection or no sheet selected. Exiting.") # Added
+                    import_log.debug("User cancelled sheet selection or no sheet selected. Exiting.")
                     return
-            print(f"DEBUG: Sheet selected for import: {sheet_name_to_import}") # 7
-            
+            import_log.debug("Sheet selected for import: %s", sheet_name_to_import)
             df = pd.read_excel(xls, sheet_name=sheet_name_to_import)
-            print(f"DEBUG: pd.read_excel successful. DataFrame shape: {df.shape}") # 8
-            
+            import_log.debug("pd.read_excel successful. DataFrame shape: %s", df.shape)
             if df.empty:
                 QMessageBox.information(self, "Импорт из Excel", f"Лист '{sheet_name_to_import}' пуст.")
-                print(f"DEBUG: DataFrame for sheet '{sheet_name_to_import}' is empty. Exiting.") # Added
+                import_log.debug("DataFrame for sheet '%s' is empty. Exiting.", sheet_name_to_import)
                 return
 
             table_record = self.model.record()
             table_columns = [table_record.fieldName(i) for i in range(table_record.count())]
-            print(f"DEBUG: Database table columns: {table_columns}") # Added
-            
-            excel_columns_lower = {col.lower(): col for col in df.columns}
-            mapped_columns = {} 
-            insert_columns_ordered = [] 
-            
-            for tc in table_columns:
-                if tc.lower() in excel_columns_lower:
-                    mapped_columns[tc] = excel_columns_lower[tc.lower()]
-                    insert_columns_ordered.append(tc)
+            import_log.debug("Database table columns: %s", table_columns)
+            mapped_columns, insert_columns_ordered = map_columns(table_columns, df.columns)
 
-            print(f"DEBUG: Columns from Excel mapped to table: {mapped_columns}") # Added
-            print(f"DEBUG: Ordered columns for SQL INSERT: {insert_columns_ordered}") # 9
-            
+            import_log.debug("Columns from Excel mapped to table: %s", mapped_columns)
+            import_log.debug("Ordered columns for SQL INSERT: %s", insert_columns_ordered)
             if not insert_columns_ordered:
                 QMessageBox.warning(self, "Импорт из Excel", 
                                     "Не удалось сопоставить ни одного столбца из Excel с таблицей.\n"
                                     "Убедитесь, что названия столбцов в Excel совпадают с названиями в таблице (регистр не важен).")
-                print("DEBUG: No columns were successfully mapped. Exiting.") # 10
+                import_log.debug("No columns were successfully mapped. Exiting.")
                 return
 
-            print("DEBUG: Starting database transaction.") # 11
+            import_log.debug("Starting database transaction.")
             self.db.transaction()
-            query = QtSql.QSqlQuery(self.db)
+            query = TracedQuery(self.db)
             
             placeholders = ", ".join(["?"] * len(insert_columns_ordered))
             sql_insert = f"INSERT INTO {current_table_name} ({', '.join(insert_columns_ordered)}) VALUES ({placeholders})"
-            print(f"DEBUG: Constructed SQL Insert Statement: {sql_insert}") # 12
-            
+            import_log.debug("Constructed SQL Insert Statement: %s", sql_insert)
             inserted_rows = 0
             failed_rows = 0
+            # Построчная трассировка – только при уровне DEBUG, проверка один раз на импорт
+            trace = import_log.isEnabledFor(logging.DEBUG)
 
             for index, row_data in df.iterrows():
-                print(f"DEBUG: Processing Excel row index: {index}") # 13
+                if trace:
+                    import_log.debug("Processing Excel row index: %s", index)
                 values_to_bind = []
                 problematic_row_data = {} 
                 try:
                     for table_col_name in insert_columns_ordered:
                         excel_col_name = mapped_columns[table_col_name]
                         original_value = row_data[excel_col_name]
-                        processed_value = None
-
-                        if pd.isna(original_value): 
-                            processed_value = None
-                        elif isinstance(original_value, (datetime, pd.Timestamp)):
-                            ts_value = pd.to_datetime(original_value)
-                            if ts_value.hour == 0 and ts_value.minute == 0 and ts_value.second == 0 and \
-                               ts_value.microsecond == 0 and getattr(ts_value, 'nanosecond', 0) == 0:
-                                processed_value = ts_value.strftime("%Y-%m-%d")
-                            else:
-                                processed_value = ts_value.strftime("%Y-%m-%d %H:%M:%S")
-                        elif type(original_value) is bool: # Check for bool first, as bool is subclass of int
-                            processed_value = int(original_value)
-                        elif type(original_value) is int: # Check for Python int (already know it's not bool)
-                            processed_value = int(original_value)
-                        elif type(original_value) is float: # Check for Python float
-                            processed_value = float(original_value)
-                        elif isinstance(original_value, str):
-                            processed_value = original_value
-                        else: # Fallback for other types (e.g., numpy numerics, or unexpected types)
-                            # Try to convert to a Python numeric type if possible, otherwise string
-                            try:
-                                num_val = float(original_value) # Try float conversion first
-                                if num_val.is_integer():
-                                    processed_value = int(num_val)
-                                else:
-                                    processed_value = num_val
-                                print(f"DEBUG:   Converted non-standard numeric/unknown type '{original_value}' ({type(original_value)}) to {type(processed_value)}: {processed_value}")
-                            except (ValueError, TypeError):
-                                print(f"DEBUG:   Warning: Value '{original_value}' of type {type(original_value)} is being converted to string as a final fallback.")
-                                processed_value = str(original_value)
-                        
+                        processed_value = excel_value(original_value)
+
                         values_to_bind.append(processed_value)
                         problematic_row_data[table_col_name] = processed_value 
-                        # print(f"DEBUG:   Table col: {table_col_name}, Excel col: {excel_col_name}, Original: {original_value}, Processed: {processed_value}") # 14 - Too verbose for now
 
                 except Exception as e_prepare_bind_values:
-                    print(f"DEBUG: ERROR during value preparation for row {index}: {type(e_prepare_bind_values).__name__} - {str(e_prepare_bind_values)}") # Added
+                    import_log.error("ERROR during value preparation for row %s: %s - %s", index, type(e_prepare_bind_values).__name__, str(e_prepare_bind_values))
                     if self.db.inTransaction():
-                        print("DEBUG: Rolling back transaction due to value preparation error.") # Added
+                        import_log.error("Rolling back transaction due to value preparation error.")
                         self.db.rollback()
                     QMessageBox.critical(self, "Ошибка обработки строки Excel",
                                          f"Ошибка при обработке данных из строки Excel (индекс {index}): {e_prepare_bind_values}\n"
                                          f"Данные строки (обработанные): {problematic_row_data}\n"
                                          "Импорт отменен.")
-                    print("DEBUG: Exiting import_from_excel due to value preparation error.") # Added
+                    import_log.error("Exiting import_from_excel due to value preparation error.")
                     return 
 
-                print(f"DEBUG:   Values to bind for row {index}: {values_to_bind}") # 15
-
+                if trace:
+                    import_log.debug("Values to bind for row %s: %s", index, values_to_bind)
                 if not query.prepare(sql_insert):
                     error_text = query.lastError().text()
-                    print(f"DEBUG: SQL prepare FAILED: {error_text}") # 16
+                    import_log.error("SQL prepare FAILED: %s", error_text)
                     QMessageBox.critical(self, "Ошибка SQL", f"Ошибка подготовки запроса: {error_text}\nSQL: {sql_insert}")
                     if self.db.inTransaction():
-                        print("DEBUG: Rolling back transaction due to SQL prepare failure.") # Added
+                        import_log.debug("Rolling back transaction due to SQL prepare failure.")
                         self.db.rollback()
-                    print("DEBUG: Exiting import_from_excel due to SQL prepare failure.") # Added
+                    import_log.debug("Exiting import_from_excel due to SQL prepare failure.")
                     return
-                print(f"DEBUG: SQL prepare SUCCEEDED for row {index}.") # 17
-
                 for val_idx, val in enumerate(values_to_bind):
                     query.bindValue(val_idx, val)
-                print(f"DEBUG: Values bound for row {index}.") # 18
-                
                 if query.exec_():
                     inserted_rows += 1
-                    print(f"DEBUG: SQL exec SUCCEEDED for row {index}. inserted_rows: {inserted_rows}") # 19
+                    if trace:
+                        import_log.debug("SQL exec SUCCEEDED for row %s. inserted_rows: %s", index, inserted_rows)
                 else:
                     failed_rows += 1
                     error_text = query.lastError().text()
-                    print(f"DEBUG: SQL exec FAILED for row {index}: {error_text}. failed_rows: {failed_rows}") # 20
-                    print(f"DEBUG:   Failed SQL: {sql_insert}") # Added
-                    print(f"DEBUG:   Failed Values: {values_to_bind}") # Added
-                    
-            print(f"DEBUG: Finished processing all rows. Inserted: {inserted_rows}, Failed: {failed_rows}") # 21
-            
+                    import_log.error("SQL exec FAILED for row %s: %s. failed_rows: %s", index, error_text, failed_rows)
+                    import_log.error("Failed SQL: %s", sql_insert)
+                    import_log.error("Failed Values: %s", values_to_bind)
+            import_log.info("Finished processing all rows. Inserted: %s, Failed: %s", inserted_rows, failed_rows)
             if failed_rows > 0:
-                print("DEBUG: Rolling back transaction due to one or more failed row insertions.") # 22
+                import_log.warning("Rolling back transaction due to one or more failed row insertions.")
                 self.db.rollback()
                 QMessageBox.warning(self, "Импорт из Excel", 
                                     f"Импорт завершен с ошибками.\n"
@@ -2857,33 +3624,31 @@ class SQLiteEditor(QWidget):
                                     f"Не удалось вставить: {failed_rows} строк.\n"
                                     "Изменения отменены. Проверьте консоль для деталей.")
             else:
-                print("DEBUG: Attempting to commit transaction as all rows were processed (or no rows to process).") # 23
+                import_log.debug("Attempting to commit transaction as all rows were processed (or no rows to process).")
                 if self.db.commit():
-                    print("DEBUG: Transaction committed successfully.") # 24
+                    import_log.debug("Transaction committed successfully.")
                     QMessageBox.information(self, "Успех", f"Успешно импортировано {inserted_rows} строк в таблицу '{current_table_name}'.")
                     if self.model:
-                        self.model.select()
+                        # Перечитываются окна по мере показа, новые строки – в конце
+                        self.model.reload()
+                        self.start_row_count()
                 else:
                     error_text = self.db.lastError().text()
-                    print(f"DEBUG: Transaction commit FAILED: {error_text}") # 25
+                    import_log.error("Transaction commit FAILED: %s", error_text)
                     QMessageBox.critical(self, "Ошибка фиксации", f"Не удалось зафиксировать транзакцию: {error_text}")
                     # Attempt to rollback again if commit failed, though it might already be in an invalid state
                     if self.db.inTransaction(): # Check if still in transaction
-                         print("DEBUG: Rolling back transaction due to commit failure.") # Added
+                         import_log.debug("Rolling back transaction due to commit failure.")
                          self.db.rollback()
 
         except Exception as e_outer:
-            print(f"DEBUG: CRITICAL ERROR in import_from_excel (outer try-except): {type(e_outer).__name__} - {str(e_outer)}") # 26
-            import traceback
-            print("DEBUG: Full traceback of the critical error:") # 27
-            traceback.print_exc()
+            import_log.exception("CRITICAL ERROR in import_from_excel (outer try-except): %s - %s", type(e_outer).__name__, str(e_outer))
             if self.db.isOpen() and self.db.inTransaction():
-                print("DEBUG: Rolling back transaction due to critical error in outer try-except.") # Added
+                import_log.error("Rolling back transaction due to critical error in outer try-except.")
                 self.db.rollback()
             QMessageBox.critical(self, "Критическая ошибка импорта", f"Произошла критическая ошибка при импорте: {e_outer}\nПроверьте консоль.")
         finally:
-            print("DEBUG: Exiting import_from_excel function (finally block).") # 28
-
+            import_log.debug("Exiting import_from_excel function (finally block).")
     # Добавляем метод для редактирования записи
     def edit_record(self):
         if not self.model:
@@ -2906,101 +3671,9 @@ class SQLiteEditor(QWidget):
             row = selected_rows[0].row()
             
         # Создаем и отображаем диалог редактирования
+        # Диалог пишет через setData модели, которая сама перечитывает правленую строку
         dialog = EditRecordDialog(self.model, row, self)
-        if dialog.exec_() == QDialog.Accepted:
-            # После успешного редактирования обновляем отображение
-            self.model.select()
-
-    def undo_last_operation(self):
-        print(f"DEBUG: Attempting to undo operation: {self.last_operation}")  # Debug log
-        print(f"DEBUG: Operation data: {self.last_operation_data}")  # Debug log
-        
-        if not self.last_operation or not self.last_operation_data:
-            print("DEBUG: No operation to undo")  # Debug log
-            return
-
-        if self.last_operation == "add":
-            print("DEBUG: Undoing add operation")  # Debug log
-            # Undo add operation by deleting the last row
-            row = self.last_operation_data["row"]
-            print(f"DEBUG: Attempting to remove row {row}")  # Debug log
-            
-            self.model.database().transaction()
-            try:
-                if self.model.removeRow(row):
-                    if self.model.submitAll():
-                        self.model.database().commit()
-                        print("DEBUG: Successfully undid add operation")  # Debug log
-                        self.model.select()
-                        self.last_operation = None
-                        self.last_operation_data = None
-                        self.undo_btn.setEnabled(False)
-                    else:
-                        print(f"DEBUG: Error submitting undo changes: {self.model.lastError().text()}")  # Debug log
-                        self.model.database().rollback()
-                        QMessageBox.critical(self, "Ошибка отмены", 
-                                           f"Не удалось отменить добавление записи: {self.model.lastError().text()}")
-                else:
-                    print(f"DEBUG: Error removing row: {self.model.lastError().text()}")  # Debug log
-                    QMessageBox.critical(self, "Ошибка отмены", 
-                                       f"Не удалось удалить добавленную запись: {self.model.lastError().text()}")
-            except Exception as e:
-                print(f"DEBUG: Exception during undo add: {str(e)}")  # Debug log
-                self.model.database().rollback()
-                QMessageBox.critical(self, "Ошибка отмены", f"Произошла ошибка при отмене добавления: {e}")
-
-        elif self.last_operation == "delete":
-            print("DEBUG: Undoing delete operation")  # Debug log
-            # Undo delete operation by restoring deleted rows
-            table_name = self.last_operation_data["table"]
-            deleted_data = self.last_operation_data["data"]
-            print(f"DEBUG: Restoring {len(deleted_data)} rows to table {table_name}")  # Debug log
-            
-            self.model.database().transaction()
-            try:
-                success = True
-                for row_data in deleted_data:
-                    row = self.model.rowCount()
-                    print(f"DEBUG: Attempting to insert row at index {row}")  # Debug log
-                    if not self.model.insertRow(row):
-                        print(f"DEBUG: Error inserting row: {self.model.lastError().text()}")  # Debug log
-                        success = False
-                        break
-                    
-                    # Restore data for each column
-                    for col in range(self.model.columnCount()):
-                        header = self.model.headerData(col, Qt.Horizontal)
-                        if header in row_data:
-                            value = row_data[header]
-                            index = self.model.index(row, col)
-                            print(f"DEBUG: Setting column {header} to value {value}")  # Debug log
-                            if not self.model.setData(index, value):
-                                print(f"DEBUG: Error setting data for column {header}: {self.model.lastError().text()}")  # Debug log
-                                success = False
-                                break
-                
-                if success:
-                    if self.model.submitAll():
-                        self.model.database().commit()
-                        print("DEBUG: Successfully restored deleted rows")  # Debug log
-                        self.model.select()
-                        self.last_operation = None
-                        self.last_operation_data = None
-                        self.undo_btn.setEnabled(False)
-                    else:
-                        print(f"DEBUG: Error submitting restored rows: {self.model.lastError().text()}")  # Debug log
-                        self.model.database().rollback()
-                        QMessageBox.critical(self, "Ошибка отмены", 
-                                           f"Не удалось сохранить восстановленные записи: {self.model.lastError().text()}")
-                else:
-                    print("DEBUG: Failed to restore all data")  # Debug log
-                    self.model.database().rollback()
-                    QMessageBox.critical(self, "Ошибка отмены", "Не удалось восстановить удаленные записи")
-            
-            except Exception as e:
-                print(f"DEBUG: Exception during undo: {str(e)}")  # Debug log
-                self.model.database().rollback()
-                QMessageBox.critical(self, "Ошибка отмены", f"Произошла ошибка при отмене удаления: {e}")
+        dialog.exec_()
 
     def update_button_states(self, db_open):
         is_table_selected = bool(self.table_combo.currentText()) and db_open
@@ -3010,6 +3683,12 @@ class SQLiteEditor(QWidget):
         self.contract_report_btn.setEnabled(db_open)
         self.worker_payment_btn.setEnabled(db_open)
         self.table_combo.setEnabled(db_open)
+        self.backup_btn.setEnabled(db_open)
+        self.maintenance_btn.setEnabled(db_open)
+        self.search_edit.setEnabled(db_open)
+        if not db_open:
+            self.search_results.clear()
+            self.search_results.setVisible(False)
         self.add_record_btn.setEnabled(is_table_selected)
         self.edit_record_btn.setEnabled(is_table_selected)
         self.delete_record_btn.setEnabled(is_table_selected)
@@ -3017,65 +3696,68 @@ class SQLiteEditor(QWidget):
         
         # Update undo button state based on last operation
         has_undo_operation = bool(self.last_operation and self.last_operation_data)
-        print(f"DEBUG: Updating undo button state - has operation: {has_undo_operation}")  # Debug log
+        log.debug("Updating undo button state - has operation: %s", has_undo_operation)
         self.undo_btn.setEnabled(has_undo_operation)
 
     def register_undo_add(self, table_name, row_id):
-        print(f"DEBUG: register_undo_add: table={table_name}, row_id={row_id}")
+        log.debug("register_undo_add: table=%s, row_id=%s", table_name, row_id)
         self.last_operation = "add"
         self.last_operation_data = {"table": table_name, "row_id": row_id}
         self.undo_btn.setEnabled(True)
 
     def register_undo_delete(self, table_name, deleted_rows_data):
-        print(f"DEBUG: register_undo_delete: table={table_name}, data={deleted_rows_data}")
+        log.debug("register_undo_delete: table=%s, data=%s", table_name, deleted_rows_data)
         self.last_operation = "delete"
         self.last_operation_data = {"table": table_name, "data": deleted_rows_data}
         self.undo_btn.setEnabled(True)
 
     def undo_last_operation(self):
-        print(f"DEBUG: Attempting to undo operation: {self.last_operation}")
-        print(f"DEBUG: Operation data: {self.last_operation_data}")
+        log.debug("Attempting to undo operation: %s", self.last_operation)
+        log.debug("Operation data: %s", self.last_operation_data)
         if not self.last_operation or not self.last_operation_data:
-            print("DEBUG: No operation to undo")
+            log.debug("No operation to undo")
             return
 
         if self.last_operation == "add":
             table_name = self.last_operation_data["table"]
             row_id = self.last_operation_data["row_id"]
-            print(f"DEBUG: Undoing add in table {table_name} for id {row_id}")
+            log.debug("Undoing add in table %s for id %s", table_name, row_id)
             # Удаляем запись по id
-            query = QtSql.QSqlQuery(self.db)
+            query = TracedQuery(self.db)
             query.prepare(f"DELETE FROM {table_name} WHERE id = ?")
             query.addBindValue(row_id)
             if query.exec_():
-                print("DEBUG: Successfully undid add operation (deleted row by id)")
-                self.model.select()
+                log.debug("Successfully undid add operation (deleted row by id)")
+                self.refresh_table_rows(table_name, deleted=[row_id])
                 self.last_operation = None
                 self.last_operation_data = None
                 self.undo_btn.setEnabled(False)
             else:
-                print(f"DEBUG: Error deleting row by id: {query.lastError().text()}")
+                log.error("Error deleting row by id: %s", query.lastError().text())
                 QMessageBox.critical(self, "Ошибка отмены", f"Не удалось отменить добавление записи: {query.lastError().text()}")
 
         elif self.last_operation == "delete":
             table_name = self.last_operation_data["table"]
             deleted_data = self.last_operation_data["data"]
-            print(f"DEBUG: Restoring {len(deleted_data)} rows to table {table_name}")
+            log.debug("Restoring %s rows to table %s", len(deleted_data), table_name)
             success = True
+            restored = []
             for row_data in deleted_data:
                 fields = list(row_data.keys())
                 placeholders = ','.join(['?'] * len(fields))
                 sql = f"INSERT INTO {table_name} ({','.join(fields)}) VALUES ({placeholders})"
-                query = QtSql.QSqlQuery(self.db)
+                query = TracedQuery(self.db)
                 query.prepare(sql)
                 for field in fields:
                     query.addBindValue(row_data[field])
-                if not query.exec_():
-                    print(f"DEBUG: Error restoring row: {query.lastError().text()}")
+                if query.exec_():
+                    restored.append(query.lastInsertId())
+                else:
+                    log.error("Error restoring row: %s", query.lastError().text())
                     success = False
+            self.refresh_table_rows(table_name, inserted=restored)
             if success:
-                print("DEBUG: Successfully restored deleted rows")
-                self.model.select()
+                log.debug("Successfully restored deleted rows")
                 self.last_operation = None
                 self.last_operation_data = None
                 self.undo_btn.setEnabled(False)
@@ -3085,7 +3767,11 @@ class SQLiteEditor(QWidget):
 class ManageContractServicesDialog(QDialog):
     def __init__(self, db, contract_id=None, parent=None):
         super().__init__(parent)
+        FirstPaintSpan(self)
         self.db = db
+        # rowid записей договорные_услуги, добавленных и удалённых за время диалога
+        self.inserted_ids = []
+        self.deleted_ids = []
         self.passed_initial_contract_id = contract_id # Store the ID that was passed in
         self.contract_id = None # This will be updated by on_contract_changed
         self.setWindowTitle("Управление услугами по договору")
@@ -3244,7 +3930,7 @@ class ManageContractServicesDialog(QDialog):
         #             model_to_clear.setFilter("1=0") # Set an impossible filter
         #             model_to_clear.select()
         #         elif hasattr(model_to_clear, 'setQuery'): # For QSqlQueryModel
-        #             model_to_clear.setQuery(QtSql.QSqlQuery(self.db)) # Clear by setting an empty query
+        #             model_to_clear.setQuery(TracedQuery(self.db)) # Clear by setting an empty query
             
     def edit_available_service(self):
         selection = self.available_services.selectionModel()
@@ -3322,7 +4008,7 @@ class ManageContractServicesDialog(QDialog):
         # Filter to only show services not already in the contract
         self.available_model.setFilter(f"id NOT IN (SELECT id_услуги FROM договорные_услуги WHERE id_договора = {contract_id_val})")
         self.available_model.setEditStrategy(QtSql.QSqlTableModel.OnFieldChange)
-        self.available_model.select()
+        select_model(self.available_model, "ManageContractServicesDialog.select услуги")
         
         # Set headers
         self.available_model.setHeaderData(0, Qt.Horizontal, "ID")
@@ -3332,7 +4018,8 @@ class ManageContractServicesDialog(QDialog):
         
         self.available_services.setModel(self.available_model)
         self.available_services.hideColumn(0)  # Hide ID column
-        self.available_services.resizeColumnsToContents()
+        with metrics.span("ManageContractServicesDialog.resizeColumnsToContents услуги"):
+            self.available_services.resizeColumnsToContents()
 
     def load_contract_services(self):
         contract_id = self.contract_combo.currentData()
@@ -3347,22 +4034,23 @@ class ManageContractServicesDialog(QDialog):
                 self.contract_services_rel_model.select()
             return
             
-        # Use a dedicated model for the relation table that can be edited
-        self.contract_services_rel_model = QtSql.QSqlRelationalTableModel(self, self.db)
+        # Use a dedicated model for the relation table that can be edited. Номер договора и
+        # наименование услуги – из кэша справочников; record(row) даёт сами id_договора и id_услуги
+        self.contract_services_rel_model = PagedTableModel(self, self.db, query_class=TracedQuery)
         self.contract_services_rel_model.setTable("договорные_услуги")
-        self.contract_services_rel_model.setFilter(f"id_договора = {contract_id_val}")
-        self.contract_services_rel_model.setRelation(1, QtSql.QSqlRelation("договоры", "id", "номер"))
-        self.contract_services_rel_model.setRelation(2, QtSql.QSqlRelation("услуги", "id", "наименование"))
-        self.contract_services_rel_model.setEditStrategy(QtSql.QSqlTableModel.OnFieldChange)
-        self.contract_services_rel_model.select()
+        self.contract_services_rel_model.setFilter("t.id_договора = ?", [contract_id_val])
+        self.contract_services_rel_model.setRelation(0, QtSql.QSqlRelation("договоры", "id", "номер"))
+        self.contract_services_rel_model.setRelation(1, QtSql.QSqlRelation("услуги", "id", "наименование"))
+        select_model(self.contract_services_rel_model, "ManageContractServicesDialog.select договорные_услуги")
         
         # Set headers
-        self.contract_services_rel_model.setHeaderData(0, Qt.Horizontal, "ID")
-        self.contract_services_rel_model.setHeaderData(1, Qt.Horizontal, "Договор")
-        self.contract_services_rel_model.setHeaderData(2, Qt.Horizontal, "Услуга")
+        self.contract_services_rel_model.setHeaderData(0, Qt.Horizontal, "Договор")
+        self.contract_services_rel_model.setHeaderData(1, Qt.Horizontal, "Услуга")
         
         self.contract_services.setModel(self.contract_services_rel_model)
-        self.contract_services.resizeColumnsToContents()
+        self.contract_services.setItemDelegate(RelationDelegate(self.contract_services))
+        with metrics.span("ManageContractServicesDialog.resizeColumnsToContents договорные_услуги"):
+            self.contract_services.resizeColumnsToContents()
 
     def on_contract_changed(self, index):
         # Get current data from combo, this is the definitive source now for self.contract_id
@@ -3427,7 +4115,7 @@ class ManageContractServicesDialog(QDialog):
                 QMessageBox.warning(self, "Ошибка ввода", "ID должны быть числовыми значениями.")
                 return
 
-            range_query = QtSql.QSqlQuery(self.db)
+            range_query = TracedQuery(self.db)
             # Select services within range that are not already linked to the contract
             sql = """
                 SELECT id FROM услуги 
@@ -3457,7 +4145,7 @@ class ManageContractServicesDialog(QDialog):
         # --- Common logic for adding services_to_add list ---
         self.db.transaction()
         try:
-            insert_query = QtSql.QSqlQuery(self.db)
+            insert_query = TracedQuery(self.db)
             insert_query.prepare("""
                 INSERT INTO договорные_услуги (id_договора, id_услуги)
                 VALUES (?, ?)
@@ -3472,7 +4160,7 @@ class ManageContractServicesDialog(QDialog):
                     success_count += 1
                 else:
                     # Log specific error for this service_id if needed
-                    print(f"DEBUG: SQL Error adding service {service_id}: {insert_query.lastError().text()}")
+                    log.error("SQL Error adding service %s: %s", service_id, insert_query.lastError().text())
             
             if success_count > 0:
                 self.db.commit()
@@ -3512,7 +4200,7 @@ class ManageContractServicesDialog(QDialog):
         self.db.transaction()
         
         try:
-            delete_query = QtSql.QSqlQuery(self.db)
+            delete_query = TracedQuery(self.db)
             delete_query.prepare("""
                 DELETE FROM договорные_услуги 
                 WHERE id_договора = ? AND id_услуги = ?
@@ -3531,7 +4219,7 @@ class ManageContractServicesDialog(QDialog):
                 if delete_query.exec_():
                     success_count += 1
                 else:
-                    print(f"DEBUG: SQL Error: {delete_query.lastError().text()}")
+                    log.error("SQL Error: %s", delete_query.lastError().text())
             
             if success_count > 0:
                 self.db.commit()
@@ -3546,7 +4234,7 @@ class ManageContractServicesDialog(QDialog):
             QMessageBox.critical(self, "Ошибка", f"Ошибка при удалении услуг: {e}")
 
     def manage_contract_services(self):
-        print("DEBUG: ManageContractServicesDialog.manage_contract_services called")
+        log.debug("ManageContractServicesDialog.manage_contract_services called")
         contract_id = self.contract_combo.currentData()
         if not contract_id:
             QMessageBox.warning(self, "Ошибка", "Выберите договор")
@@ -3574,6 +4262,7 @@ class ManageContractServicesDialog(QDialog):
                 QMessageBox.critical(self, "Ошибка", f"Не удалось сохранить изменения: {self.contract_services_rel_model.lastError().text()}")
 
     # Добавляем недостающие методы
+    @metrics.timed
     def load_contracts(self, initial_contract_to_select_id):
         self.contract_combo.blockSignals(True) # Block signals during population/setting index
         self.contract_combo.clear()
@@ -3584,7 +4273,7 @@ class ManageContractServicesDialog(QDialog):
         # Always add a placeholder item first. Its data is QVariant() which .value() becomes None.
         self.contract_combo.addItem("--- Выберите договор ---", QVariant())
         
-        query = QtSql.QSqlQuery(self.db)
+        query = TracedQuery(self.db)
         query.exec_("SELECT id, номер FROM договоры ORDER BY номер")
         
         while query.next():
@@ -3606,7 +4295,7 @@ class ManageContractServicesDialog(QDialog):
         self.load_contract_services()
         
     def manage_contract_services(self):
-        print("DEBUG: ManageContractServicesDialog.manage_contract_services called")
+        log.debug("ManageContractServicesDialog.manage_contract_services called")
         contract_id = self.contract_combo.currentData()
         if not contract_id:
             QMessageBox.warning(self, "Ошибка", "Выберите договор")
@@ -3650,7 +4339,7 @@ class ManageContractServicesDialog(QDialog):
                 QMessageBox.warning(self, "Ошибка ввода", "ID должны быть числовыми значениями.")
                 return
 
-            range_query = QtSql.QSqlQuery(self.db)
+            range_query = TracedQuery(self.db)
             # Select services within range that are not already linked to the contract
             sql = """
                 SELECT id FROM услуги 
@@ -3680,25 +4369,28 @@ class ManageContractServicesDialog(QDialog):
         # --- Common logic for adding services_to_add list ---
         self.db.transaction()
         try:
-            insert_query = QtSql.QSqlQuery(self.db)
+            insert_query = TracedQuery(self.db)
             insert_query.prepare("""
                 INSERT INTO договорные_услуги (id_договора, id_услуги)
                 VALUES (?, ?)
             """)
             
             success_count = 0
+            added = []
             for service_id in services_to_add:
                 insert_query.bindValue(0, contract_id)
                 insert_query.bindValue(1, service_id)
                 
                 if insert_query.exec_():
                     success_count += 1
+                    added.append(insert_query.lastInsertId())
                 else:
                     # Log specific error for this service_id if needed
-                    print(f"DEBUG: SQL Error adding service {service_id}: {insert_query.lastError().text()}")
+                    log.error("SQL Error adding service %s: %s", service_id, insert_query.lastError().text())
             
             if success_count > 0:
                 self.db.commit()
+                self.inserted_ids += added
                 QMessageBox.information(self, "Успех", f"Добавлено {success_count} услуг к договору")
                 self.load_data() # Reload both available and contract services lists
             elif services_to_add: # If there were services to add but none succeeded
@@ -3735,29 +4427,32 @@ class ManageContractServicesDialog(QDialog):
         self.db.transaction()
         
         try:
-            delete_query = QtSql.QSqlQuery(self.db)
+            delete_query = TracedQuery(self.db)
             delete_query.prepare("""
                 DELETE FROM договорные_услуги 
                 WHERE id_договора = ? AND id_услуги = ?
             """)
             
             success_count = 0
+            removed = []
             
             for index in selected_rows:
-                # Fix: Use the new contract_services_rel_model variable which is a QSqlRelationalTableModel
-                # We need to get the id_услуги which is in column 2 for the relation model
-                service_id = self.contract_services_rel_model.data(self.contract_services_rel_model.index(index.row(), 2))
+                # id_услуги из записи, а не показанное наименование; rowid – для обновления главной таблицы
+                service_id = self.contract_services_rel_model.record(index.row()).value("id_услуги")
+                row_id = self.contract_services_rel_model.row_id(index.row())
                 
                 delete_query.bindValue(0, contract_id)
                 delete_query.bindValue(1, service_id)
                 
-                if delete_query.exec_():
+                if delete_query.exec_() and delete_query.numRowsAffected() > 0:
                     success_count += 1
+                    removed.append(row_id)
                 else:
-                    print(f"DEBUG: SQL Error: {delete_query.lastError().text()}")
+                    log.error("SQL Error: %s", delete_query.lastError().text())
             
             if success_count > 0:
                 self.db.commit()
+                self.deleted_ids += removed
                 QMessageBox.information(self, "Успех", f"Удалено {success_count} услуг из договора")
                 self.load_data()
             else:
@@ -3771,7 +4466,9 @@ class ManageContractServicesDialog(QDialog):
 class AddContractDialog(QDialog):
     def __init__(self, db, parent=None):
         super().__init__(parent)
+        FirstPaintSpan(self)
         self.db = db
+        self.new_id = None
         self.setWindowTitle("Добавление договора")
         self.setup_ui()
 
@@ -3808,12 +4505,13 @@ class AddContractDialog(QDialog):
             
         date = self.date_edit.date().toString("yyyy-MM-dd")
         
-        query = QtSql.QSqlQuery(self.db)
+        query = TracedQuery(self.db)
         query.prepare("INSERT INTO договоры (номер, дата) VALUES (?, ?)")
         query.addBindValue(number)
         query.addBindValue(date)
         
         if query.exec_():
+            self.new_id = query.lastInsertId()
             QMessageBox.information(self, "Успех", "Договор успешно добавлен")
             self.accept()
         else:
@@ -3823,6 +4521,7 @@ class AddContractDialog(QDialog):
 class EditRecordDialog(QDialog):
     def __init__(self, model, row, parent=None):
         super().__init__(parent)
+        FirstPaintSpan(self)
         self.model = model
         self.row = row
         self.setWindowTitle("Редактирование записи")
@@ -3930,7 +4629,9 @@ class EditRecordDialog(QDialog):
 class AddServiceDialog(QDialog):
     def __init__(self, db, parent=None):
         super().__init__(parent)
+        FirstPaintSpan(self)
         self.db = db
+        self.new_id = None
         self.setWindowTitle("Добавление услуги")
         self.setup_ui()
 
@@ -4024,7 +4725,7 @@ class AddServiceDialog(QDialog):
         
         description = self.description_edit.text().strip()
         
-        query = QtSql.QSqlQuery(self.db)
+        query = TracedQuery(self.db)
         query.prepare("""
             INSERT INTO услуги (наименование, стоимость_без_ндс, стоимость_с_ндс, стоимость_работнику, описание)
             VALUES (?, ?, ?, ?, ?)
@@ -4036,6 +4737,7 @@ class AddServiceDialog(QDialog):
         query.addBindValue(description)
         
         if query.exec_():
+            self.new_id = query.lastInsertId()
             QMessageBox.information(self, "Успех", "Услуга успешно добавлена")
             self.accept()
         else:
@@ -4043,7 +4745,7 @@ class AddServiceDialog(QDialog):
             QMessageBox.critical(self, "Ошибка", f"Ошибка при добавлении услуги: {error}")
 
 def get_wagon_division_by_number(db, wagon_number):
-    query = QtSql.QSqlQuery(db)
+    query = TracedQuery(db)
     query.prepare("SELECT подразделение FROM вагоны WHERE номер = ?")
     query.addBindValue(wagon_number)
     if query.exec_() and query.next():
@@ -4051,6 +4753,7 @@ def get_wagon_division_by_number(db, wagon_number):
     return ""
 
 if __name__ == '__main__':
+    logs.setup()
     app = QApplication(sys.argv)
     
     editor = SQLiteEditor()
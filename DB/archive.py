@@ -0,0 +1,248 @@
+"""
+archive.py
+Архивирование старых выполненных работ в отдельные файлы по годам.
+
+Рабочий файл (wagons.db) хранит только «горячие» работы; закрытые периоды
+переносятся в файлы рядом с ним – wagons_архив_2021.db, wagons_архив_2022.db …
+Год определяется по дате начала работы.
+
+Перенос идёт порциями по id и безопасно перезапускается: каждая порция
+сначала копируется в архив (INSERT OR IGNORE) отдельной транзакцией, затем
+отдельной транзакцией удаляется из рабочего файла – только те строки, что уже
+лежат в архиве с тем же содержимым. Прерванный перенос продолжится с места
+остановки, строки не теряются и не дублируются.
+
+Своды (rollups.py) после переноса описывают только рабочий файл. Отчётам,
+которым нужна вся история, attach_archives() подключает архивы к соединению
+(обычно – к снимку connection.snapshot) и создаёт временное представление
+ARCHIVE_VIEW – UNION ALL рабочей таблицы и архивов.
+
+CLI:
+    python archive.py wagons.db --before 2024-01-01
+    python archive.py wagons.db --contract 3 --contract 7
+"""
+
+import argparse
+import re
+import sqlite3
+import time
+from datetime import date
+from pathlib import Path
+
+from connection import connect
+from migrations import CHUNK_PAUSE, CHUNK_SIZE
+from reports import day_start_ts
+
+ARCHIVE_VIEW = "все_выполненные_работы"
+# SQLite по умолчанию позволяет подключить не более 10 баз к одному соединению
+MAX_ARCHIVES = 9
+
+WORK_COLUMNS = (
+    "id", "id_вагона", "id_договора", "id_услуги", "id_исполнителя",
+    "дата_начала_", "дата_окончания_", "подписант",
+)
+
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {schema}.выполненные_работы (
+    id INTEGER PRIMARY KEY,
+    id_вагона INTEGER,
+    id_договора INTEGER,
+    id_услуги INTEGER,
+    id_исполнителя INTEGER,
+    дата_начала_ DATETIME,
+    дата_окончания_ DATETIME,
+    подписант TEXT,
+    ts_начала INTEGER GENERATED ALWAYS AS (CAST(strftime('%s', дата_начала_) AS INTEGER)) VIRTUAL,
+    ts_окончания INTEGER GENERATED ALWAYS AS (CAST(strftime('%s', дата_окончания_) AS INTEGER)) VIRTUAL
+);
+CREATE INDEX IF NOT EXISTS {schema}.idx_архив_договор_ts
+    ON выполненные_работы (id_договора, ts_начала);
+CREATE INDEX IF NOT EXISTS {schema}.idx_архив_исполнитель_ts
+    ON выполненные_работы (id_исполнителя, ts_начала);
+"""
+
+_ARCHIVE_NAME = re.compile(r"_архив_(\d{4})$")
+
+
+def archive_path(db_path: str | Path, year: int) -> Path:
+    db_path = Path(db_path)
+    return db_path.with_name(f"{db_path.stem}_архив_{year}{db_path.suffix}")
+
+
+def archive_files(db_path: str | Path) -> list[tuple[int, Path]]:
+    """Архивы рабочего файла: [(год, путь)] по возрастанию года."""
+    db_path = Path(db_path)
+    found = []
+    for path in db_path.parent.glob(f"{db_path.stem}_архив_*{db_path.suffix}"):
+        match = _ARCHIVE_NAME.search(path.stem)
+        if match:
+            found.append((int(match.group(1)), path))
+    return sorted(found)
+
+
+def _schema_name(year: int) -> str:
+    return f"архив_{year}"
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _attach_statements(db_path: str | Path, attached: set[str]) -> list[str]:
+    """Команды ATTACH недостающих архивов и пересоздания ARCHIVE_VIEW."""
+    archives = archive_files(db_path)
+    if len(archives) > MAX_ARCHIVES:
+        raise RuntimeError(
+            f"Архивов {len(archives)}, одновременно можно подключить не более {MAX_ARCHIVES}"
+        )
+
+    columns = ", ".join(WORK_COLUMNS + ("ts_начала", "ts_окончания"))
+    statements = []
+    selects = [f"SELECT {columns} FROM main.выполненные_работы"]
+    for year, path in archives:
+        schema = _schema_name(year)
+        if schema not in attached:
+            statements.append(f"ATTACH DATABASE {_quote(str(path))} AS {schema}")
+        selects.append(f"SELECT {columns} FROM {schema}.выполненные_работы")
+
+    statements.append(f"DROP VIEW IF EXISTS temp.{ARCHIVE_VIEW}")
+    statements.append(f"CREATE TEMP VIEW {ARCHIVE_VIEW} AS " + " UNION ALL ".join(selects))
+    return statements
+
+
+def attach_archives(conn: sqlite3.Connection, db_path: str | Path) -> int:
+    """Подключает архивы к sqlite3-соединению и создаёт ARCHIVE_VIEW. Возвращает число архивов."""
+    attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+    for statement in _attach_statements(db_path, attached):
+        conn.execute(statement)
+    return len(archive_files(db_path))
+
+
+def _move_year(conn, year: int, path: Path, where: str, params: list, chunk_size: int) -> tuple[int, int]:
+    """Переносит работы одного года. Возвращает (перенесено, пропущено)."""
+    conn.execute("ATTACH DATABASE ? AS архив", (str(path),))
+    try:
+        for statement in ARCHIVE_SCHEMA.format(schema="архив").split(";"):
+            if statement.strip():
+                conn.execute(statement)
+
+        year_where = f"{where} AND ts_начала >= ? AND ts_начала < ?"
+        year_params = params + [day_start_ts(date(year, 1, 1)), day_start_ts(date(year + 1, 1, 1))]
+        columns = ", ".join(WORK_COLUMNS)
+        same_row = " AND ".join(f"а.{column} IS м.{column}" for column in WORK_COLUMNS)
+
+        moved = skipped = 0
+        last_id = 0
+        while True:
+            upper = conn.execute(
+                f"SELECT MAX(id) FROM (SELECT id FROM main.выполненные_работы "
+                f"WHERE id > ? AND {year_where} ORDER BY id LIMIT ?)",
+                [last_id] + year_params + [chunk_size],
+            ).fetchone()[0]
+            if upper is None:
+                return moved, skipped
+            chunk = [last_id, upper] + year_params
+
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                f"INSERT OR IGNORE INTO архив.выполненные_работы ({columns}) "
+                f"SELECT {columns} FROM main.выполненные_работы "
+                f"WHERE id > ? AND id <= ? AND {year_where}",
+                chunk,
+            )
+            conn.execute("COMMIT")
+
+            # Удаляем только строки, которые уже лежат в архиве без изменений.
+            # Строка с тем же id, но другим содержимым остаётся в рабочем файле.
+            conn.execute("BEGIN IMMEDIATE")
+            deleted = conn.execute(
+                f"DELETE FROM main.выполненные_работы AS м "
+                f"WHERE id > ? AND id <= ? AND {year_where} "
+                f"AND EXISTS (SELECT 1 FROM архив.выполненные_работы а WHERE а.id = м.id AND {same_row})",
+                chunk,
+            ).rowcount
+            conn.execute("COMMIT")
+
+            moved += deleted
+            skipped += conn.execute(
+                f"SELECT COUNT(*) FROM main.выполненные_работы WHERE id > ? AND id <= ? AND {year_where}",
+                chunk,
+            ).fetchone()[0]
+            last_id = upper
+            time.sleep(CHUNK_PAUSE)
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        conn.execute("DETACH DATABASE архив")
+
+
+def archive_works(
+    db_path: str | Path,
+    before: date | None = None,
+    contract_ids: list[int] | None = None,
+    chunk_size: int = CHUNK_SIZE,
+    on_year=None,
+) -> dict[int, tuple[int, int]]:
+    """
+    Переносит в архивы работы, начатые раньше before и/или относящиеся к
+    договорам contract_ids (например, закрытым).
+
+    Возвращает {год: (перенесено, пропущено)}; on_year(год, перенесено,
+    пропущено) вызывается после каждого года. Пропущенные – строки, чей id в
+    архиве уже занят другой записью; они остаются в рабочем файле.
+    """
+    if before is None and not contract_ids:
+        raise ValueError("Укажите дату отсечения и/или договоры для архивирования")
+
+    conditions = ["ts_начала IS NOT NULL"]
+    params: list = []
+    if before is not None:
+        conditions.append("ts_начала < ?")
+        params.append(day_start_ts(before))
+    if contract_ids:
+        conditions.append(f"id_договора IN ({', '.join('?' * len(contract_ids))})")
+        params.extend(contract_ids)
+    where = " AND ".join(conditions)
+
+    conn = connect(db_path, isolation_level=None)
+    try:
+        years = [
+            int(row[0]) for row in conn.execute(
+                f"SELECT DISTINCT strftime('%Y', ts_начала, 'unixepoch') "
+                f"FROM main.выполненные_работы WHERE {where} ORDER BY 1",
+                params,
+            )
+        ]
+        result = {}
+        for year in years:
+            moved, skipped = _move_year(conn, year, archive_path(db_path, year), where, params, chunk_size)
+            result[year] = (moved, skipped)
+            if on_year:
+                on_year(year, moved, skipped)
+        return result
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Перенос старых выполненных работ в архивы по годам")
+    parser.add_argument("db_path", help="рабочий файл БД")
+    parser.add_argument("--before", type=date.fromisoformat, metavar="ГГГГ-ММ-ДД",
+                        help="архивировать работы, начатые раньше этой даты")
+    parser.add_argument("--contract", type=int, action="append", dest="contracts", metavar="ID",
+                        help="архивировать работы договора (можно указать несколько раз)")
+    parser.add_argument("--chunk", type=int, default=CHUNK_SIZE, help="строк в одной порции")
+    args = parser.parse_args()
+    if args.before is None and not args.contracts:
+        parser.error("нужно указать --before и/или --contract")
+
+    started = time.perf_counter()
+    results = archive_works(
+        args.db_path, args.before, args.contracts, args.chunk,
+        on_year=lambda year, moved, skipped: print(
+            f"{year}: перенесено {moved}" + (f", пропущено {skipped}" if skipped else "")
+        ),
+    )
+    if not results:
+        print("Нет работ для архивирования")
+    print(f"Готово за {time.perf_counter() - started:.1f} с")
@@ -0,0 +1,143 @@
+"""
+backup.py
+Резервное копирование БД «на ходу» через sqlite3 backup API.
+
+Копия снимается порциями по BACKUP_PAGES страниц с паузой BACKUP_SLEEP между
+ними, поэтому операторы могут продолжать работу. На время копирования на
+исходном соединении открыта читающая транзакция: в режиме WAL запись других
+соединений не блокируется, а копия получается согласованным снимком и не
+начинается заново при каждом изменении БД.
+
+Снимок пишется во временный файл, проверяется PRAGMA quick_check и только
+после этого переименовывается в wagons_ГГГГММДД_ЧЧММСС.db в папке копий.
+Старые снимки сверх keep удаляются.
+
+CLI:
+    python backup.py wagons.db                      – один снимок
+    python backup.py wagons.db --keep 14 --every 60 – снимок каждый час
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from connection import connect
+
+# Страниц за один шаг (при странице 4 КиБ – 1 МиБ) и пауза между шагами, с
+BACKUP_PAGES = 256
+BACKUP_SLEEP = 0.01
+# Сколько снимков хранить по умолчанию
+BACKUP_KEEP = 10
+BACKUP_DIR_NAME = "Резервные копии"
+
+
+class BackupResult(NamedTuple):
+    path: Path
+    size: int          # байт
+    seconds: float
+    check: str         # результат PRAGMA quick_check
+
+    @property
+    def mb_per_s(self) -> float:
+        return self.size / 1_048_576 / self.seconds if self.seconds else 0.0
+
+
+def default_backup_dir(db_path: str | Path) -> Path:
+    return Path(db_path).resolve().parent / BACKUP_DIR_NAME
+
+
+def snapshots(db_path: str | Path, backup_dir: str | Path | None = None) -> list[Path]:
+    """Снимки данной БД в папке копий, от старых к новым."""
+    backup_dir = Path(backup_dir) if backup_dir else default_backup_dir(db_path)
+    stem = Path(db_path).stem
+    return sorted(backup_dir.glob(f"{stem}_????????_??????.db"))
+
+
+def prune(db_path: str | Path, keep: int, backup_dir: str | Path | None = None) -> list[Path]:
+    """Удаляет снимки сверх keep самых новых. Возвращает удалённые пути."""
+    old = snapshots(db_path, backup_dir)[:-keep] if keep > 0 else []
+    for path in old:
+        path.unlink()
+    return old
+
+
+def backup(
+    db_path: str | Path,
+    backup_dir: str | Path | None = None,
+    keep: int | None = BACKUP_KEEP,
+    pages: int = BACKUP_PAGES,
+    sleep: float = BACKUP_SLEEP,
+    on_progress: Callable[[int, int], None] | None = None,
+) -> BackupResult:
+    """
+    Снимает проверенную копию БД в backup_dir (по умолчанию «Резервные копии»
+    рядом с файлом БД) и оставляет keep последних снимков (None – не удалять).
+
+    on_progress(скопировано_страниц, всего_страниц) вызывается после каждого шага.
+    При ошибке проверки временный файл удаляется и выбрасывается RuntimeError.
+    """
+    db_path = Path(db_path)
+    if not db_path.exists():
+        raise FileNotFoundError(f"База данных не найдена: {db_path}")
+    backup_dir = Path(backup_dir) if backup_dir else default_backup_dir(db_path)
+    backup_dir.mkdir(parents=True, exist_ok=True)
+
+    target = backup_dir / f"{db_path.stem}_{datetime.now():%Y%m%d_%H%M%S}.db"
+    partial = target.with_suffix(".db.part")
+
+    def progress(status, remaining, total):
+        if on_progress:
+            on_progress(total - remaining, total)
+
+    started = time.perf_counter()
+    source = connect(db_path, isolation_level=None)
+    destination = sqlite3.connect(partial)
+    try:
+        # Читающая транзакция фиксирует снимок на всё время копирования
+        source.execute("BEGIN")
+        source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        source.backup(destination, pages=pages, progress=progress, sleep=sleep)
+        source.execute("COMMIT")
+
+        # Снимок – один самодостаточный файл, без -wal/-shm рядом
+        destination.execute("PRAGMA journal_mode = DELETE")
+        check = destination.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        destination.close()
+        source.close()
+    seconds = time.perf_counter() - started
+
+    if check != "ok":
+        partial.unlink(missing_ok=True)
+        raise RuntimeError(f"Снимок {target.name} не прошёл quick_check: {check}")
+    os.replace(partial, target)
+
+    if keep is not None:
+        prune(db_path, keep, backup_dir)
+    return BackupResult(target, target.stat().st_size, seconds, check)
+
+
+def describe(result: BackupResult) -> str:
+    return (f"{result.path.name}: {result.size / 1_048_576:.1f} МБ за {result.seconds:.1f} с "
+            f"({result.mb_per_s:.1f} МБ/с), quick_check: {result.check}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Резервная копия БД без остановки работы")
+    parser.add_argument("db_path", help="файл БД")
+    parser.add_argument("--dir", help=f"папка копий (по умолчанию «{BACKUP_DIR_NAME}» рядом с БД)")
+    parser.add_argument("--keep", type=int, default=BACKUP_KEEP, help="сколько последних снимков хранить")
+    parser.add_argument("--pages", type=int, default=BACKUP_PAGES, help="страниц за один шаг")
+    parser.add_argument("--sleep", type=float, default=BACKUP_SLEEP, help="пауза между шагами, с")
+    parser.add_argument("--every", type=float, metavar="МИН", help="повторять каждые МИН минут")
+    args = parser.parse_args()
+
+    while True:
+        print(describe(backup(args.db_path, args.dir, args.keep, args.pages, args.sleep)))
+        if not args.every:
+            break
+        time.sleep(args.every * 60)
@@ -0,0 +1,7 @@
+"""
+Замеры производительности на синтетических базах.
+
+Запуск из папки DB:
+    python -m benchmarks.indexes --rows 1000000
+    python -m benchmarks.suite --out results.json --compare baseline.json
+"""
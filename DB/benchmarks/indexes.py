@@ -0,0 +1,167 @@
+"""
+benchmarks/indexes.py
+Сравнивает время отчётных запросов к выполненным_работам без индексов и с ними.
+
+    python -m benchmarks.indexes --rows 1000000
+
+Создаёт временную БД, наполняет её синтетическими работами, замеряет запросы
+«как в GUI» (акт по договору, оплата работника, работа по вагону для Word),
+затем строит индексы из migrations.WORK_INDEXES и повторяет замеры.
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from connection import connect
+from DB import create_db
+from migrations import WORK_INDEXES
+from reports import period_bounds
+
+WAGONS = 2000
+CONTRACTS = 50
+SERVICES = 40
+WORKERS = 100
+HISTORY_DAYS = 5 * 365
+
+# Запросы повторяют фильтры из ExcelReportDialog, WorkerPaymentDialog и show_fill_word_dialog
+QUERIES = {
+    "акт по договору": (
+        """
+        SELECT у.id, у.наименование, у.стоимость_без_ндс, у.стоимость_с_ндс, в.номер
+        FROM выполненные_работы вр
+        JOIN услуги у ON вр.id_услуги = у.id
+        JOIN вагоны в ON вр.id_вагона = в.id
+        WHERE вр.id_договора = ? AND вр.ts_начала >= ? AND вр.ts_начала < ?
+        ORDER BY у.наименование, в.номер
+        """,
+        lambda rnd, start, end: (rnd.randint(1, CONTRACTS), start, end),
+    ),
+    "оплата работника": (
+        """
+        SELECT SUM(у.стоимость_без_ндс)
+        FROM выполненные_работы в
+        JOIN услуги у ON в.id_услуги = у.id
+        WHERE в.id_исполнителя = ? AND в.ts_начала >= ? AND в.ts_начала < ?
+        """,
+        lambda rnd, start, end: (rnd.randint(1, WORKERS), start, end),
+    ),
+    "работа по вагону (Word)": (
+        """
+        SELECT вр.id, вр.дата_начала_, вр.дата_окончания_, вр.подписант
+        FROM выполненные_работы вр
+        WHERE вр.id_вагона = ? AND вр.id_договора = ?
+        ORDER BY вр.ts_начала DESC
+        LIMIT 1
+        """,
+        lambda rnd, start, end: (rnd.randint(1, WAGONS), rnd.randint(1, CONTRACTS)),
+    ),
+}
+
+
+def build_database(path: str, rows: int, seed: int = 42) -> None:
+    """Создаёт схему без индексов и наполняет её rows выполненными работами."""
+    create_db(path)
+    rnd = random.Random(seed)
+
+    conn = connect(path, profile="bulk")
+    for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+    ).fetchall():
+        conn.execute(f"DROP INDEX {name}")
+
+    conn.executemany("INSERT INTO вагоны (номер) VALUES (?)",
+                     [(f"024-{i:05d}",) for i in range(1, WAGONS + 1)])
+    conn.executemany("INSERT INTO договоры (номер, дата) VALUES (?, '2020-01-01')",
+                     [(f"2020.{i:06d}",) for i in range(1, CONTRACTS + 1)])
+    conn.executemany(
+        "INSERT INTO услуги (наименование, стоимость_без_ндс, стоимость_с_ндс, стоимость_работнику) "
+        "VALUES (?, ?, ?, ?)",
+        [(f"Услуга {i}", 1000.0 * i, 1200.0 * i, 300.0 * i) for i in range(1, SERVICES + 1)])
+    conn.executemany("INSERT INTO исполнители (фио) VALUES (?)",
+                     [(f"Исполнитель {i}",) for i in range(1, WORKERS + 1)])
+
+    origin = datetime(2020, 1, 1)
+    batch = []
+    for _ in range(rows):
+        start = origin + timedelta(days=rnd.randrange(HISTORY_DAYS), hours=rnd.randint(8, 12))
+        end = start + timedelta(hours=rnd.randint(1, 8))
+        batch.append((rnd.randint(1, WAGONS), rnd.randint(1, CONTRACTS), rnd.randint(1, SERVICES),
+                      rnd.randint(1, WORKERS), start.strftime("%Y-%m-%d %H:%M"),
+                      end.strftime("%Y-%m-%d %H:%M"), "Начальник депо"))
+        if len(batch) >= 50_000:
+            _insert_works(conn, batch)
+            batch.clear()
+    if batch:
+        _insert_works(conn, batch)
+    conn.commit()
+    conn.close()
+
+
+def _insert_works(conn: sqlite3.Connection, batch: list) -> None:
+    conn.executemany(
+        """INSERT INTO выполненные_работы
+           (id_вагона, id_договора, id_услуги, id_исполнителя, дата_начала_, дата_окончания_, подписант)
+           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        batch,
+    )
+
+
+def time_queries(conn: sqlite3.Connection, repeats: int, seed: int = 7) -> dict:
+    """Возвращает медианное время каждого запроса в миллисекундах."""
+    results = {}
+    for name, (sql, make_params) in QUERIES.items():
+        rnd = random.Random(seed)
+        timings = []
+        for _ in range(repeats):
+            params = make_params(rnd, *period_bounds(date(2023, 3, 1), date(2023, 3, 31)))
+            started = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        results[name] = timings[len(timings) // 2]
+    return results
+
+
+def run(rows: int, repeats: int, keep: str | None = None) -> None:
+    tmp_dir = tempfile.mkdtemp(prefix="wagons_bench_")
+    path = keep or os.path.join(tmp_dir, "wagons_bench.db")
+
+    print(f"Генерация {rows:,} выполненных работ → {path}")
+    started = time.perf_counter()
+    build_database(path, rows)
+    print(f"  готово за {time.perf_counter() - started:.1f} с")
+
+    conn = connect(path)
+    before = time_queries(conn, repeats)
+
+    started = time.perf_counter()
+    conn.executescript(WORK_INDEXES)
+    conn.commit()
+    print(f"Построение индексов: {time.perf_counter() - started:.1f} с")
+
+    after = time_queries(conn, repeats)
+    conn.close()
+
+    print()
+    print(f"{'Запрос':<28}{'без индексов, мс':>18}{'с индексами, мс':>18}{'ускорение':>12}")
+    for name in QUERIES:
+        speedup = before[name] / after[name] if after[name] else float("inf")
+        print(f"{name:<28}{before[name]:>18.2f}{after[name]:>18.2f}{speedup:>11.0f}x")
+
+    if not keep:
+        os.remove(path)
+        os.rmdir(tmp_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замер отчётных запросов с индексами и без")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="число выполненных работ")
+    parser.add_argument("--repeats", type=int, default=9, help="повторов каждого запроса")
+    parser.add_argument("--keep", metavar="PATH", help="сохранить сгенерированную БД по этому пути")
+    args = parser.parse_args()
+    run(args.rows, args.repeats, args.keep)
@@ -0,0 +1,462 @@
+"""
+benchmarks/suite.py
+Замеры «горячих» путей программы на синтетических базах 10k, 100k и 1M работ.
+
+    python -m benchmarks.suite --scale 10k --scale 100k --out results.json
+    python -m benchmarks.suite --out results.json --compare baseline.json
+    python -m benchmarks.suite --compare baseline.json --current results.json
+
+Базы берутся из кэша фикстур (fill_test_data.fixture): большая база
+генерируется один раз, следующие запуски начинаются сразу.
+
+Замеры:
+• акт и отчёт по договору – выборка (reports.act_rows / contract_services)
+  и таблица pandas (reports.act_frame / contract_frame), как в
+  ExcelReportDialog.generate_report и ContractReportDialog.generate_report;
+• оплата работника – reports.payroll_breakdown по месяцам за год;
+• word.extract_placeholders / replace_placeholders на маленьком и огромном шаблоне;
+• импорт из Excel – чтение листа, приведение значений (excel_import) и
+  вставка по строке в одной транзакции, как в SQLiteEditor.import_from_excel;
+• загрузка модели таблицы выполненные_работы (paged_model.PagedTableModel,
+  как в SQLiteEditor.load_table) и первое окно после сортировки по колонке
+  с индексом (вагон) и без него (услуга – top-N);
+• холодный старт – python -X importtime -c "import GUI" в отдельном
+  процессе: время импорта против бюджета COLD_START_BUDGET_S и проверка,
+  что pandas, python-docx и openpyxl не загружаются при старте.
+
+Замер без нужной библиотеки (pandas, openpyxl, python-docx, PyQt5)
+пропускается с указанием причины. Каждый замер повторяется repeats раз
+(берётся медиана) и ещё раз под tracemalloc для пикового объёма памяти.
+
+Результат – JSON: {"meta": {...}, "results": [{scale, name, wall_s,
+wall_min_s, peak_kib, rows, rows_per_s} | {scale, name, skipped}]}.
+Режим --compare сравнивает с сохранённым базовым прогоном и завершается с
+кодом 1, если время или память выросли больше порога; код 1 и при выходе
+холодного старта за бюджет.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+from pathlib import Path
+
+from connection import connect, snapshot
+from fill_test_data import SCALES, DataSize, fixture
+from reports import act_frame, act_rows, contract_frame, contract_services, payroll_breakdown
+
+SCALE_SIZES = {
+    "10k": SCALES["small"],
+    "100k": DataSize(wagons=5_000, workers=150, contracts=500, services=80, works=100_000, days=730),
+    "1M": SCALES["medium"],
+}
+
+# Период отчётов: последний год фикстуры (FIXTURE_UNTIL = 2025-01-01)
+PERIOD = (date(2024, 1, 1), date(2024, 12, 31))
+# Строк листа Excel и абзацев «огромного» шаблона Word
+IMPORT_ROWS = 5_000
+HUGE_TEMPLATE_PARAGRAPHS = 5_000
+# Порог регрессии по умолчанию: +20 % к времени или памяти
+THRESHOLD = 0.20
+# Холодный старт: импорт GUI без БД, с и модули, которых при старте быть не должно
+COLD_START = "холодный старт: import GUI"
+COLD_START_BUDGET_S = 1.5
+COLD_START_FORBIDDEN = ("pandas", "docx", "openpyxl")
+
+
+class Skip(Exception):
+    """Замер невозможен в этом окружении (нет библиотеки и т. п.)."""
+
+
+def _require(module: str):
+    try:
+        return __import__(module)
+    except ImportError:
+        raise Skip(f"нет модуля {module}")
+
+
+# ──────────────────────────── замеры ─────────────────────────────────────── #
+# Замер – функция(контекст) → подготовленная функция без аргументов, которая
+# выполняет измеряемую работу и возвращает число обработанных строк.
+
+def _hottest(conn, column: str) -> int:
+    return conn.execute(
+        f"SELECT {column} FROM выполненные_работы GROUP BY {column} ORDER BY COUNT(*) DESC LIMIT 1"
+    ).fetchone()[0]
+
+
+def bench_act(ctx):
+    _require("pandas")
+    with snapshot(ctx["db"]) as conn:
+        contract_id = _hottest(conn, "id_договора")
+
+    def run():
+        with snapshot(ctx["db"]) as conn:
+            rows = act_rows(conn, contract_id, *PERIOD)
+        act_frame(rows)
+        return len(rows)
+    return run
+
+
+def bench_contract(ctx):
+    _require("pandas")
+    with snapshot(ctx["db"]) as conn:
+        contract_id = _hottest(conn, "id_договора")
+
+    def run():
+        with snapshot(ctx["db"]) as conn:
+            services = contract_services(conn, contract_id)
+        contract_frame(services)
+        return sum(row[4] for row in services)
+    return run
+
+
+def bench_payroll(ctx):
+    with snapshot(ctx["db"]) as conn:
+        worker_id = _hottest(conn, "id_исполнителя")
+
+    def run():
+        with snapshot(ctx["db"]) as conn:
+            return sum(works for _, works, _ in payroll_breakdown(conn, worker_id, *PERIOD, "month"))
+    return run
+
+
+def _template(ctx, paragraphs: int) -> Path:
+    """Шаблон Word с маркерами в абзацах и таблице; кэшируется в папке прогона."""
+    docx = _require("docx")
+    path = Path(ctx["tmp"]) / f"шаблон_{paragraphs}.docx"
+    if not path.exists():
+        doc = docx.Document()
+        markers = ["договоры.номер", "договоры.дата", "вагоны.номер", "вагоны.подразделение",
+                   "сумма(договоры.номер)", "номер_акта"]
+        for i in range(paragraphs):
+            paragraph = doc.add_paragraph(f"Абзац {i}: ")
+            # Маркер, разбитый на несколько run'ов, – самый дорогой случай
+            paragraph.add_run("[")
+            paragraph.add_run(markers[i % len(markers)]).bold = True
+            paragraph.add_run(f"] и [{markers[(i + 1) % len(markers)]}].")
+        table = doc.add_table(rows=max(paragraphs // 50, 1), cols=2)
+        for row in table.rows:
+            row.cells[0].text = "Договор"
+            row.cells[1].text = "[договоры.номер]"
+        doc.save(path)
+    return path
+
+
+def _template_paragraphs(paragraphs: int):
+    def bench_extract(ctx):
+        path = _template(ctx, paragraphs)
+        word = _require("word")
+
+        def run():
+            word.extract_placeholders(str(path))
+            return paragraphs
+        return run
+    return bench_extract
+
+
+def _replace_paragraphs(paragraphs: int):
+    def bench_replace(ctx):
+        path = _template(ctx, paragraphs)
+        word = _require("word")
+        mapping = {marker: f"значение {marker}" for marker in word.extract_placeholders(str(path))}
+        output = Path(ctx["tmp"]) / f"результат_{paragraphs}.docx"
+
+        def run():
+            word.replace_placeholders(str(path), str(output), mapping)
+            return paragraphs
+        return run
+    return bench_replace
+
+
+def bench_excel_import(ctx):
+    pd = _require("pandas")
+    _require("openpyxl")
+    excel_import = _require("excel_import")
+
+    xlsx = Path(ctx["tmp"]) / f"импорт_{IMPORT_ROWS}.xlsx"
+    if not xlsx.exists():
+        pd.DataFrame({
+            "Номер": [f"900-{i:05d}" for i in range(IMPORT_ROWS)],
+            "Собственник": ["ФПК"] * IMPORT_ROWS,
+            "Подразделение": ["ЛВЧ-1"] * IMPORT_ROWS,
+            "Дата_КР": pd.date_range("2020-01-01", periods=IMPORT_ROWS, freq="h"),
+        }).to_excel(xlsx, index=False)
+
+    # Отдельная копия для записи; каждый прогон откатывает свою транзакцию
+    db = fixture(Path(ctx["tmp"]) / f"импорт_{ctx['scale']}.db", ctx["size"])
+
+    def run():
+        df = pd.read_excel(xlsx)
+        conn = connect(db, isolation_level=None)
+        try:
+            table_columns = [row[1] for row in conn.execute("PRAGMA table_info(вагоны)")]
+            mapped, ordered = excel_import.map_columns(table_columns, df.columns)
+            sql = f"INSERT INTO вагоны ({', '.join(ordered)}) VALUES ({', '.join('?' * len(ordered))})"
+            conn.execute("BEGIN")
+            for _, values in excel_import.row_values(df, mapped, ordered):
+                conn.execute(sql, values)
+            conn.execute("ROLLBACK")
+        finally:
+            conn.close()
+        return len(df)
+    return run
+
+
+def _model_load(full: bool, sort: str | None = None):
+    def bench_model(ctx):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        try:
+            from PyQt5 import QtCore, QtSql
+            from paged_model import PagedTableModel
+        except ImportError:
+            raise Skip("нет модуля PyQt5")
+        app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+        ctx["qt_app"] = app
+
+        def run():
+            db = QtSql.QSqlDatabase.addDatabase("QSQLITE", "benchmark")
+            db.setDatabaseName(str(ctx["db"]))
+            db.open()
+            try:
+                model = PagedTableModel(None, db)
+                model.setTable("выполненные_работы")
+                for column, table, display in (("id_вагона", "вагоны", "номер"),
+                                               ("id_договора", "договоры", "номер"),
+                                               ("id_услуги", "услуги", "наименование"),
+                                               ("id_исполнителя", "исполнители", "фио")):
+                    model.setRelation(model.fieldIndex(column), QtSql.QSqlRelation(table, "id", display))
+                if sort:
+                    model.sort(model.fieldIndex(sort), QtCore.Qt.AscendingOrder)
+                else:
+                    model.select()
+                while full and model.canFetchMore():
+                    model.fetchMore()
+                rows = model.rowCount()
+                model.clear()
+                del model
+            finally:
+                db.close()
+                del db
+                QtSql.QSqlDatabase.removeDatabase("benchmark")
+            return rows
+        return run
+    return bench_model
+
+
+BENCHMARKS = {
+    "акт по договору (SQL + pandas)": bench_act,
+    "отчёт по договору (SQL + pandas)": bench_contract,
+    "оплата работника по месяцам": bench_payroll,
+    "word: маркеры, малый шаблон": _template_paragraphs(20),
+    "word: маркеры, огромный шаблон": _template_paragraphs(HUGE_TEMPLATE_PARAGRAPHS),
+    "word: замена, малый шаблон": _replace_paragraphs(20),
+    "word: замена, огромный шаблон": _replace_paragraphs(HUGE_TEMPLATE_PARAGRAPHS),
+    "импорт из Excel": bench_excel_import,
+    "модель таблицы: select": _model_load(full=False),
+    "модель таблицы: все строки": _model_load(full=True),
+    "модель таблицы: сортировка по индексу": _model_load(full=False, sort="id_вагона"),
+    "модель таблицы: сортировка без индекса": _model_load(full=False, sort="id_услуги"),
+}
+
+
+def import_times(module: str) -> dict[str, float]:
+    """
+    Время импорта module в новом процессе (python -X importtime): {модуль:
+    накопленное время, с} для всех загруженных модулей.
+    """
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=Path(__file__).resolve().parents[1], env=env,
+                          capture_output=True, text=True, encoding="utf-8", errors="replace")
+    if proc.returncode != 0:
+        lines = proc.stderr.strip().splitlines()
+        raise Skip(lines[-1] if lines else f"import {module}: код {proc.returncode}")
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative) / 1_000_000
+    return times
+
+
+def cold_start(repeats: int) -> dict:
+    """Замер холодного старта: медиана по repeats процессам, бюджет и тяжёлые модули."""
+    runs = [import_times("GUI") for _ in range(repeats)]
+    totals = [times["GUI"] for times in runs]
+    last = runs[-1]
+    wall = statistics.median(totals)
+    return {
+        "wall_s": round(wall, 6),
+        "wall_min_s": round(min(totals), 6),
+        "peak_kib": None,
+        "rows": 0,
+        "rows_per_s": None,
+        "budget_s": COLD_START_BUDGET_S,
+        "heavy": [name for name in COLD_START_FORBIDDEN if name in last],
+        "slowest": sorted(((name, round(t, 4)) for name, t in last.items() if name != "GUI"),
+                          key=lambda item: item[1], reverse=True)[:10],
+    }
+
+
+def over_budget(current: dict) -> list[str]:
+    """Нарушения бюджета холодного старта (пусто – в бюджете)."""
+    problems = []
+    for result in current["results"]:
+        if result["name"] != COLD_START or "skipped" in result:
+            continue
+        if result["wall_s"] > result["budget_s"]:
+            problems.append(f"{COLD_START}: {result['wall_s']:.2f} с при бюджете {result['budget_s']:.2f} с")
+        if result["heavy"]:
+            problems.append(f"{COLD_START}: при старте загружаются {', '.join(result['heavy'])}")
+    return problems
+
+
+# ──────────────────────────── прогон ─────────────────────────────────────── #
+def measure(run, repeats: int) -> dict:
+    """Медиана и минимум времени по repeats прогонам и пик памяти отдельного прогона."""
+    timings = []
+    rows = 0
+    for _ in range(repeats):
+        started = time.perf_counter()
+        rows = run()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    wall = statistics.median(timings)
+    return {
+        "wall_s": round(wall, 6),
+        "wall_min_s": round(min(timings), 6),
+        "peak_kib": round(peak / 1024, 1),
+        "rows": rows,
+        "rows_per_s": round(rows / wall, 1) if wall else None,
+    }
+
+
+def run_suite(scales, names=None, repeats: int = 5, on_result=None) -> dict:
+    results = []
+    if not names or COLD_START in names:
+        entry = {"scale": "-", "name": COLD_START}
+        try:
+            entry.update(cold_start(repeats))
+        except Skip as e:
+            entry["skipped"] = str(e)
+        results.append(entry)
+        if on_result:
+            on_result(entry)
+    with tempfile.TemporaryDirectory(prefix="wagons_suite_") as tmp:
+        for scale in scales:
+            size = SCALE_SIZES[scale]
+            ctx = {
+                "scale": scale,
+                "size": size,
+                "tmp": tmp,
+                "db": fixture(Path(tmp) / f"{scale}.db", size, read_only=True),
+            }
+            for name, bench in BENCHMARKS.items():
+                if names and name not in names:
+                    continue
+                entry = {"scale": scale, "name": name}
+                try:
+                    entry.update(measure(bench(ctx), repeats))
+                except Skip as e:
+                    entry["skipped"] = str(e)
+                results.append(entry)
+                if on_result:
+                    on_result(entry)
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "repeats": repeats,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = THRESHOLD) -> list[str]:
+    """Регрессии current относительно baseline: строки описаний (пусто – регрессий нет)."""
+    base = {(r["scale"], r["name"]): r for r in baseline["results"] if "skipped" not in r}
+    regressions = []
+    for result in current["results"]:
+        before = base.get((result["scale"], result["name"]))
+        if before is None or "skipped" in result:
+            continue
+        for metric, unit in (("wall_s", "с"), ("peak_kib", "КиБ")):
+            if before[metric] and result[metric] and result[metric] > before[metric] * (1 + threshold):
+                regressions.append(
+                    f"{result['scale']} / {result['name']}: {metric} {before[metric]} → {result[metric]} {unit} "
+                    f"(+{(result[metric] / before[metric] - 1) * 100:.0f} %)"
+                )
+    return regressions
+
+
+def describe(entry: dict) -> str:
+    if "skipped" in entry:
+        return f"{entry['scale']:>5}  {entry['name']:<36} пропущен: {entry['skipped']}"
+    if entry["name"] == COLD_START:
+        slowest = ", ".join(f"{name} {t * 1000:.0f} мс" for name, t in entry["slowest"][:3])
+        return (f"{entry['scale']:>5}  {entry['name']:<36} {entry['wall_s'] * 1000:>10.2f} мс "
+                f"(бюджет {entry['budget_s'] * 1000:.0f} мс; дольше всех: {slowest})")
+    rate = f"{entry['rows_per_s']:>12,.0f} строк/с".replace(",", " ") if entry["rows_per_s"] else ""
+    return (f"{entry['scale']:>5}  {entry['name']:<36} {entry['wall_s'] * 1000:>10.2f} мс "
+            f"{entry['peak_kib']:>10.0f} КиБ {rate}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замеры горячих путей на базах разного объёма")
+    parser.add_argument("--scale", action="append", choices=SCALE_SIZES, dest="scales",
+                        help="объём базы (можно указать несколько раз; по умолчанию все)")
+    parser.add_argument("--bench", action="append", choices=[COLD_START, *BENCHMARKS], dest="names", metavar="ИМЯ",
+                        help="выполнить только этот замер (можно указать несколько раз)")
+    parser.add_argument("--repeats", type=int, default=5, help="повторов каждого замера")
+    parser.add_argument("--out", help="записать результат в JSON")
+    parser.add_argument("--compare", metavar="BASELINE", help="сравнить с базовым JSON")
+    parser.add_argument("--current", metavar="JSON", help="сравнить готовый результат вместо нового прогона")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="допустимый рост, доля (0.2 = 20 %%)")
+    args = parser.parse_args()
+
+    if args.current:
+        current = json.loads(Path(args.current).read_text(encoding="utf-8"))
+    else:
+        current = run_suite(args.scales or list(SCALE_SIZES), args.names, args.repeats,
+                            on_result=lambda entry: print(describe(entry), flush=True))
+        if args.out:
+            Path(args.out).write_text(json.dumps(current, ensure_ascii=False, indent=2), encoding="utf-8")
+            print(f"Результат записан: {args.out}")
+
+    failed = False
+    budget = over_budget(current)
+    if budget:
+        print("Холодный старт вне бюджета:")
+        for line in budget:
+            print(f"  {line}")
+        failed = True
+
+    if args.compare:
+        regressions = compare(json.loads(Path(args.compare).read_text(encoding="utf-8")), current, args.threshold)
+        if regressions:
+            print(f"Регрессии (порог {args.threshold * 100:.0f} %):")
+            for line in regressions:
+                print(f"  {line}")
+            failed = True
+        else:
+            print("Регрессий нет")
+    sys.exit(1 if failed else 0)
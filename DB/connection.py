@@ -0,0 +1,141 @@
+"""
+connection.py
+Единая точка открытия соединений с БД и профили настроек SQLite.
+
+Все соединения программы – sqlite3 в DB.py, word.py, fill_test_data.py и
+QSQLITE-соединение GUI – открываются через connect()/configure_qt(), чтобы
+работать с одинаковыми PRAGMA:
+
+• default – обычная работа: WAL (чтение не блокируется записью),
+  synchronous=NORMAL (без fsync на каждый коммит), крупный кэш страниц,
+  mmap и временные таблицы в памяти;
+• bulk    – массовая загрузка (импорт, тестовые данные): synchronous=OFF,
+  ещё больший кэш и редкие checkpoint'ы WAL.
+
+Профили – обычные словари в PROFILES; отдельные значения можно
+переопределить аргументами: connect(path, cache_size=-131072).
+
+Соединения замеряют время каждого запроса (sqltrace.TracedConnection);
+sqltrace.enabled = False отключает замер.
+
+Отчёты читают через snapshot(): отдельное соединение только для чтения с
+одной читающей транзакцией WAL. Весь отчёт видит согласованное состояние БД
+на момент начала и не мешает правкам через соединение GUI.
+"""
+
+import logging
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+
+import sqltrace
+
+log = logging.getLogger("ui")
+
+# Порядок важен: busy_timeout задаётся первым, чтобы переключение журнала
+# дождалось чужих блокировок, а не упало с «database is locked».
+PROFILES = {
+    "default": {
+        "busy_timeout": 5000,            # мс ожидания чужой блокировки
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,            # 64 МБ (отрицательное значение – в КиБ)
+        "mmap_size": 268435456,          # 256 МБ
+        "temp_store": "MEMORY",
+    },
+    "bulk": {
+        "busy_timeout": 30000,
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -262144,           # 256 МБ
+        "mmap_size": 268435456,
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 10000,     # страниц между автоматическими checkpoint
+    },
+}
+
+
+def _factory():
+    """Класс соединения: с замером запросов (sqltrace), если он включён."""
+    return sqltrace.TracedConnection if sqltrace.enabled else sqlite3.Connection
+
+
+def pragma_statements(profile: str = "default", **overrides) -> list[str]:
+    """Возвращает список PRAGMA-команд профиля с учётом переопределений."""
+    if profile not in PROFILES:
+        raise ValueError(f"Неизвестный профиль соединения: {profile}")
+    settings = dict(PROFILES[profile])
+    settings.update(overrides)
+    return [f"PRAGMA {name} = {value}" for name, value in settings.items() if value is not None]
+
+
+def connect(
+    db_path: str | Path,
+    profile: str = "default",
+    isolation_level: str | None = "",
+    **overrides,
+) -> sqlite3.Connection:
+    """
+    Открывает sqlite3-соединение и применяет к нему профиль настроек.
+
+    isolation_level передаётся в sqlite3.connect как есть: None – autocommit,
+    когда транзакциями управляет вызывающий код (например, миграции).
+    """
+    conn = sqlite3.connect(db_path, isolation_level=isolation_level, factory=_factory())
+    for statement in pragma_statements(profile, **overrides):
+        conn.execute(statement)
+    return conn
+
+
+def configure_qt(db, profile: str = "default", **overrides) -> None:
+    """Применяет профиль к уже открытому QSqlDatabase (драйвер QSQLITE)."""
+    from PyQt5 import QtSql
+
+    query = QtSql.QSqlQuery(db)
+    for statement in pragma_statements(profile, **overrides):
+        if not query.exec_(statement):
+            log.warning("Не удалось выполнить %s: %s", statement, query.lastError().text())
+
+
+def connect_snapshot(
+    db_path: str | Path,
+    profile: str = "default",
+    prepare: Callable[[sqlite3.Connection], None] | None = None,
+) -> sqlite3.Connection:
+    """
+    Открывает соединение только для чтения и начинает на нём читающую транзакцию.
+
+    prepare(conn) вызывается до начала транзакции – например, чтобы подключить
+    архивы (ATTACH внутри транзакции запрещён). Снимок фиксируется сразу для
+    всех подключённых баз и держится до закрытия соединения.
+    """
+    uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, isolation_level=None, factory=_factory())
+    try:
+        # Режим журнала задаёт пишущая сторона, соединение только читает
+        for statement in pragma_statements(profile, journal_mode=None, wal_autocheckpoint=None):
+            conn.execute(statement)
+        if prepare:
+            prepare(conn)
+        conn.execute("BEGIN")
+        for _, schema, _ in conn.execute("PRAGMA database_list").fetchall():
+            conn.execute(f'SELECT COUNT(*) FROM "{schema}".sqlite_master').fetchone()
+    except Exception:
+        conn.close()
+        raise
+    return conn
+
+
+@contextmanager
+def snapshot(
+    db_path: str | Path,
+    profile: str = "default",
+    prepare: Callable[[sqlite3.Connection], None] | None = None,
+):
+    """with snapshot(path) as conn: … – согласованное чтение, см. connect_snapshot."""
+    conn = connect_snapshot(db_path, profile, prepare)
+    try:
+        yield conn
+    finally:
+        conn.close()
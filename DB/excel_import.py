@@ -0,0 +1,67 @@
+"""
+excel_import.py
+Подготовка строк листа Excel к вставке в таблицу БД – без Qt, чтобы тот же
+путь использовали импорт в GUI (SQLiteEditor.import_from_excel) и бенчмарки.
+
+Столбцы листа сопоставляются с колонками таблицы по имени без учёта
+регистра; значения приводятся к типам, которые понимает SQLite.
+"""
+
+import logging
+from datetime import datetime
+
+import pandas as pd
+
+log = logging.getLogger("import")
+
+
+def map_columns(table_columns, excel_columns) -> tuple[dict, list]:
+    """
+    Возвращает ({колонка таблицы: столбец Excel}, [колонки таблицы для INSERT
+    в порядке таблицы]).
+    """
+    excel_columns_lower = {col.lower(): col for col in excel_columns}
+    mapped_columns = {}
+    insert_columns_ordered = []
+    for tc in table_columns:
+        if tc.lower() in excel_columns_lower:
+            mapped_columns[tc] = excel_columns_lower[tc.lower()]
+            insert_columns_ordered.append(tc)
+    return mapped_columns, insert_columns_ordered
+
+
+def excel_value(original_value):
+    """Приводит значение ячейки к типу для привязки в INSERT."""
+    if pd.isna(original_value):
+        return None
+    if isinstance(original_value, (datetime, pd.Timestamp)):
+        ts_value = pd.to_datetime(original_value)
+        if ts_value.hour == 0 and ts_value.minute == 0 and ts_value.second == 0 and \
+           ts_value.microsecond == 0 and getattr(ts_value, 'nanosecond', 0) == 0:
+            return ts_value.strftime("%Y-%m-%d")
+        return ts_value.strftime("%Y-%m-%d %H:%M:%S")
+    if type(original_value) is bool:  # bool проверяется раньше int: bool – подкласс int
+        return int(original_value)
+    if type(original_value) is int:
+        return int(original_value)
+    if type(original_value) is float:
+        return float(original_value)
+    if isinstance(original_value, str):
+        return original_value
+    # Прочие типы (numpy-числа и т. п.): сначала пробуем число, иначе строка
+    try:
+        num_val = float(original_value)
+        processed_value = int(num_val) if num_val.is_integer() else num_val
+        log.debug("Converted non-standard numeric/unknown type %r (%s) to %s: %r",
+                  original_value, type(original_value), type(processed_value), processed_value)
+        return processed_value
+    except (ValueError, TypeError):
+        log.debug("Value %r of type %s is being converted to string as a final fallback",
+                  original_value, type(original_value))
+        return str(original_value)
+
+
+def row_values(df, mapped_columns: dict, insert_columns_ordered: list):
+    """Генерирует (индекс строки, [значения для INSERT]) по строкам листа."""
+    for index, row_data in df.iterrows():
+        yield index, [excel_value(row_data[mapped_columns[column]]) for column in insert_columns_ordered]
@@ -1,176 +1,505 @@
-import sqlite3
-from datetime import datetime, timedelta
+"""
+fill_test_data.py
+Наполнение БД синтетическими тест-данными – от демонстрационного набора
+до объёмов нагрузочного тестирования (сотни тысяч вагонов, десятки
+миллионов работ).
+
+Объём задаётся DataSize или готовым пресетом из SCALES. Генерация
+детерминирована: одинаковые seed, объёмы и дата until дают одинаковую БД.
+Распределение приближено к реальному:
+• договоры, вагоны и услуги выбираются по закону Ципфа – небольшое число
+  «горячих» договоров и вагонов собирает большую часть работ;
+• работы укладываются в смены (дневная 08–20, ночная 20–08) за последние
+  days дней до until, длительность – 1–8 ч, но не дальше конца смены;
+• услуга работы берётся из услуг её договора.
+
+Загрузка идёт под профилем bulk порциями executemany по chunk_size строк.
+На время загрузки пользовательские индексы и триггеры заполняемых таблиц
+удаляются и затем создаются заново; своды (rollups.py) и поисковый индекс
+(search.py) пересчитываются одним проходом в конце.
+
+on_progress(этап, сделано, всего) вызывается после каждой порции.
+
+Для тестов и бенчмарков fixture() отдаёт готовую БД из кэша фикстур (ключ –
+объёмы, seed, until, версия схемы и генератора): большая БД генерируется
+один раз, дальше – клон за миллисекунды (см. fixture).
+
+CLI:
+    python fill_test_data.py                          – демонстрационный набор
+    python fill_test_data.py wagons.db --scale large  – пресет
+    python fill_test_data.py wagons.db --works 20000000 --wagons 200000 --seed 7
+    python fill_test_data.py bench.db --scale medium --fixture
+"""
+
+import argparse
+import bisect
+import itertools
+import os
 import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+import relation_cache
+import rollups
+import search
+from connection import connect
+from DB import create_db
+from migrations import latest_version
+
+SEED = 20240601
+# Строк в одном executemany/транзакции
+CHUNK_SIZE = 50_000
+# Показатели распределения Ципфа: чем больше, тем сильнее перекос
+CONTRACT_SKEW = 1.1
+WAGON_SKEW = 1.0
+SERVICE_SKEW = 0.8
+
+
+class DataSize(NamedTuple):
+    wagons: int = 10
+    workers: int = 8
+    contracts: int = 5
+    services: int = 8
+    works: int = 50
+    days: int = 30            # за сколько дней до until распределены работы
+
+
+SCALES = {
+    "demo": DataSize(),
+    "small": DataSize(wagons=1_000, workers=50, contracts=100, services=40, works=10_000, days=365),
+    "medium": DataSize(wagons=20_000, workers=300, contracts=2_000, services=120, works=1_000_000, days=730),
+    "large": DataSize(wagons=200_000, workers=2_000, contracts=20_000, services=300, works=20_000_000, days=1825),
+}
+
+# Таблицы в порядке заполнения
+TABLES = ("вагоны", "исполнители", "услуги", "договоры", "договорные_услуги", "выполненные_работы")
+
+WAGON_NUMBERS = [
+    "024-06064", "024-06065", "024-06066", "024-06067", "024-06068",
+    "024-06069", "024-06070", "024-06071", "024-06072", "024-06073"
+]
+
+OWNERS = ["ДОСС", "ФПК", "РЖД", "ТрансКонтейнер"]
+DIVISIONS = ["ЛВЧ-1", "ЛВЧ-2", "ЛВЧ-3", "ЛВЧ-4", "ЛВЧ-5"]
+
+WORKERS = [
+    "Иванов Иван Иванович",
+    "Петров Петр Петрович",
+    "Сидоров Сидор Сидорович",
+    "Смирнов Алексей Владимирович",
+    "Козлов Дмитрий Сергеевич",
+    "Николаев Николай Николаевич",
+    "Васильев Василий Васильевич",
+    "Алексеев Алексей Алексеевич"
+]
+
+# Для больших объёмов ФИО собираются из частей
+SURNAMES = ["Иванов", "Петров", "Сидоров", "Смирнов", "Козлов", "Николаев", "Васильев",
+            "Алексеев", "Фёдоров", "Морозов", "Волков", "Соколов", "Лебедев", "Ёлкин"]
+NAMES = ["Иван", "Петр", "Сидор", "Алексей", "Дмитрий", "Николай", "Василий", "Сергей", "Андрей"]
+PATRONYMICS = ["Иванович", "Петрович", "Сидорович", "Владимирович", "Сергеевич",
+               "Николаевич", "Васильевич", "Алексеевич", "Андреевич"]
+
+SERVICES = [
+    {
+        "наименование": "Ремонт тормозной системы",
+        "стоимость_без_ндс": 15000,
+        "стоимость_работнику": 5000,
+        "описание": "Полная диагностика и ремонт тормозной системы вагона"
+    },
+    {
+        "наименование": "Замена колесных пар",
+        "стоимость_без_ндс": 25000,
+        "стоимость_работнику": 8000,
+        "описание": "Замена изношенных колесных пар на новые"
+    },
+    {
+        "наименование": "Проверка автосцепки",
+        "стоимость_без_ндс": 8000,
+        "стоимость_работнику": 3000,
+        "описание": "Проверка и регулировка автосцепного устройства"
+    },
+    {
+        "наименование": "Ремонт системы отопления",
+        "стоимость_без_ндс": 12000,
+        "стоимость_работнику": 4000,
+        "описание": "Ремонт и наладка системы отопления пассажирского вагона"
+    },
+    {
+        "наименование": "Проверка электрооборудования",
+        "стоимость_без_ндс": 10000,
+        "стоимость_работнику": 3500,
+        "описание": "Комплексная проверка электрооборудования вагона"
+    },
+    {
+        "наименование": "Ремонт дверей",
+        "стоимость_без_ндс": 7000,
+        "стоимость_работнику": 2500,
+        "описание": "Ремонт и регулировка дверных механизмов"
+    },
+    {
+        "наименование": "Проверка системы вентиляции",
+        "стоимость_без_ндс": 9000,
+        "стоимость_работнику": 3000,
+        "описание": "Проверка и очистка системы вентиляции"
+    },
+    {
+        "наименование": "Ремонт системы водоснабжения",
+        "стоимость_без_ндс": 11000,
+        "стоимость_работнику": 3800,
+        "описание": "Ремонт и прочистка системы водоснабжения"
+    }
+]
+
+SIGNERS = ["Главный инженер", "Начальник депо", "Технический директор", "Руководитель участка"]
+
+# Смены: (час начала, длительность, ч)
+SHIFTS = [(8, 12), (20, 12)]
+# Доля работ в дневную смену
+DAY_SHIFT_SHARE = 0.7
+
+
+def zipf_weights(count: int, skew: float) -> list[float]:
+    """Накопленные веса Ципфа для random.choices(cum_weights=…)."""
+    return list(itertools.accumulate(1.0 / rank ** skew for rank in range(1, count + 1)))
+
+
+def _hot_order(rng: random.Random, ids: list[int]) -> list[int]:
+    """Перемешивает id, чтобы «горячими» оказались не только первые записи."""
+    ids = list(ids)
+    rng.shuffle(ids)
+    return ids
+
+
+def _chunks(rows, chunk_size: int):
+    iterator = iter(rows)
+    while chunk := list(itertools.islice(iterator, chunk_size)):
+        yield chunk
+
+
+def _wagon_rows(rng: random.Random, size: DataSize, until: date):
+    for i in range(size.wagons):
+        number = WAGON_NUMBERS[i] if i < len(WAGON_NUMBERS) else f"{100 + i // 100_000:03d}-{i % 100_000:05d}"
+        # Некоторые даты ремонта оставляем пустыми
+        dates = [
+            (until - timedelta(days=rng.randint(0, 365))).isoformat() if rng.random() < 0.7 else None
+            for _ in range(4)
+        ]
+        yield (number, rng.choice(OWNERS), rng.choice(DIVISIONS), *dates)
+
+
+def _worker_rows(size: DataSize):
+    generated = (f"{surname} {name} {patronymic}" for name, patronymic, surname
+                 in itertools.product(NAMES, PATRONYMICS, SURNAMES))
+    # Сочетания частей кончились – добавляем табельный номер
+    numbered = (f"{WORKERS[i % len(WORKERS)]} (таб. {i})" for i in itertools.count(1))
+    names = dict.fromkeys(itertools.chain(WORKERS, generated))
+    for fio in itertools.islice(itertools.chain(names, numbered), size.workers):
+        yield (fio,)
+
+
+def _service_rows(rng: random.Random, size: DataSize):
+    for i in range(size.services):
+        if i < len(SERVICES):
+            service = SERVICES[i]
+            name, description = service["наименование"], service["описание"]
+            price, worker_price = service["стоимость_без_ндс"], service["стоимость_работнику"]
+        else:
+            base = SERVICES[i % len(SERVICES)]
+            name = f"{base['наименование']} (вариант {i // len(SERVICES)})"
+            description = base["описание"]
+            price = rng.randrange(3000, 40000, 500)
+            worker_price = price // 3
+        yield (name, price, int(price * 1.2), worker_price, description)
+
+
+def _contract_rows(rng: random.Random, size: DataSize, until: date):
+    for i in range(1, size.contracts + 1):
+        yield (f"{until.year}.{i:06d}", (until - timedelta(days=rng.randint(0, 180))).isoformat())
 
-def fill_test_data(db_path="wagons.db"):
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    # Очищаем таблицы
-    cursor.execute("DELETE FROM выполненные_работы")
-    cursor.execute("DELETE FROM договорные_услуги")
-    cursor.execute("DELETE FROM услуги")
-    cursor.execute("DELETE FROM договоры")
-    cursor.execute("DELETE FROM вагоны")
-    cursor.execute("DELETE FROM исполнители")
-
-    # Списки тестовых данных
-    wagon_numbers = [
-        "024-06064", "024-06065", "024-06066", "024-06067", "024-06068",
-        "024-06069", "024-06070", "024-06071", "024-06072", "024-06073"
-    ]
-    
-    owners = ["ДОСС", "ФПК", "РЖД", "ТрансКонтейнер"]
-    divisions = ["ЛВЧ-1", "ЛВЧ-2", "ЛВЧ-3", "ЛВЧ-4", "ЛВЧ-5"]
-    
-    workers = [
-        "Иванов Иван Иванович",
-        "Петров Петр Петрович",
-        "Сидоров Сидор Сидорович",
-        "Смирнов Алексей Владимирович",
-        "Козлов Дмитрий Сергеевич",
-        "Николаев Николай Николаевич",
-        "Васильев Василий Васильевич",
-        "Алексеев Алексей Алексеевич"
-    ]
-    
-    services = [
-        {
-            "наименование": "Ремонт тормозной системы",
-            "стоимость_без_ндс": 15000,
-            "стоимость_работнику": 5000,
-            "описание": "Полная диагностика и ремонт тормозной системы вагона"
-        },
-        {
-            "наименование": "Замена колесных пар",
-            "стоимость_без_ндс": 25000,
-            "стоимость_работнику": 8000,
-            "описание": "Замена изношенных колесных пар на новые"
-        },
-        {
-            "наименование": "Проверка автосцепки",
-            "стоимость_без_ндс": 8000,
-            "стоимость_работнику": 3000,
-            "описание": "Проверка и регулировка автосцепного устройства"
-        },
-        {
-            "наименование": "Ремонт системы отопления",
-            "стоимость_без_ндс": 12000,
-            "стоимость_работнику": 4000,
-            "описание": "Ремонт и наладка системы отопления пассажирского вагона"
-        },
-        {
-            "наименование": "Проверка электрооборудования",
-            "стоимость_без_ндс": 10000,
-            "стоимость_работнику": 3500,
-            "описание": "Комплексная проверка электрооборудования вагона"
-        },
-        {
-            "наименование": "Ремонт дверей",
-            "стоимость_без_ндс": 7000,
-            "стоимость_работнику": 2500,
-            "описание": "Ремонт и регулировка дверных механизмов"
-        },
-        {
-            "наименование": "Проверка системы вентиляции",
-            "стоимость_без_ндс": 9000,
-            "стоимость_работнику": 3000,
-            "описание": "Проверка и очистка системы вентиляции"
-        },
-        {
-            "наименование": "Ремонт системы водоснабжения",
-            "стоимость_без_ндс": 11000,
-            "стоимость_работнику": 3800,
-            "описание": "Ремонт и прочистка системы водоснабжения"
-        }
-    ]
-
-    # Заполняем вагоны
-    for number in wagon_numbers:
-        # Генерируем случайные даты ремонта, некоторые оставляем пустыми
-        dates = []
-        for _ in range(4):  # Было 3, теперь 4
-            if random.random() < 0.7:  # 70% шанс что дата будет заполнена
-                dates.append((datetime.now() - timedelta(days=random.randint(0, 365))).strftime("%Y-%m-%d"))
-            else:
-                dates.append(None)
-        
-        cursor.execute(
-            "INSERT INTO вагоны (номер, собственник, подразделение, дата_кр, дата_кр1, дата_квр, дата_др) VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (number, random.choice(owners), random.choice(divisions), dates[0], dates[1], dates[2], dates[3])
-        )
-
-    # Заполняем исполнителей
-    for worker in workers:
-        cursor.execute(
-            "INSERT INTO исполнители (фио) VALUES (?)",
-            (worker,)
-        )
-
-    # Заполняем услуги
-    for service in services:
-        cost_with_vat = int(service["стоимость_без_ндс"] * 1.2)
-        cursor.execute(
-            "INSERT INTO услуги (наименование, стоимость_без_ндс, стоимость_с_ндс, стоимость_работнику, описание) VALUES (?, ?, ?, ?, ?)",
-            (service["наименование"], service["стоимость_без_ндс"], cost_with_vat, service["стоимость_работнику"], service["описание"])
-        )
-
-    # Заполняем договоры
-    for i in range(1, 6):
-        cursor.execute(
-            "INSERT INTO договоры (номер, дата) VALUES (?, ?)",
-            (f"2024.{i:06d}", (datetime.now() - timedelta(days=random.randint(0, 180))).strftime("%Y-%m-%d"))
-        )
-
-    # Заполняем договорные_услуги
-    cursor.execute("SELECT id FROM договоры")
-    contract_ids = [row[0] for row in cursor.fetchall()]
-    
-    cursor.execute("SELECT id FROM услуги")
-    service_ids = [row[0] for row in cursor.fetchall()]
-    
-    for contract_id in contract_ids:
-        # Для каждого договора выбираем случайное количество услуг
-        selected_services = random.sample(service_ids, random.randint(3, len(service_ids)))
-        for service_id in selected_services:
-            cursor.execute(
-                "INSERT INTO договорные_услуги (id_договора, id_услуги) VALUES (?, ?)",
-                (contract_id, service_id)
+
+def _work_rows(rng, size: DataSize, until: date, wagon_ids, worker_ids, contract_ids, contract_services):
+    """Строки выполненных_работ; генерируются порциями, чтобы не держать все в памяти."""
+    wagons = _hot_order(rng, wagon_ids)
+    contracts = _hot_order(rng, contract_ids)
+    wagon_weights = zipf_weights(len(wagons), WAGON_SKEW)
+    contract_weights = zipf_weights(len(contracts), CONTRACT_SKEW)
+    service_weights = {cid: zipf_weights(len(ids), SERVICE_SKEW) for cid, ids in contract_services.items()}
+    first_day = until - timedelta(days=max(size.days, 1) - 1)
+    days = [(first_day + timedelta(days=n)).isoformat() for n in range(max(size.days, 1) + 1)]
+
+    clock = [f"{minute // 60:02d}:{minute % 60:02d}" for minute in range(1440)]
+    # random() и bisect вместо randrange/choice: на десятках миллионов строк
+    # генерация, а не вставка, определяет время загрузки
+    random_ = rng.random
+    remaining = size.works
+    while remaining:
+        n = min(remaining, 10_000)
+        remaining -= n
+        for wagon_id, contract_id in zip(
+            rng.choices(wagons, cum_weights=wagon_weights, k=n),
+            rng.choices(contracts, cum_weights=contract_weights, k=n),
+        ):
+            services, weights = contract_services[contract_id], service_weights[contract_id]
+            service_id = services[bisect.bisect(weights, random_() * weights[-1])]
+
+            day = int(random_() * (len(days) - 1))
+            shift_start, shift_hours = SHIFTS[0] if random_() < DAY_SHIFT_SHARE else SHIFTS[1]
+            duration = (1 + int(random_() * 8)) * 60
+            start = shift_start * 60 + int(random_() * ((shift_hours * 60 - duration) // 15 + 1)) * 15
+            end = min(start + duration, (shift_start + shift_hours) * 60)
+            yield (
+                wagon_id, contract_id, service_id, worker_ids[int(random_() * len(worker_ids))],
+                f"{days[day + start // 1440]} {clock[start % 1440]}",
+                f"{days[day + end // 1440]} {clock[end % 1440]}",
+                SIGNERS[int(random_() * len(SIGNERS))],
             )
 
-    # Заполняем выполненные работы
-    cursor.execute("SELECT id FROM вагоны")
-    wagon_ids = [row[0] for row in cursor.fetchall()]
-    
-    cursor.execute("SELECT id FROM исполнители")
-    worker_ids = [row[0] for row in cursor.fetchall()]
-    
-    signers = ["Главный инженер", "Начальник депо", "Технический директор", "Руководитель участка"]
-
-    for _ in range(50):  # Создаем 50 выполненных работ
-        wagon_id = random.choice(wagon_ids)
-        contract_id = random.choice(contract_ids)
-        service_id = random.choice(service_ids)
-        worker_id = random.choice(worker_ids)
-        
-        date = datetime.now() - timedelta(days=random.randint(0, 30))
-        start_time = datetime.combine(date.date(), datetime.min.time()) + timedelta(hours=random.randint(8, 12))
-        end_time = start_time + timedelta(hours=random.randint(1, 8))
-        
-        cursor.execute(
-            """INSERT INTO выполненные_работы 
-            (id_вагона, id_договора, id_услуги, id_исполнителя, 
-             дата_начала_, дата_окончания_, подписант)
-            VALUES (?, ?, ?, ?, ?, ?, ?)""",
-            (wagon_id, contract_id, service_id, worker_id,
-             start_time.strftime("%Y-%m-%d %H:%M"),
-             end_time.strftime("%Y-%m-%d %H:%M"),
-             random.choice(signers))
-        )
-
-    conn.commit()
-    conn.close()
-    print("База данных успешно заполнена тестовыми данными")
+
+def _drop_indexes_and_triggers(conn) -> list[str]:
+    """Удаляет пользовательские индексы и триггеры заполняемых таблиц. Возвращает их DDL."""
+    rows = conn.execute(
+        f"SELECT type, name, sql FROM sqlite_master "
+        f"WHERE type IN ('index', 'trigger') AND sql IS NOT NULL "
+        f"AND tbl_name IN ({', '.join('?' * len(TABLES))})",
+        TABLES,
+    ).fetchall()
+    for kind, name, _ in rows:
+        conn.execute(f'DROP {kind.upper()} IF EXISTS "{name}"')
+    return [sql for _, _, sql in rows]
+
+
+def _table_exists(conn, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+
+def fill_test_data(
+    db_path="wagons.db",
+    size: DataSize = SCALES["demo"],
+    seed: int = SEED,
+    until: date | None = None,
+    chunk_size: int = CHUNK_SIZE,
+    on_progress: Callable[[str, int, int], None] | None = None,
+) -> dict[str, int]:
+    """
+    Перезаписывает данные БД синтетическим набором объёма size.
+
+    until – последний день, в который попадают работы (по умолчанию сегодня).
+    Возвращает число строк в каждой заполненной таблице.
+    """
+    rng = random.Random(seed)
+    until = until or date.today()
+    progress = on_progress or (lambda stage, done, total: None)
+
+    conn = connect(db_path, profile="bulk", isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        saved_ddl = _drop_indexes_and_triggers(conn)
+        # Очищаем таблицы
+        for table in reversed(TABLES):
+            conn.execute(f"DELETE FROM {table}")
+        conn.execute("COMMIT")
+
+        def load(table: str, sql: str, rows, total: int) -> None:
+            done = 0
+            progress(table, 0, total)
+            for chunk in _chunks(rows, chunk_size):
+                conn.execute("BEGIN")
+                conn.executemany(sql, chunk)
+                conn.execute("COMMIT")
+                done += len(chunk)
+                progress(table, done, total)
+
+        def ids(table: str) -> list[int]:
+            return [row[0] for row in conn.execute(f"SELECT id FROM {table} ORDER BY id")]
+
+        try:
+            load("вагоны",
+                 "INSERT INTO вагоны (номер, собственник, подразделение, дата_кр, дата_кр1, дата_квр, дата_др) "
+                 "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                 _wagon_rows(rng, size, until), size.wagons)
+            load("исполнители", "INSERT INTO исполнители (фио) VALUES (?)", _worker_rows(size), size.workers)
+            load("услуги",
+                 "INSERT INTO услуги (наименование, стоимость_без_ндс, стоимость_с_ндс, "
+                 "стоимость_работнику, описание) VALUES (?, ?, ?, ?, ?)",
+                 _service_rows(rng, size), size.services)
+            load("договоры", "INSERT INTO договоры (номер, дата) VALUES (?, ?)",
+                 _contract_rows(rng, size, until), size.contracts)
+
+            # Для каждого договора выбираем случайное количество услуг
+            service_ids = ids("услуги")
+            contract_services = {
+                contract_id: rng.sample(service_ids, rng.randint(min(3, len(service_ids)),
+                                                                 min(12, len(service_ids))))
+                for contract_id in ids("договоры")
+            }
+            load("договорные_услуги", "INSERT INTO договорные_услуги (id_договора, id_услуги) VALUES (?, ?)",
+                 ((cid, sid) for cid, sids in contract_services.items() for sid in sids),
+                 sum(map(len, contract_services.values())))
+
+            if size.works and not (size.wagons and size.workers and contract_services
+                                   and all(contract_services.values())):
+                raise ValueError("Для работ нужны вагоны, исполнители, договоры и услуги")
+            load("выполненные_работы",
+                 """INSERT INTO выполненные_работы
+                 (id_вагона, id_договора, id_услуги, id_исполнителя,
+                  дата_начала_, дата_окончания_, подписант)
+                 VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                 _work_rows(rng, size, until, ids("вагоны"), ids("исполнители"),
+                            list(contract_services), contract_services) if size.works else (),
+                 size.works)
+        finally:
+            # Индексы и триггеры возвращаются и при ошибке загрузки
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            progress("индексы", 0, len(saved_ddl))
+            for n, ddl in enumerate(saved_ddl, 1):
+                conn.execute(ddl)
+                progress("индексы", n, len(saved_ddl))
+
+        # Триггеры сводов, поиска и версий справочников не работали во время загрузки
+        conn.execute("BEGIN")
+        if _table_exists(conn, "версии_справочников"):
+            relation_cache.bump(conn)
+        if _table_exists(conn, next(iter(rollups.ROLLUPS))):
+            progress("своды", 0, 1)
+            rollups.fill(conn)
+            progress("своды", 1, 1)
+        if _table_exists(conn, "поиск"):
+            progress("поиск", 0, 1)
+            search.fill(conn)
+            progress("поиск", 1, 1)
+        conn.execute("COMMIT")
+
+        conn.execute("PRAGMA optimize")
+        return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in TABLES}
+    finally:
+        conn.close()
+
+
+# ──────────────────────────── кэш фикстур ─────────────────────────────────── #
+# Меняется при любом изменении генератора, чтобы старые фикстуры не подходили
+GENERATOR_VERSION = 1
+# Фиксированный последний день работ для фикстур: результат не зависит от даты запуска
+FIXTURE_UNTIL = date(2025, 1, 1)
+FIXTURE_CACHE_ENV = "WAGON_FIXTURE_CACHE"
+
+# ioctl FICLONE (Linux): клон файла с общими блоками на btrfs/XFS
+_FICLONE = 0x40049409
+
+
+def fixture_cache_dir() -> Path:
+    """Папка кэша: переменная окружения WAGON_FIXTURE_CACHE или wagon_fixtures во временной папке."""
+    return Path(os.environ.get(FIXTURE_CACHE_ENV) or Path(tempfile.gettempdir()) / "wagon_fixtures")
+
+
+def fixture_key(size: DataSize, seed: int = SEED, until: date = FIXTURE_UNTIL) -> str:
+    """Имя фикстуры: параметры генератора, зерно и версия схемы."""
+    params = "-".join(f"{field}{value}" for field, value in size._asdict().items())
+    return f"{params}-seed{seed}-{until:%Y%m%d}-schema{latest_version()}-gen{GENERATOR_VERSION}"
+
+
+def _clone(source: Path, target: Path) -> str:
+    """Копирует файл – по возможности без копирования данных. Возвращает способ."""
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        if sys.platform.startswith("linux"):
+            import fcntl
+            try:
+                fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+                return "reflink"
+            except OSError:
+                pass
+        shutil.copyfileobj(src, dst, 16 * 1024 * 1024)
+    return "copy"
+
+
+def fixture(
+    target: str | Path,
+    size: DataSize,
+    seed: int = SEED,
+    until: date = FIXTURE_UNTIL,
+    read_only: bool = False,
+    cache_dir: str | Path | None = None,
+    on_progress: Callable[[str, int, int], None] | None = None,
+) -> Path:
+    """
+    Создаёт в target БД с тест-данными, беря её из кэша фикстур.
+
+    Фикстура генерируется один раз (create_db + fill_test_data) и хранится
+    в кэше с правами только на чтение. Дальше target – клон с общими блоками
+    (reflink) или обычная копия; при read_only=True – жёсткая ссылка на файл
+    кэша, открывать её можно только для чтения (connection.snapshot).
+    """
+    cache_dir = Path(cache_dir) if cache_dir else fixture_cache_dir()
+    cached = cache_dir / f"{fixture_key(size, seed, until)}.db"
+    if not cached.exists():
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        partial = cached.with_suffix(".db.part")
+        partial.unlink(missing_ok=True)
+        create_db(partial)
+        fill_test_data(partial, size, seed, until, on_progress=on_progress)
+        # Фикстура – один самодостаточный файл, без -wal/-shm рядом
+        conn = sqlite3.connect(partial)
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.close()
+        os.chmod(partial, 0o444)
+        os.replace(partial, cached)
+
+    target = Path(target)
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{target}{suffix}").unlink(missing_ok=True)
+    if read_only:
+        try:
+            os.link(cached, target)
+            return target
+        except OSError:
+            pass
+    _clone(cached, target)
+    if read_only:
+        os.chmod(target, 0o444)
+    return target
+
 
 if __name__ == "__main__":
-    fill_test_data() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Наполнение БД синтетическими тест-данными")
+    parser.add_argument("db_path", nargs="?", default="wagons.db", help="файл БД (по умолчанию wagons.db)")
+    parser.add_argument("--scale", choices=SCALES, default="demo", help="пресет объёма")
+    for field in DataSize._fields:
+        parser.add_argument(f"--{field}", type=int, help=f"переопределить {field} пресета")
+    parser.add_argument("--seed", type=int, default=SEED, help="зерно генератора")
+    parser.add_argument("--until", type=date.fromisoformat, metavar="ГГГГ-ММ-ДД",
+                        help="последний день работ (по умолчанию сегодня)")
+    parser.add_argument("--chunk", type=int, default=CHUNK_SIZE, help="строк в одной порции")
+    parser.add_argument("--fixture", action="store_true",
+                        help="взять БД из кэша фикстур (создаётся заново, --until по умолчанию "
+                             f"{FIXTURE_UNTIL:%Y-%m-%d})")
+    args = parser.parse_args()
+
+    size = SCALES[args.scale]._replace(**{
+        field: getattr(args, field) for field in DataSize._fields if getattr(args, field) is not None
+    })
+    started = time.perf_counter()
+    last_report = [0.0]
+
+    def report(stage, done, total):
+        now = time.perf_counter()
+        if done == total or now - last_report[0] > 1:
+            last_report[0] = now
+            print(f"{stage}: {done}/{total}", flush=True)
+
+    if args.fixture:
+        path = fixture(args.db_path, size, args.seed, args.until or FIXTURE_UNTIL, on_progress=report)
+        print(f"{path}: фикстура {fixture_key(size, args.seed, args.until or FIXTURE_UNTIL)} "
+              f"за {time.perf_counter() - started:.2f} с")
+        sys.exit(0)
+
+    counts = fill_test_data(args.db_path, size, args.seed, args.until, args.chunk, report)
+    print(", ".join(f"{table}: {count}" for table, count in counts.items()))
+    print(f"База данных успешно заполнена тестовыми данными за {time.perf_counter() - started:.1f} с "
+          f"({datetime.now():%H:%M:%S})")
@@ -0,0 +1,107 @@
+"""
+logs.py
+Журнал программы вместо отладочных print().
+
+Именованные журналы:
+• word    – заполнение шаблонов Word (word.py, WordTemplateDialog);
+• reports – отчёты Excel и расчёт оплаты;
+• import  – импорт листов Excel;
+• ui      – остальной GUI (редактирование, отмена, открытие БД).
+
+Сообщения пишутся с отложенным форматированием – log.debug("строка %s", row),
+а не f-строкой: при выключенном уровне строка не собирается. В горячих
+циклах (построчный импорт, перебор ячеек) проверка уровня делается один раз
+до цикла через log.isEnabledFor(logging.DEBUG), так что выключенная
+трассировка не стоит ничего.
+
+Записи уходят в очередь (QueueHandler), а в stderr и файл их пишет фоновый
+поток QueueListener – вывод не задерживает GUI-поток.
+
+Уровень по умолчанию – INFO, переопределяется переменной окружения
+WAGON_LOG_LEVEL (DEBUG, INFO, WARNING…) или на вкладке «Диагностика»
+(set_debug).
+"""
+
+import atexit
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+
+LOGGERS = ("word", "reports", "import", "ui")
+LEVEL_ENV = "WAGON_LOG_LEVEL"
+DEFAULT_LEVEL = logging.INFO
+FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+# Ротация файла журнала
+LOG_BYTES = 1_048_576
+LOG_BACKUPS = 3
+
+_listener: QueueListener | None = None
+
+
+def _env_level() -> int:
+    name = os.environ.get(LEVEL_ENV, "").strip().upper()
+    level = logging.getLevelName(name) if name else DEFAULT_LEVEL
+    return level if isinstance(level, int) else DEFAULT_LEVEL
+
+
+def setup(level: int | str | None = None, log_file: str | Path | None = None) -> None:
+    """
+    Подключает именованные журналы к очереди с фоновой записью.
+    level – уровень (None – из WAGON_LOG_LEVEL, иначе INFO);
+    log_file – дополнительно писать в файл с ротацией.
+    Повторный вызов заменяет прежнюю настройку.
+    """
+    global _listener
+    stop()
+
+    formatter = logging.Formatter(FORMAT)
+    handlers = [logging.StreamHandler(sys.stderr)]
+    if log_file is not None:
+        handlers.append(RotatingFileHandler(log_file, maxBytes=LOG_BYTES, backupCount=LOG_BACKUPS,
+                                            encoding="utf-8", delay=True))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    queue_handler = QueueHandler(records)
+    for name in LOGGERS:
+        logger = logging.getLogger(name)
+        for handler in list(logger.handlers):
+            if isinstance(handler, QueueHandler):
+                logger.removeHandler(handler)
+        logger.addHandler(queue_handler)
+        logger.propagate = False
+
+    _listener = QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    set_level(_env_level() if level is None else level)
+
+
+def set_level(level: int | str) -> None:
+    for name in LOGGERS:
+        logging.getLogger(name).setLevel(level)
+
+
+def set_debug(enabled: bool) -> None:
+    """Включает подробный журнал (DEBUG) или возвращает уровень по умолчанию."""
+    set_level(logging.DEBUG if enabled else _env_level())
+
+
+def is_debug() -> bool:
+    return logging.getLogger(LOGGERS[0]).isEnabledFor(logging.DEBUG)
+
+
+def stop() -> None:
+    """Дописывает очередь и останавливает фоновый поток."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop)
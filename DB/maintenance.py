@@ -0,0 +1,207 @@
+"""
+maintenance.py
+Регламентное обслуживание БД: статистика планировщика, возврат свободных
+страниц, проверка целостности.
+
+Обычный прогон (run_maintenance) короткий и подходит для простоя GUI:
+• PRAGMA optimize – ANALYZE только тех таблиц, где статистика устарела
+  (при первом прогоне, когда sqlite_stat1 ещё нет, – полный ANALYZE);
+• PRAGMA incremental_vacuum порциями по VACUUM_SLICE страниц – свободные
+  страницы возвращаются файловой системе без полного VACUUM;
+• PRAGMA quick_check.
+Полный прогон (full=True) выполняет полный ANALYZE и PRAGMA integrity_check.
+
+incremental_vacuum работает только при auto_vacuum=INCREMENTAL. Новые БД
+создаются с этим режимом (DB.create_db); старые переводятся один раз через
+enable_incremental_vacuum() – это требует полного VACUUM.
+
+Каждый прогон записывается в журнал <БД>_обслуживание.log рядом с файлом:
+длительность задач, освобождённые страницы и изменившиеся планы отчётных
+запросов (EXPLAIN QUERY PLAN до и после обновления статистики).
+
+CLI:
+    python maintenance.py wagons.db                 – обычный прогон
+    python maintenance.py wagons.db --full          – полный ANALYZE и integrity_check
+    python maintenance.py wagons.db --incremental   – перевести в auto_vacuum=INCREMENTAL
+    python maintenance.py wagons.db --every 1440    – повторять раз в сутки
+"""
+
+import argparse
+import sqlite3
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+
+from connection import connect
+from reports import ACT_ROWS_SQL, CONTRACT_SERVICES_SQL, PAYROLL_BREAKDOWN_SQL
+
+# Страниц за один PRAGMA incremental_vacuum и пауза между порциями, с
+VACUUM_SLICE = 512
+VACUUM_PAUSE = 0.01
+
+# Отчётные запросы, планы которых сравниваются до и после ANALYZE
+PLAN_QUERIES = {
+    "акт по договору": (ACT_ROWS_SQL.format(source="выполненные_работы"), (1, 0, 1)),
+    "выписка по договору": (CONTRACT_SERVICES_SQL, (1,)),
+    "оплата работника": (PAYROLL_BREAKDOWN_SQL.format(values="(?, ?, ?)"), (0, 1, "", 1)),
+    "работа по вагону (Word)": (
+        "SELECT id FROM выполненные_работы WHERE id_вагона = ? AND id_договора = ? "
+        "ORDER BY ts_начала DESC LIMIT 1",
+        (1, 1),
+    ),
+}
+
+
+class MaintenanceReport(NamedTuple):
+    tasks: list            # [(задача, секунды, результат)]
+    pages_freed: int
+    page_size: int
+    plan_changes: dict     # {запрос: (план до, план после)}
+    check: str
+
+    @property
+    def seconds(self) -> float:
+        return sum(seconds for _, seconds, _ in self.tasks)
+
+
+def log_path(db_path: str | Path) -> Path:
+    db_path = Path(db_path)
+    return db_path.with_name(f"{db_path.stem}_обслуживание.log")
+
+
+def query_plans(conn: sqlite3.Connection) -> dict[str, str]:
+    """Планы отчётных запросов: {запрос: план одной строкой}."""
+    plans = {}
+    for name, (sql, params) in PLAN_QUERIES.items():
+        try:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        except sqlite3.Error as e:
+            plans[name] = f"ошибка: {e}"
+            continue
+        plans[name] = "; ".join(row[-1] for row in rows)
+    return plans
+
+
+def enable_incremental_vacuum(db_path: str | Path) -> bool:
+    """
+    Переводит БД в auto_vacuum=INCREMENTAL (полный VACUUM, БД на это время
+    занята). Возвращает False, если режим уже включён.
+    """
+    conn = connect(db_path, isolation_level=None)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return True
+    finally:
+        conn.close()
+
+
+def _execute(conn: sqlite3.Connection, sql: str) -> str:
+    conn.execute(sql).fetchall()
+    return ""
+
+
+def _timed(tasks: list, name: str, func):
+    started = time.perf_counter()
+    result = func()
+    tasks.append((name, time.perf_counter() - started, result))
+    return result
+
+
+def _incremental_vacuum(conn: sqlite3.Connection) -> int:
+    """Возвращает свободные страницы порциями. Результат – число освобождённых страниц."""
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+    freed = 0
+    while True:
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free == 0:
+            return freed
+        conn.execute(f"PRAGMA incremental_vacuum({VACUUM_SLICE})").fetchall()
+        slice_freed = free - conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if slice_freed <= 0:
+            return freed
+        freed += slice_freed
+        time.sleep(VACUUM_PAUSE)
+
+
+def run_maintenance(db_path: str | Path, full: bool = False) -> MaintenanceReport:
+    """Выполняет прогон обслуживания и дописывает его в журнал (см. log_path)."""
+    db_path = Path(db_path)
+    if not db_path.exists():
+        raise FileNotFoundError(f"База данных не найдена: {db_path}")
+
+    tasks = []
+    conn = connect(db_path, isolation_level=None)
+    try:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        plans_before = query_plans(conn)
+
+        has_stats = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+        ).fetchone() is not None
+        if full or not has_stats:
+            _timed(tasks, "ANALYZE", lambda: _execute(conn, "ANALYZE"))
+        else:
+            _timed(tasks, "PRAGMA optimize", lambda: _execute(conn, "PRAGMA optimize"))
+
+        pages_freed = _timed(tasks, "incremental_vacuum", lambda: _incremental_vacuum(conn))
+
+        check_pragma = "integrity_check" if full else "quick_check"
+        check = _timed(tasks, check_pragma, lambda: "; ".join(
+            row[0] for row in conn.execute(f"PRAGMA {check_pragma}").fetchall()))
+
+        plans_after = query_plans(conn)
+    finally:
+        conn.close()
+
+    plan_changes = {
+        name: (plans_before[name], plans_after[name])
+        for name in PLAN_QUERIES if plans_before[name] != plans_after[name]
+    }
+    report = MaintenanceReport(tasks, pages_freed, page_size, plan_changes, check)
+    with open(log_path(db_path), "a", encoding="utf-8") as log:
+        log.write(describe(report, datetime.now()) + "\n\n")
+    return report
+
+
+def describe(report: MaintenanceReport, when: datetime | None = None) -> str:
+    lines = []
+    if when:
+        lines.append(f"Обслуживание {when:%d.%m.%Y %H:%M:%S}")
+    for name, seconds, result in report.tasks:
+        lines.append(f"  {name}: {seconds:.2f} с" + (f" – {result}" if result not in ("", None) else ""))
+    lines.append(f"  освобождено страниц: {report.pages_freed} "
+                 f"({report.pages_freed * report.page_size / 1_048_576:.1f} МБ)")
+    if report.plan_changes:
+        lines.append("  изменились планы запросов:")
+        for name, (before, after) in report.plan_changes.items():
+            lines.append(f"    {name}:\n      было:  {before}\n      стало: {after}")
+    else:
+        lines.append("  планы отчётных запросов не изменились")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Обслуживание БД: ANALYZE, incremental_vacuum, проверка")
+    parser.add_argument("db_path", help="файл БД")
+    parser.add_argument("--full", action="store_true", help="полный ANALYZE и integrity_check")
+    parser.add_argument("--incremental", action="store_true",
+                        help="перевести БД в auto_vacuum=INCREMENTAL (полный VACUUM)")
+    parser.add_argument("--every", type=float, metavar="МИН", help="повторять каждые МИН минут")
+    args = parser.parse_args()
+
+    if args.incremental:
+        started = time.perf_counter()
+        switched = enable_incremental_vacuum(args.db_path)
+        print(f"auto_vacuum=INCREMENTAL включён за {time.perf_counter() - started:.1f} с"
+              if switched else "auto_vacuum=INCREMENTAL уже включён")
+
+    while True:
+        print(describe(run_maintenance(args.db_path, args.full), datetime.now()))
+        if not args.every:
+            break
+        time.sleep(args.every * 60)
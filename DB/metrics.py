@@ -0,0 +1,257 @@
+"""
+metrics.py
+Задержки действий пользователя (спаны) в отдельном локальном файле метрик.
+
+В отличие от sqltrace (время отдельных SQL-запросов за сеанс), здесь
+копится время видимых пользователю действий: от создания диалога до первой
+отрисовки, заполнение выпадающих списков, select() моделей,
+resizeColumnsToContents, сохранение файлов Excel/Word. Каждый спан хранит
+действие, длительность, размер открытой БД и имя компьютера, поэтому по
+файлам с машин операторов видно p95 по действиям и размерам БД и то,
+стало ли действие быстрее или медленнее после изменения.
+
+Запись:
+    with metrics.span("ExcelReportDialog.select"):
+        model.select()
+
+    @metrics.timed                       # «Класс.метод»
+    def load_contracts(self): …
+
+Спаны копятся в памяти и пишутся в файл пачками (FLUSH_EVERY) и при выходе.
+Файл метрик – metrics_path() (WAGON_METRICS_DB или ~/.wagons_metrics.db),
+не wagons.db: метрики не попадают в резервные копии и не мешают работе с БД.
+
+CLI:
+    python metrics.py                         – p50/p95/p99 по действиям и размеру БД
+    python metrics.py --action AddWorkDialog  – только действия с этой подстрокой
+    python metrics.py --split 2025-03-01      – p95 до и после даты
+    python metrics.py --file другой.db        – файл метрик с другой машины
+"""
+
+import argparse
+import atexit
+import functools
+import os
+import platform
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import NamedTuple
+
+METRICS_ENV = "WAGON_METRICS_DB"
+# Спанов в памяти до записи в файл
+FLUSH_EVERY = 50
+# Спаны старше, дней, удаляются при записи
+KEEP_DAYS = 365
+# Границы размеров БД, МБ
+SIZE_BUCKETS = ((10, "< 10 МБ"), (100, "10–100 МБ"), (1024, "100 МБ – 1 ГБ"))
+LARGEST_BUCKET = "> 1 ГБ"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS спаны (
+    id INTEGER PRIMARY KEY,
+    время TEXT NOT NULL,
+    компьютер TEXT NOT NULL,
+    действие TEXT NOT NULL,
+    мс REAL NOT NULL,
+    размер_бд_мб REAL,
+    размер_бд TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_спаны_действие ON спаны(действие, время);
+"""
+
+enabled = True
+
+_lock = threading.Lock()
+_pending: list[tuple] = []
+_db_mb: float | None = None
+_machine = platform.node() or "?"
+
+
+class ActionStats(NamedTuple):
+    action: str
+    db_size: str
+    count: int
+    p50: float
+    p95: float
+    p99: float
+    max: float
+
+
+def metrics_path() -> Path:
+    return Path(os.environ.get(METRICS_ENV) or Path.home() / ".wagons_metrics.db")
+
+
+def size_bucket(mb: float | None) -> str:
+    if mb is None:
+        return "нет БД"
+    for limit, title in SIZE_BUCKETS:
+        if mb < limit:
+            return title
+    return LARGEST_BUCKET
+
+
+def configure(db_path: str | Path | None) -> None:
+    """Открытая БД: её размер записывается в каждый следующий спан."""
+    global _db_mb
+    try:
+        _db_mb = Path(db_path).stat().st_size / 1_048_576 if db_path else None
+    except OSError:
+        _db_mb = None
+
+
+def record(action: str, seconds: float) -> None:
+    if not enabled:
+        return
+    row = (datetime.now().isoformat(timespec="seconds"), _machine, action,
+           seconds * 1000, None if _db_mb is None else round(_db_mb, 1), size_bucket(_db_mb))
+    with _lock:
+        _pending.append(row)
+        full = len(_pending) >= FLUSH_EVERY
+    if full:
+        flush()
+
+
+@contextmanager
+def span(action: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(action, time.perf_counter() - started)
+
+
+def timed(func):
+    """
+    Декоратор метода: спан «Класс.метод». Лишние аргументы сигналов Qt
+    отбрасываются, как в profiling.action.
+    """
+    code = func.__code__
+    takes = None if code.co_flags & 0x04 else code.co_argcount   # 0x04 – *args
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if takes is not None:
+            args = args[:takes]
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record(f"{type(args[0]).__name__}.{func.__name__}", time.perf_counter() - started)
+    return wrapper
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    # Обычное соединение, а не connection.connect: запросы к файлу метрик
+    # не должны попадать в статистику sqltrace
+    conn = sqlite3.connect(path, timeout=1)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def flush(path: str | Path | None = None) -> int:
+    """Пишет накопленные спаны в файл метрик. Результат – число записанных."""
+    global _pending
+    with _lock:
+        rows, _pending = _pending, []
+    if not rows:
+        return 0
+    try:
+        conn = _connect(Path(path) if path else metrics_path())
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO спаны (время, компьютер, действие, мс, размер_бд_мб, размер_бд) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", rows)
+                cutoff = (datetime.now() - timedelta(days=KEEP_DAYS)).isoformat(timespec="seconds")
+                conn.execute("DELETE FROM спаны WHERE время < ?", (cutoff,))
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        # Метрики не должны мешать работе: файл занят или недоступен – спаны теряются
+        return 0
+    return len(rows)
+
+
+def _percentile(values: list[float], share: float) -> float:
+    """Процентиль по ближайшему рангу; values отсортирован."""
+    index = max(0, min(len(values) - 1, round(share * len(values) + 0.5) - 1))
+    return values[index]
+
+
+def summary(path: str | Path | None = None, action: str | None = None,
+            since: str | None = None, until: str | None = None) -> list[ActionStats]:
+    """Процентили длительности (мс) по действию и размеру БД за период [since, until)."""
+    path = Path(path) if path else metrics_path()
+    if not path.exists():
+        return []
+    sql = "SELECT действие, размер_бд, мс FROM спаны WHERE 1"
+    params = []
+    if action:
+        sql += " AND instr(действие, ?) > 0"
+        params.append(action)
+    if since:
+        sql += " AND время >= ?"
+        params.append(since)
+    if until:
+        sql += " AND время < ?"
+        params.append(until)
+    groups: dict[tuple[str, str], list[float]] = {}
+    conn = _connect(path)
+    try:
+        for name, bucket, ms in conn.execute(sql, params):
+            groups.setdefault((name, bucket), []).append(ms)
+    finally:
+        conn.close()
+    stats = []
+    for (name, bucket), values in sorted(groups.items()):
+        values.sort()
+        stats.append(ActionStats(name, bucket, len(values), _percentile(values, 0.5),
+                                 _percentile(values, 0.95), _percentile(values, 0.99), values[-1]))
+    return stats
+
+
+def describe(stats: list[ActionStats]) -> str:
+    if not stats:
+        return "Спанов нет."
+    width = max(len(s.action) for s in stats)
+    lines = [f"{'действие':<{width}}  {'размер БД':<14} {'n':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}"]
+    lines += [f"{s.action:<{width}}  {s.db_size:<14} {s.count:>6} {s.p50:>9.1f} {s.p95:>9.1f} "
+              f"{s.p99:>9.1f} {s.max:>9.1f}" for s in stats]
+    return "\n".join(lines)
+
+
+def compare(before: list[ActionStats], after: list[ActionStats]) -> str:
+    """p95 до и после: изменение по действиям, встречающимся в обоих периодах."""
+    old = {(s.action, s.db_size): s for s in before}
+    lines = []
+    for s in after:
+        prev = old.get((s.action, s.db_size))
+        if prev is None or not prev.p95:
+            continue
+        change = (s.p95 - prev.p95) / prev.p95
+        lines.append(f"{s.action} [{s.db_size}]: p95 {prev.p95:.1f} → {s.p95:.1f} мс ({change:+.0%}, "
+                     f"n {prev.count} → {s.count})")
+    return "\n".join(lines) or "Нет действий, встречающихся в обоих периодах."
+
+
+atexit.register(flush)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Задержки действий пользователя: процентили по файлу метрик")
+    parser.add_argument("--file", help=f"файл метрик (по умолчанию {metrics_path()})")
+    parser.add_argument("--action", help="только действия, содержащие строку")
+    parser.add_argument("--since", help="с даты (ГГГГ-ММ-ДД)")
+    parser.add_argument("--until", help="до даты (ГГГГ-ММ-ДД)")
+    parser.add_argument("--split", metavar="ДАТА", help="сравнить p95 до и после даты")
+    args = parser.parse_args()
+
+    if args.split:
+        print(compare(summary(args.file, args.action, args.since, args.split),
+                      summary(args.file, args.action, args.split, args.until)))
+    else:
+        print(describe(summary(args.file, args.action, args.since, args.until)))
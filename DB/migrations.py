@@ -0,0 +1,258 @@
+"""
+migrations.py
+Версионированные миграции схемы БД «на месте», без пересоздания файла.
+
+Уровень применённых миграций хранится в PRAGMA user_version:
+0 – базовая схема из DB.create_db, N – применены миграции 1..N.
+
+Новая миграция добавляется в конец списка через декоратор @migration.
+Лёгкие миграции выполняются одной транзакцией вместе с повышением
+user_version. Тяжёлые (chunked=True) – построение индексов, заполнение
+данных – сами коммитят небольшими порциями и должны быть идемпотентными:
+если процесс прервётся, при следующем запуске миграция продолжит работу,
+а user_version повысится только после её завершения.
+
+CLI:
+    python migrations.py wagons.db
+"""
+
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+import relation_cache
+import rollups
+import search
+from connection import connect
+
+# Строк в одной транзакции при заполнении данных
+CHUNK_SIZE = 20_000
+# Пауза между порциями, чтобы параллельные писатели успевали взять блокировку
+CHUNK_PAUSE = 0.005
+
+# (версия, описание, функция, chunked)
+MIGRATIONS: list[tuple[int, str, Callable[[sqlite3.Connection], None], bool]] = []
+
+
+def migration(version: int, description: str, chunked: bool = False):
+    """Регистрирует миграцию. Версии должны идти подряд, начиная с 1."""
+    def register(func):
+        expected = len(MIGRATIONS) + 1
+        if version != expected:
+            raise ValueError(f"Миграция {func.__name__}: ожидалась версия {expected}, указана {version}")
+        MIGRATIONS.append((version, description, func, chunked))
+        return func
+    return register
+
+
+def latest_version() -> int:
+    return len(MIGRATIONS)
+
+
+# ──────────────────────────── helpers ────────────────────────────────────── #
+def create_indexes(conn: sqlite3.Connection, ddl: str) -> None:
+    """Выполняет CREATE/DROP INDEX по одному: каждая команда – отдельная транзакция."""
+    for statement in (s.strip() for s in ddl.split(";")):
+        if statement:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(statement)
+            conn.execute("COMMIT")
+            time.sleep(CHUNK_PAUSE)
+
+
+def backfill(
+    conn: sqlite3.Connection,
+    table: str,
+    assignments: str,
+    where: str = "1",
+    chunk_size: int = CHUNK_SIZE,
+) -> int:
+    """
+    Выполняет UPDATE table SET assignments WHERE where порциями по rowid.
+
+    Каждая порция – отдельная короткая транзакция, поэтому обновление большой
+    таблицы не держит эксклюзивную блокировку всё время. Условие where должно
+    отсекать уже обработанные строки, тогда прерванный backfill безопасно
+    перезапускается. Возвращает число обновлённых строк.
+    """
+    updated = 0
+    last_rowid = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            f"SELECT MAX(rowid) FROM (SELECT rowid FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?)",
+            (last_rowid, chunk_size),
+        ).fetchone()
+        upper = row[0] if row else None
+        if upper is None:
+            conn.execute("COMMIT")
+            return updated
+        cursor = conn.execute(
+            f"UPDATE {table} SET {assignments} WHERE rowid > ? AND rowid <= ? AND ({where})",
+            (last_rowid, upper),
+        )
+        conn.execute("COMMIT")
+        updated += cursor.rowcount
+        last_rowid = upper
+        time.sleep(CHUNK_PAUSE)
+
+
+def _is_wagons_db(conn: sqlite3.Connection) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'выполненные_работы'"
+    ).fetchone() is not None
+
+
+# ──────────────────────────── migrations ─────────────────────────────────── #
+# Индексы под пути доступа к выполненным_работам (актуальный набор, миграция 2):
+#   • акт/выписка по договору     – id_договора = ? AND ts_начала в полуинтервале
+#   • расчёт оплаты работника     – id_исполнителя = ? AND ts_начала в полуинтервале
+#   • заполнение шаблона Word     – id_вагона = ? AND id_договора = ? ORDER BY ts_начала
+WORK_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_работы_договор_ts
+    ON выполненные_работы (id_договора, ts_начала);
+
+CREATE INDEX IF NOT EXISTS idx_работы_исполнитель_ts
+    ON выполненные_работы (id_исполнителя, ts_начала);
+
+CREATE INDEX IF NOT EXISTS idx_работы_вагон_договор_ts
+    ON выполненные_работы (id_вагона, id_договора, ts_начала);
+"""
+
+
+@migration(1, "Индексы выполненных работ по договору, исполнителю и вагону", chunked=True)
+def _work_indexes(conn: sqlite3.Connection) -> None:
+    create_indexes(conn, """
+        CREATE INDEX IF NOT EXISTS idx_работы_договор_дата
+            ON выполненные_работы (id_договора, дата_начала_);
+        CREATE INDEX IF NOT EXISTS idx_работы_исполнитель_дата
+            ON выполненные_работы (id_исполнителя, дата_начала_);
+        CREATE INDEX IF NOT EXISTS idx_работы_вагон_договор_дата
+            ON выполненные_работы (id_вагона, id_договора, дата_начала_);
+    """)
+
+
+@migration(2, "Числовые метки времени работ (ts_начала, ts_окончания) и индексы по ним", chunked=True)
+def _work_timestamps(conn: sqlite3.Connection) -> None:
+    # Виртуальные генерируемые колонки: секунды эпохи для текстовых дат
+    # 'YYYY-MM-DD[ HH:MM[:SS]]'. Дата трактуется как UTC без сдвига пояса, так же
+    # как reports.day_start_ts, поэтому границы периодов совпадают с текстом.
+    # PRAGMA table_info их не показывает, так что Qt-модели и импорт их не видят.
+    columns = {row[1] for row in conn.execute("PRAGMA table_xinfo(выполненные_работы)")}
+    for column, source in (("ts_начала", "дата_начала_"), ("ts_окончания", "дата_окончания_")):
+        if column not in columns:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                f"ALTER TABLE выполненные_работы ADD COLUMN {column} INTEGER "
+                f"GENERATED ALWAYS AS (CAST(strftime('%s', {source}) AS INTEGER)) VIRTUAL"
+            )
+            conn.execute("COMMIT")
+
+    create_indexes(conn, WORK_INDEXES)
+    # Индексы по тексту дат больше не используются запросами – только замедляют запись
+    create_indexes(conn, """
+        DROP INDEX IF EXISTS idx_работы_договор_дата;
+        DROP INDEX IF EXISTS idx_работы_исполнитель_дата;
+        DROP INDEX IF EXISTS idx_работы_вагон_договор_дата;
+    """)
+
+
+@migration(3, "Сводные таблицы по договорам и исполнителям с триггерами")
+def _rollups(conn: sqlite3.Connection) -> None:
+    # Таблицы, триггеры и первичное заполнение – в одной транзакции, чтобы
+    # записи, сделанные параллельно, не разошлись со сводами
+    for statement in rollups.schema_statements():
+        conn.execute(statement)
+    rollups.fill(conn)
+
+
+@migration(4, "Полнотекстовый поиск по вагонам, договорам, услугам и исполнителям")
+def _search_index(conn: sqlite3.Connection) -> None:
+    for statement in search.schema_statements():
+        conn.execute(statement)
+    search.fill(conn)
+
+
+@migration(5, "Версии справочников для кэша показываемых значений связей")
+def _relation_versions(conn: sqlite3.Connection) -> None:
+    for statement in relation_cache.schema_statements():
+        conn.execute(statement)
+    relation_cache.fill(conn)
+
+
+# ──────────────────────────── core API ───────────────────────────────────── #
+def current_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(
+    conn: sqlite3.Connection,
+    on_applied: Callable[[int, str, float], None] | None = None,
+) -> list[tuple[int, str, float]]:
+    """
+    Применяет к открытому соединению все ещё не применённые миграции.
+
+    Соединение должно быть в режиме autocommit (isolation_level=None).
+    Возвращает список (версия, описание, секунды) для применённых миграций;
+    on_applied вызывается после каждой из них.
+    """
+    if not _is_wagons_db(conn):
+        return []
+
+    version = current_version(conn)
+    if version > latest_version():
+        raise RuntimeError(
+            f"Версия схемы БД ({version}) новее, чем поддерживает программа ({latest_version()})"
+        )
+
+    applied = []
+    for number, description, func, chunked in MIGRATIONS[version:]:
+        started = time.perf_counter()
+        if chunked:
+            try:
+                func(conn)
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            conn.execute(f"PRAGMA user_version = {number}")
+        else:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                func(conn)
+                conn.execute(f"PRAGMA user_version = {number}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        elapsed = time.perf_counter() - started
+        applied.append((number, description, elapsed))
+        if on_applied:
+            on_applied(number, description, elapsed)
+    return applied
+
+
+def migrate(db_path: str | Path) -> list[tuple[int, str, float]]:
+    """Открывает файл БД и применяет к нему недостающие миграции."""
+    db_path = Path(db_path)
+    if not db_path.exists():
+        raise FileNotFoundError(f"База данных не найдена: {db_path}")
+
+    conn = connect(db_path, isolation_level=None)
+    try:
+        return apply_migrations(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Использование: python migrations.py <файл БД>")
+        sys.exit(2)
+    results = migrate(sys.argv[1])
+    if not results:
+        print("Схема БД актуальна, миграции не требуются")
+    for number, description, elapsed in results:
+        print(f"Миграция {number}: {description} – {elapsed:.2f} с")
@@ -0,0 +1,952 @@
+"""
+paged_model.py
+Модель таблицы для SQLiteEditor, читающая строки окнами по ключу.
+
+QSqlTableModel / QSqlRelationalTableModel выполняют один SELECT (для
+выполненные_работы – с четырьмя JOIN) и держат в памяти всё прочитанное.
+PagedTableModel читает таблицу окнами по WINDOW_ROWS строк с ключевой
+пагинацией (keyset): следующее окно – «строки после ключа последней
+прочитанной», WHERE rowid > ? ORDER BY rowid LIMIT ?, без OFFSET, поэтому
+окно в конце 10-миллионной таблицы читается так же быстро, как первое.
+Окна догружаются по canFetchMore/fetchMore при прокрутке; в памяти
+остаются MAX_WINDOWS последних использованных окон, остальные хранят
+только границу и число строк и перечитываются, когда к ним вернутся.
+
+Связанные колонки (setRelation) показывают значение из связанной таблицы,
+как QSqlRelationalTableModel, но без JOIN: SELECT окна читает только саму
+таблицу, а значение берётся из общего словаря справочника (relation_cache),
+версия которого проверяется при чтении каждого окна. Исходный id доступен в
+роли Qt.EditRole. Для правки связанных колонок – RelationDelegate
+(выпадающий список из того же словаря).
+
+Правка сразу записывается в БД (как OnFieldChange): setData – UPDATE,
+removeRow – DELETE по rowid; строка insertRow записывается INSERT при
+submitAll со значениями, заданными до этого setData. Записи, изменённые в
+обход модели (диалоги добавления, отмена), отражаются refresh_rows – только
+эти строки; после массовой записи (импорт) reload() перечитывает окна по
+мере показа, а не всю таблицу.
+Интерфейс повторяет используемую SQLiteEditor часть QSqlTableModel:
+setTable, setRelation, setHeaderData, fieldIndex, record, select, clear,
+submitAll, revertAll, lastError, database, setFilter (с параметрами «?»).
+
+Сортировка по колонке (щелчок по заголовку) – тот же keyset по паре
+(значение, rowid); NULL идут первыми при сортировке по возрастанию, как в
+SQLite. Путь чтения выбирается по индексам:
+• есть индекс, начинающийся с колонки, – окна читаются по нему, как при
+  порядке по rowid; для связанной колонки – если проиндексированы и
+  показываемая колонка справочника (номер вагона), и ссылка на него:
+  FROM вагоны s CROSS JOIN работы t … ORDER BY s.номер – справочник по
+  индексу, работы каждого вагона по индексу id_вагона; если у части строк
+  ссылка пустая или указывает на удалённую запись, – LEFT JOIN, как ниже,
+  чтобы такие строки не пропадали;
+• индекса нет – каждое окно – ORDER BY … LIMIT WINDOW_ROWS, который SQLite
+  выполняет как top-N: полный просмотр, но в сортировке держится не больше
+  окна строк. Одновременно в фоне (PermutationThread, снимок БД) строится
+  перестановка – rowid всех строк в порядке сортировки; когда она готова,
+  следующие окна читаются по rowid из неё. Перестановки кэшируются
+  (PERMUTATION_CACHE_SIZE) и используются повторно, пока данные не менялись
+  (PRAGMA data_version и total_changes() соединения Qt).
+"""
+
+import bisect
+from array import array
+from collections import OrderedDict
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, QThread, Qt, pyqtSignal
+from PyQt5.QtSql import QSqlError, QSqlQuery, QSqlRecord, QSqlRelation
+from PyQt5.QtWidgets import QComboBox, QStyledItemDelegate
+
+import relation_cache
+from connection import snapshot
+
+# Строк в окне и окон в памяти
+WINDOW_ROWS = 2000
+MAX_WINDOWS = 10
+# Перестановок сортировки в кэше и строк в одной перестановке (8 байт на строку)
+PERMUTATION_CACHE_SIZE = 4
+PERMUTATION_MAX_ROWS = 2_000_000
+# rowid в одном запросе IN (…) при чтении окна по перестановке
+IN_CHUNK = 500
+
+# (БД, таблица, порядок, фильтр) → (версия данных, rowid по порядку)
+_permutations: OrderedDict[tuple, tuple[tuple, array]] = OrderedDict()
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class _Window:
+    """
+    Окно строк: ключ строки перед окном, ключ последней строки, число строк и
+    сами строки (None – выгружены). span = (перестановка, начало, конец) –
+    окно прочитано по перестановке сортировки.
+    """
+    __slots__ = ("after", "last_key", "count", "rows", "span")
+
+    def __init__(self, after, last_key, rows, span=None):
+        self.after = after
+        self.last_key = last_key
+        self.count = len(rows)
+        self.rows = rows
+        self.span = span
+
+
+class PermutationThread(QThread):
+    """
+    Строит перестановку сортировки – rowid строк в порядке ORDER BY – на
+    отдельном соединении со снимком БД. done(ключ, array | None): None –
+    строк больше PERMUTATION_MAX_ROWS или ошибка.
+    """
+    done = pyqtSignal(object, object)
+
+    def __init__(self, key, db_path, sql, params, parent=None):
+        super().__init__(parent)
+        self.key = key
+        self.db_path = db_path
+        self.sql = sql
+        self.params = params
+        self.conn = None
+
+    def cancel(self):
+        conn = self.conn
+        if conn is not None:
+            conn.interrupt()
+
+    def run(self):
+        rowids = array("q")
+        try:
+            with snapshot(self.db_path) as conn:
+                self.conn = conn
+                cursor = conn.execute(self.sql, self.params)
+                while len(rowids) <= PERMUTATION_MAX_ROWS:
+                    chunk = cursor.fetchmany(10_000)
+                    if not chunk:
+                        break
+                    rowids.extend(row[0] for row in chunk)
+        except Exception:
+            rowids = None
+        finally:
+            self.conn = None
+        if rowids is not None and len(rowids) > PERMUTATION_MAX_ROWS:
+            rowids = None
+        self.done.emit(self.key, rowids)
+
+
+class PagedTableModel(QAbstractTableModel):
+    """
+    Модель таблицы с ключевой пагинацией окнами (см. описание модуля).
+    Строка – список [rowid, значения колонок…, значения связанных колонок…].
+    """
+
+    def __init__(self, parent=None, db=None, read_only_columns=(), query_class=QSqlQuery):
+        super().__init__(parent)
+        self._db = db
+        self._query_class = query_class
+        self._read_only = set(read_only_columns)
+        self._error = QSqlError()
+        self._table = ""
+        self._record = QSqlRecord()
+        self._columns: list[str] = []
+        self._types: dict[str, str] = {}
+        self._relations: dict[int, QSqlRelation] = {}
+        self._lookups: dict[int, dict] = {}
+        self._headers: dict[int, object] = {}
+        self._sort_column = -1
+        self._sort_order = Qt.AscendingOrder
+        self._filter = ""
+        self._filter_params: list = []
+        self._indexed: dict[str, set[str]] | None = None
+        # колонка связи → (версия данных, есть ли строки без записи справочника)
+        self._unmatched: dict[str, tuple] = {}
+        self._permutation_thread = None
+        self._reset_rows()
+
+    def _reset_rows(self):
+        self._windows: list[_Window] = []
+        self._starts: list[int] = []
+        self._rows = 0
+        # Строк в окнах; за ними – записи, добавленные insertRows и ещё не дочитанные окнами
+        self._windowed = 0
+        self._tail: list[list] = []
+        self._exhausted = not self._table
+        self._loaded: OrderedDict[int, _Window] = OrderedDict()
+        self._sql = None
+        self._width = 0
+        self._sort_indexed = True
+        self._perm: array | None = None
+        self._perm_key = None
+        self._select_version = None
+
+    # ─────────────────────── интерфейс QSqlTableModel ─────────────────────── #
+    def database(self):
+        return self._db
+
+    def lastError(self):
+        return self._error
+
+    def tableName(self):
+        return self._table
+
+    def setTable(self, table_name):
+        self.beginResetModel()
+        self._table = table_name
+        self._record = self._db.record(table_name)
+        self._columns = [self._record.fieldName(i) for i in range(self._record.count())]
+        self._types = {}
+        query = self._query_class(self._db)
+        if query.exec_(f"PRAGMA table_info({_quote(table_name)})"):
+            while query.next():
+                self._types[query.value(1)] = query.value(2) or ""
+        self._relations = {}
+        self._lookups = {}
+        self._headers = {}
+        self._sort_column = -1
+        self._filter, self._filter_params = "", []
+        self._indexed = None
+        self._unmatched = {}
+        self._reset_rows()
+        self._exhausted = True
+        self.endResetModel()
+
+    def setEditStrategy(self, strategy):
+        # Изменения всегда записываются сразу, как при OnFieldChange
+        pass
+
+    def setRelation(self, column, relation):
+        if 0 <= column < len(self._columns):
+            self._relations[column] = relation
+            self._sql = None
+
+    def relation(self, column):
+        return self._relations.get(column, QSqlRelation())
+
+    def column_types(self):
+        """{колонка: объявленный тип} в порядке колонок."""
+        return {name: self._types.get(name, "") for name in self._columns}
+
+    def relations(self):
+        """{колонка: (таблица, колонка ключа, показываемая колонка)}."""
+        return {self._columns[column]: (relation.tableName(), relation.indexColumn(), relation.displayColumn())
+                for column, relation in self._relations.items()}
+
+    def fieldIndex(self, name):
+        try:
+            return self._columns.index(name)
+        except ValueError:
+            return -1
+
+    def record(self, row=None):
+        record = QSqlRecord(self._record)
+        if row is not None:
+            values = self._row(row)
+            if values is not None:
+                for column in range(len(self._columns)):
+                    record.setValue(column, values[1 + column])
+        return record
+
+    def filter(self):
+        return self._filter
+
+    def setFilter(self, where, params=()):
+        """
+        Условие отбора строк (без WHERE), псевдоним таблицы – t; в отличие от
+        QSqlTableModel принимает параметры «?». Действует со следующего select().
+        """
+        self._filter = where or ""
+        self._filter_params = list(params)
+
+    def count_query(self):
+        """(sql, params) числа строк с текущим фильтром – для подсчёта в фоне."""
+        where = f" WHERE {self._filter}" if self._filter else ""
+        return f"SELECT COUNT(*) FROM {_quote(self._table)} t{where}", list(self._filter_params)
+
+    def select(self):
+        self.beginResetModel()
+        self._reset_rows()
+        ok = self._fetch_window() is not None
+        self.endResetModel()
+        if ok and not self._sort_indexed and not self._exhausted:
+            self._request_permutation()
+        return ok
+
+    def clear(self):
+        self._stop_permutation()
+        self.beginResetModel()
+        self._table = ""
+        self._record = QSqlRecord()
+        self._columns = []
+        self._types = {}
+        self._relations = {}
+        self._lookups = {}
+        self._headers = {}
+        self._filter, self._filter_params = "", []
+        self._indexed = None
+        self._unmatched = {}
+        self._reset_rows()
+        self.endResetModel()
+
+    def submitAll(self):
+        """Записывает в БД добавленные insertRows строки со значениями, заданными setData."""
+        for values in self._tail:
+            if values[0] is not None:
+                continue
+            names = [name for column, name in enumerate(self._columns) if values[1 + column] is not None]
+            query = self._query_class(self._db)
+            if names:
+                query.prepare(f"INSERT INTO {_quote(self._table)} ({', '.join(map(_quote, names))}) "
+                              f"VALUES ({', '.join('?' * len(names))})")
+                for column, name in enumerate(self._columns):
+                    if values[1 + column] is not None:
+                        query.addBindValue(values[1 + column])
+            else:
+                query.prepare(f"INSERT INTO {_quote(self._table)} DEFAULT VALUES")
+            if not query.exec_():
+                self._error = query.lastError()
+                return False
+            fresh = self._select_rows("t.rowid = ?", [query.lastInsertId()], 1, filtered=False)
+            if fresh:
+                values[:] = fresh[0]
+            row = self._windowed + self._tail.index(values)
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(self._columns) - 1))
+        return True
+
+    def submit(self):
+        return True
+
+    def revertAll(self):
+        """Убирает добавленные и не записанные в БД строки."""
+        for offset in range(len(self._tail) - 1, -1, -1):
+            if self._tail[offset][0] is None:
+                row = self._windowed + offset
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self._tail[offset]
+                self._rows -= 1
+                self.endRemoveRows()
+
+    # ─────────────────────────── QAbstractTableModel ──────────────────────── #
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._columns)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.canFetchMore(parent):
+            self._fetch_window()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Vertical:
+            return section + 1
+        if section in self._headers:
+            return self._headers[section]
+        return self._columns[section] if 0 <= section < len(self._columns) else None
+
+    def setHeaderData(self, section, orientation, value, role=Qt.EditRole):
+        if orientation != Qt.Horizontal or not 0 <= section < len(self._columns):
+            return False
+        self._headers[section] = value
+        self.headerDataChanged.emit(orientation, section, section)
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsSelectable | Qt.ItemIsEnabled
+        if self._columns[index.column()] not in self._read_only:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        values = self._row(index.row())
+        if values is None:
+            return None
+        column = index.column()
+        if role == Qt.DisplayRole and column in self._relations:
+            return self._display(column, values)
+        return values[1 + column]
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        values = self._row(index.row())
+        if values is None:
+            return False
+        column = index.column()
+        # Повторная запись того же значения (в т. ч. показанного значения связи) ничего не меняет
+        if value == values[1 + column] or (column in self._relations and value == self._display(column, values)):
+            return True
+        if values[0] is None:
+            # Строка ещё не записана в БД – значение запишет submitAll
+            values[1 + column] = value
+            self.dataChanged.emit(index, index)
+            return True
+        query = self._query_class(self._db)
+        query.prepare(f"UPDATE {_quote(self._table)} SET {_quote(self._columns[column])} = ? WHERE rowid = ?")
+        query.addBindValue(value)
+        query.addBindValue(values[0])
+        if not query.exec_():
+            self._error = query.lastError()
+            return False
+        fresh = self._select_rows("t.rowid = ?", [values[0]], 1, filtered=False)
+        if fresh:
+            values[:] = fresh[0]
+        self.dataChanged.emit(self.index(index.row(), 0), self.index(index.row(), len(self._columns) - 1))
+        return True
+
+    def insertRows(self, row, count, parent=QModelIndex()):
+        """
+        Добавляет count пустых строк, которые записываются в БД при submitAll
+        (как в QSqlTableModel, значения задаются setData до записи). Новые
+        строки показываются последними независимо от row и сортировки; при
+        догрузке окон они не повторяются.
+        """
+        if parent.isValid():
+            return False
+        width = self._width or 1 + len(self._columns)
+        self.beginInsertRows(QModelIndex(), self._rows, self._rows + count - 1)
+        self._tail += [[None] * width for _ in range(count)]
+        self._rows += count
+        self.endInsertRows()
+        return True
+
+    def removeRows(self, row, count, parent=QModelIndex()):
+        if parent.isValid() or row < 0 or row + count > self._rows:
+            return False
+        for current in range(row + count - 1, row - 1, -1):
+            if current >= self._windowed:
+                window, rows, offset = None, self._tail, current - self._windowed
+            else:
+                window, offset = self._locate(current)
+                rows = self._window_rows(window)
+            if rows[offset][0] is not None:
+                query = self._query_class(self._db)
+                query.prepare(f"DELETE FROM {_quote(self._table)} WHERE rowid = ?")
+                query.addBindValue(rows[offset][0])
+                if not query.exec_():
+                    self._error = query.lastError()
+                    return False
+            self._drop_row(current, window, rows, offset)
+        return True
+
+    def _drop_row(self, row, window, rows, offset):
+        """Убирает строку row (rows[offset] окна window, None – добавленные) из модели, не из БД."""
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del rows[offset]
+        if window is not None:
+            window.count -= 1
+            self._windowed -= 1
+            self._starts = None
+            if window.count == 0:
+                # Следующее окно начинается после того же ключа, что и удаляемое
+                index = self._windows.index(window)
+                if index + 1 < len(self._windows):
+                    self._windows[index + 1].after = window.after
+                del self._windows[index]
+                self._loaded.pop(id(window), None)
+        self._rows -= 1
+        self.endRemoveRows()
+
+    def refresh_rows(self, changed=(), inserted=(), deleted=()):
+        """
+        Отражает записи, изменённые в обход модели, не перечитывая таблицу:
+        • changed – строки в памяти перечитываются на месте; строка, которая
+          больше не проходит фильтр, убирается;
+        • inserted – новые записи, проходящие фильтр, показываются последними,
+          как строки insertRows (при догрузке окон не повторяются);
+        • deleted – строки убираются из модели.
+        Аргументы – rowid (id) записей. Строки выгруженных окон перечитаются
+        сами, когда к ним вернутся; удалённую запись из выгруженного окна так
+        не найти – тогда select().
+        """
+        deleted = {rowid for rowid in deleted if rowid is not None}
+        ids = {rowid for rowid in (*changed, *inserted) if rowid is not None} - deleted
+        if not self._table or not (ids or deleted):
+            return True
+        self._refresh_lookups()
+        positions = self._loaded_positions(ids | deleted)
+        if (deleted - positions.keys()) and any(window.rows is None for window in self._windows):
+            return self.select()
+        fresh = self._select_ids(ids, filtered=True)
+        if fresh is None:
+            return False
+        gone = []
+        for rowid, (row, window, rows, offset) in positions.items():
+            if rowid in fresh:
+                rows[offset][:] = fresh[rowid]
+                self.dataChanged.emit(self.index(row, 0), self.index(row, len(self._columns) - 1))
+            else:
+                gone.append((row, window, rows, offset))
+        for row, window, rows, offset in sorted(gone, key=lambda item: item[0], reverse=True):
+            self._drop_row(row, window, rows, offset)
+        added = [fresh[rowid] for rowid in inserted if rowid in fresh and rowid not in positions]
+        if added:
+            self.beginInsertRows(QModelIndex(), self._rows, self._rows + len(added) - 1)
+            self._tail += added
+            self._rows += len(added)
+            self.endInsertRows()
+        return True
+
+    def reload(self):
+        """
+        После массовой записи (импорт): выгружает окна – видимые строки
+        перечитываются при отрисовке, остальные при прокрутке – и снова
+        разрешает догрузку после последнего окна, где появятся новые записи.
+        Так новые записи встают на место только при порядке по возрастанию
+        rowid; при другом порядке – select().
+        """
+        if not self._table:
+            return False
+        if not self._sort_by_key() or self._sort_order != Qt.AscendingOrder:
+            return self.select()
+        for window in self._windows:
+            window.rows = None
+        self._loaded.clear()
+        self._exhausted = False
+        if self._rows:
+            self.dataChanged.emit(self.index(0, 0), self.index(self._rows - 1, len(self._columns) - 1))
+        return True
+
+    def _loaded_positions(self, rowids):
+        """{rowid: (строка, окно, строки, смещение)} для записей из rowids среди строк в памяти."""
+        positions = {}
+        start = 0
+        for window in self._windows:
+            if window.rows is not None:
+                for offset, values in enumerate(window.rows):
+                    if values[0] in rowids:
+                        positions[values[0]] = (start + offset, window, window.rows, offset)
+            start += window.count
+        for offset, values in enumerate(self._tail):
+            if values[0] in rowids:
+                positions[values[0]] = (self._windowed + offset, None, self._tail, offset)
+        return positions
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self._sort_column = column if 0 <= column < len(self._columns) else -1
+        self._sort_order = order
+        self._sql = None
+        self.select()
+
+    def _display(self, column, values):
+        """Показываемое значение связанной колонки по словарю справочника."""
+        if column not in self._lookups:
+            self._refresh_lookups()
+        key = values[1 + column]
+        return None if key is None else self._lookups[column].get(key)
+
+    def _refresh_lookups(self):
+        """Словари справочников связей; справочник перечитывается, только если его меняли."""
+        for column, relation in self._relations.items():
+            self._lookups[column] = relation_cache.lookup(
+                self._db, relation.tableName(), relation.indexColumn(), relation.displayColumn()).values
+
+    def _sort_by_key(self):
+        return self._sort_column < 0 or self._columns[self._sort_column] == "id"
+
+    # ──────────────────────────── поиск строки ────────────────────────────── #
+    def row_id(self, row):
+        """rowid записи в строке row; None – строки нет или она ещё не записана."""
+        values = self._row(row)
+        return values[0] if values is not None else None
+
+    def row_of_id(self, rowid):
+        """
+        Номер строки записи с данным rowid, догружая окна при необходимости;
+        -1 – записи нет. При порядке по ключу чтение останавливается, как только
+        окно проходит rowid.
+        """
+        by_key = self._sort_by_key()
+        ascending = self._sort_order == Qt.AscendingOrder
+        start = 0
+        index = 0
+        while True:
+            while index < len(self._windows):
+                window = self._windows[index]
+                passed = by_key and (window.last_key[-1] >= rowid if ascending else window.last_key[-1] <= rowid)
+                if not by_key or passed:
+                    for offset, values in enumerate(self._window_rows(window)):
+                        if values[0] == rowid:
+                            return start + offset
+                    if passed:
+                        return -1
+                start += window.count
+                index += 1
+            if self._exhausted or self._fetch_window() is None:
+                break
+        for offset, values in enumerate(self._tail):
+            if values[0] == rowid:
+                return self._windowed + offset
+        return -1
+
+    # ─────────────────────────────── чтение ───────────────────────────────── #
+    def _build_sql(self):
+        """
+        SELECT окна: rowid и колонки таблицы (при сортировке по связанной
+        колонке – ещё её показываемое значение для ключа); ORDER BY по ключу сортировки.
+        """
+        columns = ["t.rowid"] + [f"t.{_quote(name)}" for name in self._columns]
+        direction = "ASC" if self._sort_order == Qt.AscendingOrder else "DESC"
+        source = f"{_quote(self._table)} t"
+        self._sort_indexed = True
+        if self._sort_by_key():
+            self._sort_expr = None
+            self._sort_pos = None
+            order = f"t.rowid {direction}"
+        elif self._sort_column in self._relations:
+            # Порядок по показанному значению: справочник s присоединяется к строкам
+            relation = self._relations[self._sort_column]
+            column = self._columns[self._sort_column]
+            related = _quote(relation.tableName())
+            on = f"s.{_quote(relation.indexColumn())} = t.{_quote(column)}"
+            self._sort_expr = f"s.{_quote(relation.displayColumn())}"
+            self._sort_pos = len(columns)
+            columns.append(self._sort_expr)
+            self._sort_indexed = (not self._filter and column in self._indexed_columns(self._table)
+                                  and relation.displayColumn() in self._indexed_columns(relation.tableName())
+                                  and not self._has_unmatched(column, relation))
+            if self._sort_indexed:
+                # CROSS JOIN фиксирует порядок обхода: справочник по индексу показываемой колонки.
+                # Строк без записи справочника нет (_has_unmatched), внутреннее соединение их не теряет
+                source = f"{related} s CROSS JOIN {source} ON {on}"
+            else:
+                source = f"{source} LEFT JOIN {related} s ON {on}"
+            order = f"{self._sort_expr} {direction}, t.rowid {direction}"
+        else:
+            self._sort_pos = 1 + self._sort_column
+            self._sort_expr = columns[self._sort_pos]
+            self._sort_indexed = self._columns[self._sort_column] in self._indexed_columns(self._table)
+            order = f"{self._sort_expr} {direction}, t.rowid {direction}"
+        self._source = source
+        self._order = order
+        self._width = len(columns)
+        self._sql = f"SELECT {', '.join(columns)} FROM {source}", order
+
+    def _indexed_columns(self, table):
+        """Колонки, с которых начинается хотя бы один индекс таблицы."""
+        if self._indexed is None:
+            self._indexed = {}
+        if table not in self._indexed:
+            leading = set()
+            query = self._query_class(self._db)
+            names = []
+            if query.exec_(f"PRAGMA index_list({_quote(table)})"):
+                while query.next():
+                    names.append(query.value(1))
+            for name in names:
+                if query.exec_(f"PRAGMA index_info({_quote(name)})") and query.next():
+                    leading.add(query.value(2))
+            self._indexed[table] = leading
+        return self._indexed[table]
+
+    def _has_unmatched(self, column, relation):
+        """
+        Есть ли строки, у которых ссылка column – NULL или указывает на
+        отсутствующую запись справочника: CROSS JOIN их бы не показал. Проверка
+        идёт по различным значениям ссылки (по её индексу) и кэшируется, пока
+        данные не менялись.
+        """
+        version = self.data_version()
+        cached = self._unmatched.get(column)
+        if cached is not None and version is not None and cached[0] == version:
+            return cached[1]
+        query = self._query_class(self._db)
+        query.setForwardOnly(True)
+        found = True
+        if query.exec_(
+            f"SELECT 1 FROM (SELECT DISTINCT {_quote(column)} AS k FROM {_quote(self._table)}) d "
+            f"WHERE d.k IS NULL OR NOT EXISTS (SELECT 1 FROM {_quote(relation.tableName())} s "
+            f"WHERE s.{_quote(relation.indexColumn())} = d.k) LIMIT 1"
+        ):
+            found = query.next()
+        self._unmatched[column] = (version, found)
+        return found
+
+    def _key(self, values):
+        return (values[0],) if self._sort_pos is None else (values[self._sort_pos], values[0])
+
+    def _after_segments(self, key):
+        """
+        Строки после key в порядке сортировки – условия отрезков, читаемых по
+        очереди (NULL идут первыми по возрастанию). Каждое условие – диапазон
+        по выражению сортировки, который SQLite выполняет по индексу;
+        «x > v OR (x = v AND rowid > r)» одним условием индекс не использует.
+        """
+        ascending = self._sort_order == Qt.AscendingOrder
+        cmp = ">" if ascending else "<"
+        if self._sort_expr is None:
+            return [(f"t.rowid {cmp} ?", [key[0]])]
+        expr = self._sort_expr
+        value, rowid = key
+        if value is None:
+            if ascending:
+                return [(f"{expr} IS NULL AND t.rowid > ?", [rowid]), (f"{expr} IS NOT NULL", [])]
+            return [(f"{expr} IS NULL AND t.rowid < ?", [rowid])]
+        segments = [(f"{expr} {cmp}= ? AND ({expr} {cmp} ? OR t.rowid {cmp} ?)", [value, value, rowid])]
+        if not ascending:
+            segments.append((f"{expr} IS NULL", []))
+        return segments
+
+    def _select_rows(self, where, params, limit, filtered=True):
+        """Строки по условию (и фильтру модели) в порядке сортировки; None – ошибка (см. lastError)."""
+        if self._sql is None:
+            self._build_sql()
+        select, order = self._sql
+        query = self._query_class(self._db)
+        query.setForwardOnly(True)
+        if filtered and self._filter:
+            where = f"({self._filter}) AND ({where})"
+            params = self._filter_params + list(params)
+        query.prepare(f"{select} WHERE {where} ORDER BY {order} LIMIT {int(limit)}")
+        for value in params:
+            query.addBindValue(value)
+        if not query.exec_():
+            self._error = query.lastError()
+            return None
+        width = query.record().count()
+        rows = []
+        while query.next():
+            rows.append([query.value(i) for i in range(width)])
+        return rows
+
+    def _fetch_rows(self, after, limit):
+        if after is None:
+            return self._select_rows("1", [], limit)
+        rows = []
+        for where, params in self._after_segments(after):
+            part = self._select_rows(where, params, limit - len(rows))
+            if part is None:
+                return None
+            rows += part
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def _select_ids(self, rowids, filtered=False):
+        """{rowid: строка} для записей из rowids (порциями по IN_CHUNK); None – ошибка."""
+        rowids = list(rowids)
+        found = {}
+        for start in range(0, len(rowids), IN_CHUNK):
+            chunk = rowids[start:start + IN_CHUNK]
+            part = self._select_rows(f"t.rowid IN ({', '.join('?' * len(chunk))})", chunk, len(chunk),
+                                     filtered=filtered)
+            if part is None:
+                return None
+            found.update((values[0], values) for values in part)
+        return found
+
+    def _fetch_span(self, span):
+        """Строки перестановки span = (перестановка, начало, конец) в её порядке; удалённых нет."""
+        rowids = span[0][span[1]:span[2]]
+        found = self._select_ids(rowids)
+        if found is None:
+            return None
+        return [found[rowid] for rowid in rowids if rowid in found]
+
+    def _fetch_window(self):
+        """Читает следующее окно и добавляет его строки в модель. Результат – окно или None."""
+        if not self._table:
+            return None
+        self._refresh_lookups()
+        last = self._windows[-1] if self._windows else None
+        after = last.last_key if last else None
+        span = self._next_span(last)
+        if span:
+            rows = self._fetch_span(span)
+            if rows is None:
+                self._exhausted = True
+                return None
+            self._exhausted = span[2] >= len(span[0])
+            last_key = self._key(rows[-1]) if rows else after
+        else:
+            rows = self._fetch_rows(after, WINDOW_ROWS)
+            if rows is None:
+                self._exhausted = True
+                return None
+            self._exhausted = len(rows) < WINDOW_ROWS
+            if not rows:
+                return None
+            last_key = self._key(rows[-1])
+        rows = self._without_tail(rows)
+        window = _Window(after, last_key, rows, span)
+        first = self._windowed
+        # При select() строки добавляются внутри beginResetModel
+        inserting = bool(self._windows) and bool(rows)
+        if inserting:
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self._add_window(window)
+        self._windowed += len(rows)
+        self._rows += len(rows)
+        self._starts = None
+        if inserting:
+            self.endInsertRows()
+        return window
+
+    def _next_span(self, last):
+        """
+        Отрезок перестановки для следующего окна или None – читать keyset.
+        Перестановка годится, пока данные не менялись с select(): тогда окна,
+        прочитанные до неё, – это её начало.
+        """
+        if self._perm is None or self._tail or self._select_version is None:
+            return None
+        if self.data_version() != self._select_version:
+            self._perm = None
+            return None
+        start = last.span[2] if last is not None and last.span else self._windowed
+        if start >= len(self._perm):
+            return None
+        return self._perm, start, min(start + WINDOW_ROWS, len(self._perm))
+
+    def data_version(self):
+        """
+        Метка изменений БД: меняется при любой записи в файл – чужими
+        соединениями (PRAGMA data_version) и своим (total_changes()).
+        """
+        query = self._query_class(self._db)
+        if not query.exec_("SELECT total_changes()") or not query.next():
+            return None
+        changes = query.value(0)
+        if not query.exec_("PRAGMA data_version") or not query.next():
+            return None
+        return query.value(0), changes
+
+    # ─────────────────────────── перестановки ─────────────────────────────── #
+    def _permutation_key(self):
+        return (self._db.databaseName(), self._table, self._source, self._order,
+                self._filter, tuple(self._filter_params))
+
+    def _request_permutation(self):
+        """Берёт перестановку текущего порядка из кэша или запускает её построение в фоне."""
+        self._select_version = self.data_version()
+        key = self._permutation_key()
+        self._perm_key = key
+        cached = _permutations.get(key)
+        if cached is not None:
+            if cached[0] == self._select_version:
+                _permutations.move_to_end(key)
+                self._perm = cached[1]
+                return
+            del _permutations[key]
+        if self._permutation_thread is not None:
+            if self._permutation_thread.key == key:
+                return
+            self._stop_permutation()
+        where = f" WHERE {self._filter}" if self._filter else ""
+        sql = f"SELECT t.rowid FROM {self._source}{where} ORDER BY {self._order}"
+        thread = PermutationThread(key, self._db.databaseName(), sql, list(self._filter_params), self)
+        thread.version = self._select_version
+        thread.done.connect(self._on_permutation)
+        thread.finished.connect(thread.deleteLater)
+        self._permutation_thread = thread
+        thread.start()
+
+    def _on_permutation(self, key, rowids):
+        thread = self.sender()
+        if thread is self._permutation_thread:
+            self._permutation_thread = None
+        if rowids is None or thread.version != self.data_version():
+            return
+        _permutations[key] = (thread.version, rowids)
+        _permutations.move_to_end(key)
+        while len(_permutations) > PERMUTATION_CACHE_SIZE:
+            _permutations.popitem(last=False)
+        if key == self._perm_key and thread.version == self._select_version:
+            self._perm = rowids
+
+    def _stop_permutation(self):
+        thread = self._permutation_thread
+        self._permutation_thread = None
+        if thread is not None:
+            thread.done.disconnect(self._on_permutation)
+            thread.cancel()
+            thread.wait()
+
+    def _without_tail(self, rows):
+        if not self._tail:
+            return rows
+        added = {values[0] for values in self._tail if values[0] is not None}
+        return [values for values in rows if values[0] not in added]
+
+    def _add_window(self, window):
+        self._windows.append(window)
+        self._touch(window)
+
+    def _touch(self, window):
+        self._loaded[id(window)] = window
+        self._loaded.move_to_end(id(window))
+        while len(self._loaded) > MAX_WINDOWS:
+            _, evicted = self._loaded.popitem(last=False)
+            evicted.rows = None
+
+    def _window_rows(self, window):
+        """Строки окна, перечитывая выгруженное окно по его границе."""
+        if window.rows is None:
+            self._refresh_lookups()
+            if window.span:
+                rows = self._without_tail(self._fetch_span(window.span) or [])
+            else:
+                rows = self._without_tail(self._fetch_rows(window.after, window.count + len(self._tail)) or [])
+            # Если таблицу меняли извне, число строк окна сохраняется
+            rows += [[None] * self._width for _ in range(window.count - len(rows))]
+            window.rows = rows[:window.count]
+        if next(reversed(self._loaded), None) != id(window):
+            self._touch(window)
+        return window.rows
+
+    def _locate(self, row):
+        if self._starts is None:
+            self._starts = []
+            start = 0
+            for window in self._windows:
+                self._starts.append(start)
+                start += window.count
+        index = bisect.bisect_right(self._starts, row) - 1
+        return self._windows[index], row - self._starts[index]
+
+    def _row(self, row):
+        if not 0 <= row < self._rows:
+            return None
+        if row >= self._windowed:
+            return self._tail[row - self._windowed]
+        window, offset = self._locate(row)
+        return self._window_rows(window)[offset]
+
+
+class RelationDelegate(QStyledItemDelegate):
+    """
+    Правка связанной колонки PagedTableModel выпадающим списком значений
+    связанной таблицы; список – из словаря relation_cache, без запроса к
+    справочнику, пока его не меняли.
+    """
+
+    def createEditor(self, parent, option, index):
+        model = index.model()
+        relation = model.relation(index.column())
+        if not relation.isValid():
+            return super().createEditor(parent, option, index)
+        editor = QComboBox(parent)
+        lookup = relation_cache.lookup(model.database(), relation.tableName(), relation.indexColumn(),
+                                       relation.displayColumn())
+        for key, display in lookup.items:
+            editor.addItem(str(display), key)
+        return editor
+
+    def setEditorData(self, editor, index):
+        if isinstance(editor, QComboBox):
+            editor.setCurrentIndex(editor.findData(index.model().data(index, Qt.EditRole)))
+        else:
+            super().setEditorData(editor, index)
+
+    def setModelData(self, editor, model, index):
+        if isinstance(editor, QComboBox):
+            model.setData(index, editor.currentData(), Qt.EditRole)
+        else:
+            super().setModelData(editor, model, index)
@@ -0,0 +1,151 @@
+"""
+profiling.py
+Профилирование действий пользователя по запросу (вкладка «Диагностика»).
+
+Методы-действия GUI (формирование отчётов, заполнение Word, импорт Excel,
+открытие таблицы, расчёт оплаты) помечены декоратором @action("имя"). Пока
+профилирование выключено (enabled = False), обёртка только вызывает метод –
+проверка одного флага модуля, без cProfile и tracemalloc.
+
+Во включённом состоянии каждое действие выполняется под cProfile и
+tracemalloc, и в папку профилей (по умолчанию «Диагностика» рядом с БД,
+см. configure) пишутся два файла с общим именем
+<дата_время>_<действие>:
+• .prof – статистика cProfile (python -m pstats, snakeviz);
+• .txt  – сводка для пересылки: действие, длительность, пик памяти, БД и её
+  размер, версии Python/SQLite, топ функций по накопленному времени и
+  топ мест выделения памяти.
+
+Вложенные действия (например, открытие таблицы внутри импорта) учитываются
+в профиле внешнего действия.
+"""
+
+import cProfile
+import functools
+import io
+import logging
+import platform
+import pstats
+import sqlite3
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+log = logging.getLogger("ui")
+
+FOLDER_NAME = "Диагностика"
+# Строк в сводке: функций по накопленному времени и мест выделения памяти
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+# Глубина стека tracemalloc для мест выделения
+TRACE_FRAMES = 5
+
+enabled = False
+folder = Path.cwd() / FOLDER_NAME
+db_path: Path | None = None
+
+_active = False
+# Последняя записанная сводка – для подписи на вкладке «Диагностика»
+last_summary: Path | None = None
+
+
+def configure(database: str | Path | None) -> None:
+    """Папка профилей – «Диагностика» рядом с файлом БД."""
+    global folder, db_path
+    db_path = Path(database) if database else None
+    folder = (db_path.parent if db_path else Path.cwd()) / FOLDER_NAME
+
+
+def set_enabled(value: bool) -> None:
+    global enabled
+    enabled = bool(value)
+
+
+def action(name: str):
+    """
+    Декоратор метода-действия. Лишние аргументы сигналов Qt (clicked(bool) и
+    т. п.) отбрасываются по числу параметров метода, как это делает PyQt для
+    обычных слотов.
+    """
+    def decorator(func):
+        code = func.__code__
+        takes = None if code.co_flags & 0x04 else code.co_argcount   # 0x04 – *args
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if takes is not None:
+                args = args[:takes]
+            if not enabled or _active:
+                return func(*args, **kwargs)
+            owner = type(args[0]).__name__ if args else ""
+            return _profile(f"{owner}.{name}" if owner else name, func, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def _profile(name: str, func, args, kwargs):
+    global _active
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(TRACE_FRAMES)
+    tracemalloc.reset_peak()
+    before = tracemalloc.take_snapshot()
+    profiler = cProfile.Profile()
+    error = None
+    _active = True
+    started = time.perf_counter()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        _active = False
+        after = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        if started_tracing:
+            tracemalloc.stop()
+        _write(name, seconds, peak, profiler, before, after, error)
+
+
+def _write(name, seconds, peak, profiler, before, after, error) -> None:
+    global last_summary
+    stem = f"{datetime.now():%Y%m%d_%H%M%S}_{name}"
+    try:
+        folder.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(folder / f"{stem}.prof")
+        summary = folder / f"{stem}.txt"
+        summary.write_text(describe(name, seconds, peak, profiler, before, after, error), encoding="utf-8")
+    except OSError as e:
+        log.warning("Не удалось сохранить профиль %s: %s", name, e)
+        return
+    last_summary = summary
+    log.info("Профиль %s (%.2f с) сохранён: %s", name, seconds, summary)
+
+
+def describe(name, seconds, peak, profiler, before, after, error=None) -> str:
+    lines = [
+        f"Действие: {name}",
+        f"Время: {datetime.now():%d.%m.%Y %H:%M:%S}",
+        f"Длительность: {seconds:.3f} с",
+        f"Пик памяти Python: {peak / 1_048_576:.1f} МБ",
+    ]
+    if error is not None:
+        lines.append(f"Завершилось ошибкой: {type(error).__name__}: {error}")
+    if db_path is not None:
+        size = db_path.stat().st_size / 1_048_576 if db_path.exists() else 0
+        lines.append(f"База данных: {db_path.name} ({size:.1f} МБ)")
+    lines.append(f"Python {platform.python_version()}, SQLite {sqlite3.sqlite_version}, {platform.platform()}")
+
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.strip_dirs().sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+    lines += ["", f"Функции по накопленному времени (первые {TOP_FUNCTIONS}):", out.getvalue().strip()]
+
+    lines += ["", f"Выделения памяти за действие (первые {TOP_ALLOCATIONS}):"]
+    for diff in after.compare_to(before, "traceback")[:TOP_ALLOCATIONS]:
+        lines.append(f"{diff.size_diff / 1024:+.1f} КБ, блоков {diff.count_diff:+d}")
+        lines += [f"    {frame}" for frame in diff.traceback.format()]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,132 @@
+"""
+relation_cache.py
+Общий кэш показываемых значений справочников: id → номер вагона или
+договора, наименование услуги, ФИО исполнителя.
+
+Связанные колонки выполненных_работ (PagedTableModel.setRelation) больше не
+присоединяют справочник к каждому SELECT: модель читает только саму
+таблицу, а показываемое значение берёт из словаря, который загружается один
+раз на справочник и общий для всех моделей, выпадающих списков
+RelationDelegate и предпросмотров отчётов.
+
+Словарь годен, пока не изменился справочник. Версию каждого справочника
+хранит таблица версии_справочников (миграция 5): триггеры увеличивают её
+при добавлении и удалении записей и при изменении ключа или показываемой
+колонки; изменения работ и других колонок справочника кэш не сбрасывают.
+Проверка версии – один запрос по первичному ключу, поэтому её можно делать
+при каждом чтении окна строк. Для таблиц без версии (чужая БД в Editor,
+связь на другую таблицу) версия – PRAGMA data_version и total_changes()
+соединения: кэш сбрасывается при любой записи в файл.
+
+    values = relation_cache.lookup(db, "вагоны", "id", "номер").values
+    values.get(id_вагона)
+"""
+
+from typing import NamedTuple
+
+# справочник → (колонка ключа, показываемая колонка)
+DIRECTORIES = {
+    "вагоны": ("id", "номер"),
+    "договоры": ("id", "номер"),
+    "услуги": ("id", "наименование"),
+    "исполнители": ("id", "фио"),
+}
+
+
+class Lookup(NamedTuple):
+    version: tuple
+    values: dict          # ключ → показываемое значение
+    items: list           # [(ключ, показываемое значение)] по показываемому значению
+
+
+# (файл БД, справочник, колонка ключа, показываемая колонка) → Lookup
+_lookups: dict[tuple, Lookup] = {}
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def schema_statements() -> list[str]:
+    """DDL таблицы версий и триггеров на справочники – по команде на элемент."""
+    statements = [
+        "CREATE TABLE IF NOT EXISTS версии_справочников ("
+        "таблица TEXT PRIMARY KEY, версия INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID"
+    ]
+    for table, (key, display) in DIRECTORIES.items():
+        bump = f"UPDATE версии_справочников SET версия = версия + 1 WHERE таблица = '{table}';"
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS версия_{table}_insert AFTER INSERT ON {table}\n"
+            f"BEGIN\n    {bump}\nEND"
+        )
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS версия_{table}_delete AFTER DELETE ON {table}\n"
+            f"BEGIN\n    {bump}\nEND"
+        )
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS версия_{table}_update AFTER UPDATE OF {key}, {display} ON {table}\n"
+            f"BEGIN\n    {bump}\nEND"
+        )
+    return statements
+
+
+def fill(conn) -> None:
+    """Строки версий для всех справочников (в текущей транзакции)."""
+    conn.executemany("INSERT OR IGNORE INTO версии_справочников (таблица) VALUES (?)",
+                     [(table,) for table in DIRECTORIES])
+
+
+def bump(conn) -> None:
+    """Новые версии всех справочников – после записи в обход триггеров (массовая загрузка)."""
+    conn.execute("UPDATE версии_справочников SET версия = версия + 1")
+
+
+def _scalars(db, sql: str, params=()) -> list | None:
+    # Qt – только в функциях чтения: схему (migrations) применяют и без PyQt5
+    from PyQt5.QtSql import QSqlQuery
+    query = QSqlQuery(db)
+    query.prepare(sql)
+    for value in params:
+        query.addBindValue(value)
+    if not query.exec_() or not query.next():
+        return None
+    return [query.value(i) for i in range(query.record().count())]
+
+
+def table_version(db, table: str) -> tuple | None:
+    """Версия справочника; None – прочитать не удалось."""
+    if table in DIRECTORIES:
+        row = _scalars(db, "SELECT версия FROM версии_справочников WHERE таблица = ?", [table])
+        if row is not None:
+            return "версия", row[0]
+    data_version = _scalars(db, "PRAGMA data_version")
+    changes = _scalars(db, "SELECT total_changes()")
+    if data_version is None or changes is None:
+        return None
+    return db.connectionName(), data_version[0], changes[0]
+
+
+def lookup(db, table: str, key: str, display: str) -> Lookup:
+    """Словарь справочника: из кэша, если версия не изменилась, иначе загружается заново."""
+    cache_key = (db.databaseName(), table, key, display)
+    version = table_version(db, table)
+    cached = _lookups.get(cache_key)
+    if cached is not None and version is not None and cached.version == version:
+        return cached
+    from PyQt5.QtSql import QSqlQuery
+    items = []
+    query = QSqlQuery(db)
+    query.setForwardOnly(True)
+    if query.exec_(f"SELECT {_quote(key)}, {_quote(display)} FROM {_quote(table)} ORDER BY 2"):
+        while query.next():
+            items.append((query.value(0), query.value(1)))
+    result = Lookup(version, dict(items), items)
+    if version is not None:
+        _lookups[cache_key] = result
+    return result
+
+
+def invalidate(db_path: str | None = None) -> None:
+    """Сбрасывает словари файла db_path (всех файлов – без аргумента), например после восстановления копии."""
+    for cache_key in [k for k in _lookups if db_path is None or k[0] == db_path]:
+        del _lookups[cache_key]
@@ -0,0 +1,238 @@
+"""
+reports.py
+Периоды отчётов и SQL-выборки по выполненным работам.
+
+Функции выборок принимают sqlite3-соединение; GUI передаёт им снимок
+connection.snapshot(), чтобы отчёт читал согласованное состояние БД и не
+занимал соединение, через которое редактируются таблицы.
+
+Даты работ хранятся текстом 'YYYY-MM-DD HH:MM', а запросы фильтруют и
+группируют по генерируемым колонкам ts_начала / ts_окончания (секунды эпохи,
+см. миграцию 2). Период отчёта – полуинтервал [начало первого дня, начало дня
+после последнего), поэтому работы последнего дня с любым временем попадают
+в отчёт, а сравнение идёт по индексу (id_договора | id_исполнителя, ts_начала).
+"""
+
+import calendar
+from datetime import date, timedelta
+
+# Разбивка периода для сводных расчётов
+BREAKDOWNS = {
+    "none": "Без разбивки",
+    "week": "По неделям",
+    "month": "По месяцам",
+}
+
+# Сумма к выплате работнику за период, в разрезе интервалов разбивки.
+# Интервалы передаются списком VALUES (начало, конец, подпись); каждый из них –
+# диапазон дней по ключу свода свод_исполнитель_услуга_день (см. rollups.py),
+# так что чтение пропорционально числу дней × услуг, а не числу работ.
+PAYROLL_BREAKDOWN_SQL = """
+WITH периоды(начало, конец, подпись) AS (VALUES {values})
+SELECT п.подпись, COALESCE(SUM(с.работ), 0), COALESCE(SUM(с.работ * у.стоимость_без_ндс), 0)
+FROM периоды п
+LEFT JOIN свод_исполнитель_услуга_день с
+       ON с.id_исполнителя = ? AND с.день >= п.начало / 86400 AND с.день < п.конец / 86400
+LEFT JOIN услуги у ON с.id_услуги = у.id
+GROUP BY п.начало
+ORDER BY п.начало
+"""
+
+# Строки акта выполненных работ: услуга и вагон каждой работы договора за период.
+# {source} – выполненные_работы или представление с архивами (archive.ARCHIVE_VIEW).
+ACT_ROWS_SQL = """
+SELECT у.id, у.наименование, у.стоимость_без_ндс, у.стоимость_с_ндс, в.номер
+FROM {source} вр
+JOIN услуги у ON вр.id_услуги = у.id
+JOIN вагоны в ON вр.id_вагона = в.id
+WHERE вр.id_договора = ? AND вр.ts_начала >= ? AND вр.ts_начала < ?
+ORDER BY у.наименование, в.номер
+"""
+
+# Отчёт по договору за всё время: по услуге – число различных вагонов и их
+# номера. Читает свод_договор_услуга_вагон (строка = договор × услуга × вагон).
+CONTRACT_SERVICES_SQL = """
+SELECT у.id, у.наименование, у.стоимость_без_ндс, у.стоимость_с_ндс,
+       COUNT(*), GROUP_CONCAT(с.номер, ', ')
+FROM (
+    SELECT св.id_услуги, в.номер
+    FROM свод_договор_услуга_вагон св
+    JOIN вагоны в ON в.id = св.id_вагона
+    WHERE св.id_договора = ?
+    ORDER BY в.номер
+) с
+JOIN услуги у ON у.id = с.id_услуги
+GROUP BY у.id
+ORDER BY у.наименование
+"""
+
+# То же по сырым работам из произвольного источника – например, временного
+# представления с архивами (archive.ARCHIVE_VIEW), для которого сводов нет.
+CONTRACT_SERVICES_RAW_SQL = """
+SELECT у.id, у.наименование, у.стоимость_без_ндс, у.стоимость_с_ндс,
+       COUNT(*), GROUP_CONCAT(с.номер, ', ')
+FROM (
+    SELECT DISTINCT вр.id_услуги, в.номер
+    FROM {source} вр
+    JOIN вагоны в ON в.id = вр.id_вагона
+    WHERE вр.id_договора = ?
+    ORDER BY в.номер
+) с
+JOIN услуги у ON у.id = с.id_услуги
+GROUP BY у.id
+ORDER BY у.наименование
+"""
+
+
+def day_start_ts(day: date) -> int:
+    """Секунды эпохи начала дня – в той же шкале, что strftime('%s', ...) в SQLite."""
+    return calendar.timegm(day.timetuple())
+
+
+def period_bounds(start: date, end: date) -> tuple[int, int]:
+    """Полуинтервал [start 00:00, end + 1 день 00:00) в секундах эпохи."""
+    if end < start:
+        start, end = end, start
+    return day_start_ts(start), day_start_ts(end + timedelta(days=1))
+
+
+def period_ranges(start: date, end: date, breakdown: str = "none") -> list[tuple[int, int, str]]:
+    """
+    Делит период на интервалы (начало_ts, конец_ts, подпись).
+
+    week – недели с понедельника, month – календарные месяцы; крайние
+    интервалы обрезаются границами периода.
+    """
+    if breakdown not in BREAKDOWNS:
+        raise ValueError(f"Неизвестная разбивка периода: {breakdown}")
+    if end < start:
+        start, end = end, start
+    if breakdown == "none":
+        lower, upper = period_bounds(start, end)
+        return [(lower, upper, f"{start:%d.%m.%Y} – {end:%d.%m.%Y}")]
+
+    ranges = []
+    current = start
+    while current <= end:
+        if breakdown == "week":
+            next_start = current + timedelta(days=7 - current.weekday())
+        else:
+            next_start = (current.replace(day=1) + timedelta(days=32)).replace(day=1)
+        last = min(next_start - timedelta(days=1), end)
+        ranges.append((day_start_ts(current), day_start_ts(last + timedelta(days=1)),
+                       f"{current:%d.%m.%Y} – {last:%d.%m.%Y}"))
+        current = next_start
+    return ranges
+
+
+def payroll_breakdown_query(worker_id: int, start: date, end: date, breakdown: str = "none"):
+    """
+    Возвращает (sql, params) для расчёта оплаты по интервалам периода.
+
+    Строки результата: (подпись интервала, число работ, сумма).
+    Параметры позиционные – подходят и для sqlite3, и для QSqlQuery.addBindValue.
+    """
+    ranges = period_ranges(start, end, breakdown)
+    sql = PAYROLL_BREAKDOWN_SQL.format(values=", ".join(["(?, ?, ?)"] * len(ranges)))
+    params = [value for interval in ranges for value in interval]
+    params.append(worker_id)
+    return sql, params
+
+
+def act_rows(conn, contract_id: int, start: date, end: date, source: str = "выполненные_работы"):
+    """Строки акта: [(id услуги, наименование, цена без НДС, цена с НДС, номер вагона)]."""
+    return conn.execute(ACT_ROWS_SQL.format(source=source),
+                        (contract_id, *period_bounds(start, end))).fetchall()
+
+
+def contract_services(conn, contract_id: int, source: str | None = None):
+    """
+    Услуги договора за всё время: [(id, наименование, цена без НДС, цена с НДС,
+    число вагонов, номера вагонов)]. Без source читается свод, с source – сырые работы.
+    """
+    if source is None:
+        return conn.execute(CONTRACT_SERVICES_SQL, (contract_id,)).fetchall()
+    return conn.execute(CONTRACT_SERVICES_RAW_SQL.format(source=source), (contract_id,)).fetchall()
+
+
+def payroll_breakdown(conn, worker_id: int, start: date, end: date, breakdown: str = "none"):
+    """Оплата по интервалам периода: [(подпись, число работ, сумма)]."""
+    sql, params = payroll_breakdown_query(worker_id, start, end, breakdown)
+    return conn.execute(sql, params).fetchall()
+
+
+# ──────────────────────────── таблицы отчётов ────────────────────────────── #
+# pandas импортируется внутри функций: выборки выше нужны и утилитам без pandas
+
+def _with_total_row(df):
+    """Добавляет строку «ИТОГО:» с суммами колонок «Итого без НДС» и «Итого с НДС»."""
+    import pandas as pd
+
+    summary_row = pd.DataFrame([{
+        "Наименование услуги": "ИТОГО:",
+        "Стоимость за ед. без НДС": "",
+        "Стоимость за ед. с НДС": "",
+        "Количество": "",
+        "Номера вагонов": "",
+        "Итого без НДС": df['Итого без НДС'].sum(),
+        "Итого с НДС": df['Итого с НДС'].sum()
+    }])
+    return pd.concat([df, summary_row], ignore_index=True)
+
+
+def act_frame(rows):
+    """
+    Таблица акта выполненных работ из строк act_rows: услуги с числом различных
+    вагонов, их номерами и суммами, плюс строка «ИТОГО:». None, если строк нет.
+    """
+    import pandas as pd
+
+    if not rows:
+        return None
+    raw_df = pd.DataFrame([{
+        "id_услуги": service_id,
+        "Наименование услуги": service_name,
+        "Стоимость за ед. без НДС": float(price_without_vat or 0),
+        "Стоимость за ед. с НДС": float(price_with_vat or 0),
+        "Номер вагона": wagon_number
+    } for service_id, service_name, price_without_vat, price_with_vat, wagon_number in rows])
+
+    # Считаем количество уникальных вагонов и собираем их номера
+    aggregated_data = raw_df.groupby([
+        'id_услуги',
+        'Наименование услуги',
+        'Стоимость за ед. без НДС',
+        'Стоимость за ед. с НДС'
+    ])['Номер вагона'].agg(
+        Количество='nunique',
+        Номера_вагонов=lambda x: ', '.join(x.unique())
+    ).reset_index()
+    aggregated_data.rename(columns={'Номера_вагонов': 'Номера вагонов'}, inplace=True)
+
+    aggregated_data['Итого без НДС'] = aggregated_data['Стоимость за ед. без НДС'] * aggregated_data['Количество']
+    aggregated_data['Итого с НДС'] = aggregated_data['Стоимость за ед. с НДС'] * aggregated_data['Количество']
+
+    # id_услуги в итоговом отчёте не нужен
+    return _with_total_row(aggregated_data.drop(columns=['id_услуги']))
+
+
+def contract_frame(services):
+    """Таблица отчёта по договору из строк contract_services плюс строка «ИТОГО:». None, если строк нет."""
+    import pandas as pd
+
+    rows = []
+    for _, service_name, price_without_vat, price_with_vat, wagons_count, wagon_numbers in services:
+        price_without_vat = float(price_without_vat or 0)
+        price_with_vat = float(price_with_vat or 0)
+        rows.append({
+            "Наименование услуги": service_name,
+            "Стоимость за ед. без НДС": price_without_vat,
+            "Стоимость за ед. с НДС": price_with_vat,
+            "Количество": wagons_count,
+            "Номера вагонов": wagon_numbers,
+            "Итого без НДС": price_without_vat * wagons_count,
+            "Итого с НДС": price_with_vat * wagons_count
+        })
+    if not rows:
+        return None
+    return _with_total_row(pd.DataFrame(rows))
@@ -0,0 +1,168 @@
+"""
+rollups.py
+Сводные таблицы по выполненным работам, поддерживаемые триггерами.
+
+Отчёты по договору и расчёт оплаты читают готовые счётчики вместо того,
+чтобы на каждый клик проходить все выполненные_работы:
+
+свод_договор_услуга_день     – работ по договору × услуге × дню
+свод_договор_услуга_вагон    – работ по договору × услуге × вагону; число
+                               строк группы = число различных вагонов
+свод_исполнитель_услуга_день – работ исполнителя по услуге × дню
+
+В сводах хранятся только количества. Суммы считаются при чтении умножением
+на текущие цены из «услуги» – так же, как раньше в отчётах, поэтому правка
+цены не требует пересчёта сводов. День – ts_начала / 86400 (см. reports.py).
+Работы без даты, договора, услуги и т. п. в соответствующий свод не попадают.
+
+CLI:
+    python rollups.py wagons.db check
+    python rollups.py wagons.db rebuild
+"""
+
+import sqlite3
+import sys
+
+from connection import connect
+
+DAY_EXPR = "{r}.ts_начала / 86400"
+
+# имя свода → {колонка ключа: выражение над строкой выполненных_работ}
+ROLLUPS = {
+    "свод_договор_услуга_день": {
+        "id_договора": "{r}.id_договора",
+        "id_услуги": "{r}.id_услуги",
+        "день": DAY_EXPR,
+    },
+    "свод_договор_услуга_вагон": {
+        "id_договора": "{r}.id_договора",
+        "id_услуги": "{r}.id_услуги",
+        "id_вагона": "{r}.id_вагона",
+    },
+    "свод_исполнитель_услуга_день": {
+        "id_исполнителя": "{r}.id_исполнителя",
+        "день": DAY_EXPR,
+        "id_услуги": "{r}.id_услуги",
+    },
+}
+
+# Колонки выполненных_работ, изменение которых перемещает строку между группами
+SOURCE_COLUMNS = ("id_вагона", "id_договора", "id_услуги", "id_исполнителя", "дата_начала_")
+
+
+def _exprs(name: str, row: str) -> list[str]:
+    return [expr.format(r=row) for expr in ROLLUPS[name].values()]
+
+
+def _not_null(name: str, row: str) -> str:
+    return " AND ".join(f"({expr}) IS NOT NULL" for expr in _exprs(name, row))
+
+
+def _add_sql(name: str, row: str) -> str:
+    keys = ", ".join(ROLLUPS[name])
+    return (
+        f"INSERT INTO {name} ({keys}, работ) "
+        f"SELECT {', '.join(_exprs(name, row))}, 1 WHERE {_not_null(name, row)} "
+        f"ON CONFLICT ({keys}) DO UPDATE SET работ = работ + 1;"
+    )
+
+
+def _remove_sql(name: str, row: str) -> str:
+    match = " AND ".join(f"{key} = {expr}" for key, expr in zip(ROLLUPS[name], _exprs(name, row)))
+    return (
+        f"UPDATE {name} SET работ = работ - 1 WHERE {match};\n"
+        f"    DELETE FROM {name} WHERE {match} AND работ <= 0;"
+    )
+
+
+def schema_statements() -> list[str]:
+    """DDL сводных таблиц и триггеров на выполненные_работы – по команде на элемент."""
+    parts = []
+    for name, keys in ROLLUPS.items():
+        columns = ", ".join(f"{key} INTEGER NOT NULL" for key in keys)
+        parts.append(
+            f"CREATE TABLE IF NOT EXISTS {name} ({columns}, работ INTEGER NOT NULL, "
+            f"PRIMARY KEY ({', '.join(keys)})) WITHOUT ROWID"
+        )
+
+    on_insert = "\n    ".join(_add_sql(name, "NEW") for name in ROLLUPS)
+    on_delete = "\n    ".join(_remove_sql(name, "OLD") for name in ROLLUPS)
+    parts.append(f"""CREATE TRIGGER IF NOT EXISTS свод_работы_insert AFTER INSERT ON выполненные_работы
+BEGIN
+    {on_insert}
+END""")
+    parts.append(f"""CREATE TRIGGER IF NOT EXISTS свод_работы_delete AFTER DELETE ON выполненные_работы
+BEGIN
+    {on_delete}
+END""")
+    parts.append(f"""CREATE TRIGGER IF NOT EXISTS свод_работы_update
+AFTER UPDATE OF {', '.join(SOURCE_COLUMNS)} ON выполненные_работы
+BEGIN
+    {on_delete}
+    {on_insert}
+END""")
+    return parts
+
+
+def _aggregate_sql(name: str) -> str:
+    exprs = ", ".join(_exprs(name, "вр"))
+    return (
+        f"SELECT {exprs}, COUNT(*) FROM выполненные_работы вр "
+        f"WHERE {_not_null(name, 'вр')} GROUP BY {exprs}"
+    )
+
+
+def fill(conn: sqlite3.Connection, names=None) -> dict[str, int]:
+    """
+    Пересчитывает своды с нуля в текущей транзакции вызывающего кода.
+
+    Возвращает число групп в каждом своде.
+    """
+    result = {}
+    for name in names or ROLLUPS:
+        conn.execute(f"DELETE FROM {name}")
+        conn.execute(f"INSERT INTO {name} ({', '.join(ROLLUPS[name])}, работ) {_aggregate_sql(name)}")
+        result[name] = conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+    return result
+
+
+def rebuild(conn: sqlite3.Connection, names=None) -> dict[str, int]:
+    """Пересчитывает своды с нуля одной транзакцией (см. fill)."""
+    with conn:
+        return fill(conn, names)
+
+
+def check(conn: sqlite3.Connection, names=None) -> dict[str, int]:
+    """
+    Сравнивает своды с агрегатом по выполненным_работам.
+
+    Возвращает число расходящихся групп в каждом своде (0 – свод верен).
+    """
+    result = {}
+    for name in names or ROLLUPS:
+        stored = f"SELECT {', '.join(ROLLUPS[name])}, работ FROM {name}"
+        actual = _aggregate_sql(name)
+        result[name] = conn.execute(
+            f"SELECT (SELECT COUNT(*) FROM ({stored} EXCEPT {actual})) + "
+            f"(SELECT COUNT(*) FROM ({actual} EXCEPT {stored}))"
+        ).fetchone()[0]
+    return result
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[2] not in ("check", "rebuild"):
+        print("Использование: python rollups.py <файл БД> check|rebuild")
+        sys.exit(2)
+
+    conn = connect(sys.argv[1])
+    try:
+        if sys.argv[2] == "rebuild":
+            for name, groups in rebuild(conn).items():
+                print(f"{name}: {groups} групп")
+        else:
+            mismatches = check(conn)
+            for name, count in mismatches.items():
+                print(f"{name}: {'в порядке' if count == 0 else f'расхождений: {count}'}")
+            sys.exit(1 if any(mismatches.values()) else 0)
+    finally:
+        conn.close()
@@ -0,0 +1,155 @@
+"""
+search.py
+Полнотекстовый поиск по вагонам, договорам, услугам и исполнителям (FTS5).
+
+Виртуальная таблица «поиск» хранит по строке на запись справочника:
+заголовок (номер вагона/договора, наименование услуги, ФИО) и описание
+(описание услуги). Токенизатор unicode61 не различает регистр кириллицы;
+букву ё он не упрощает, поэтому ё заменяется на е и при индексации,
+и в запросе – «елкин» находит «Ёлкин». Показываются исходные значения:
+заголовок читается из справочника по id, в слова фрагмента описания
+возвращается ё (original_snippet).
+
+rowid строки поиска = id записи * len(SOURCES) + номер сущности: так триггеры
+удаляют и обновляют строку поиска по rowid, без просмотра всего индекса,
+а сущность и id восстанавливаются из rowid без отдельных колонок.
+"""
+
+import re
+
+# таблица → (номер сущности, выражение заголовка, выражение описания)
+SOURCES = {
+    "вагоны": (0, "номер", "''"),
+    "договоры": (1, "номер", "''"),
+    "услуги": (2, "наименование", "описание"),
+    "исполнители": (3, "фио", "''"),
+}
+
+# Вес совпадения в заголовке и в описании для bm25
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+_TOKEN = re.compile(r"\w+")
+
+
+def _columns(table: str) -> set[str]:
+    _, title, description = SOURCES[table]
+    return {title, description} - {"''"}
+
+
+def _normalized(expr: str) -> str:
+    return f"replace(replace({expr}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _row_sql(table: str, row: str) -> tuple[str, str, str]:
+    code, title, description = SOURCES[table]
+    value = lambda expr: expr if expr == "''" else _normalized(f"{row}.{expr}")
+    return f"{row}.id * {len(SOURCES)} + {code}", value(title), value(description)
+
+
+def schema_statements() -> list[str]:
+    """DDL таблицы поиска и триггеров на справочники – по команде на элемент."""
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS поиск USING fts5("
+        "заголовок, описание, tokenize = 'unicode61 remove_diacritics 2')"
+    ]
+    for table in SOURCES:
+        new_rowid, new_title, new_description = _row_sql(table, "NEW")
+        old_rowid = _row_sql(table, "OLD")[0]
+        insert = (f"INSERT INTO поиск (rowid, заголовок, описание) "
+                  f"VALUES ({new_rowid}, {new_title}, {new_description});")
+        delete = f"DELETE FROM поиск WHERE rowid = {old_rowid};"
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS поиск_{table}_insert AFTER INSERT ON {table}\n"
+            f"BEGIN\n    {insert}\nEND"
+        )
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS поиск_{table}_delete AFTER DELETE ON {table}\n"
+            f"BEGIN\n    {delete}\nEND"
+        )
+        statements.append(
+            f"CREATE TRIGGER IF NOT EXISTS поиск_{table}_update "
+            f"AFTER UPDATE OF {', '.join(sorted(_columns(table) | {'id'}))} ON {table}\n"
+            f"BEGIN\n    {delete}\n    {insert}\nEND"
+        )
+    return statements
+
+
+def fill(conn) -> int:
+    """Заново наполняет поиск из справочников в текущей транзакции. Возвращает число строк."""
+    conn.execute("DELETE FROM поиск")
+    for table in SOURCES:
+        rowid, title, description = _row_sql(table, "т")
+        conn.execute(
+            f"INSERT INTO поиск (rowid, заголовок, описание) "
+            f"SELECT {rowid}, {title}, {description} FROM {table} т"
+        )
+    return conn.execute("SELECT COUNT(*) FROM поиск").fetchone()[0]
+
+
+def match_expression(text: str) -> str:
+    """
+    Переводит ввод пользователя в выражение MATCH: каждое слово – префикс,
+    все слова обязательны. Спецсимволы FTS5 в запрос не попадают.
+    """
+    text = text.replace("ё", "е").replace("Ё", "Е")
+    return " ".join(f'"{token}"*' for token in _TOKEN.findall(text))
+
+
+def _original_sql(position: int) -> str:
+    """Исходное (не нормализованное) значение заголовка (1) или описания (2) строки поиска."""
+    size = len(SOURCES)
+    cases = " ".join(
+        f"WHEN {entry[0]} THEN (SELECT т.{entry[position]} FROM {table} т WHERE т.id = поиск.rowid / {size})"
+        for table, entry in SOURCES.items() if entry[position] != "''"
+    )
+    return f"CASE поиск.rowid % {size} {cases} END"
+
+
+def original_snippet(snippet: str, original: str | None) -> str:
+    """Фрагмент описания с исходным написанием слов (ё) из original."""
+    if not snippet or not original:
+        return snippet
+    words = {match.group().replace("ё", "е").replace("Ё", "Е"): match.group()
+             for match in _TOKEN.finditer(original)}
+    return _TOKEN.sub(lambda match: words.get(match.group(), match.group()), snippet)
+
+
+def search_query(text: str, limit: int = 50):
+    """
+    Возвращает (sql, params) поиска или None, если в тексте нет слов.
+
+    Строки результата: (номер сущности, id записи, заголовок, фрагмент описания,
+    исходное описание). Заголовок – из справочника, фрагмент – из индекса
+    (без ё, см. original_snippet).
+    """
+    expression = match_expression(text)
+    if not expression:
+        return None
+    size = len(SOURCES)
+    sql = f"""
+        SELECT rowid % {size}, rowid / {size}, coalesce({_original_sql(1)}, заголовок),
+               snippet(поиск, 1, '[', ']', '…', 8), {_original_sql(2)}
+        FROM поиск
+        WHERE поиск MATCH ?
+        ORDER BY bm25(поиск, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT})
+        LIMIT {int(limit)}
+    """
+    return sql, [expression]
+
+
+def entity_table(code: int) -> str:
+    """Имя таблицы по номеру сущности из результата поиска."""
+    for table, (table_code, _, _) in SOURCES.items():
+        if table_code == code:
+            return table
+    raise KeyError(code)
+
+
+def search(conn, text: str, limit: int = 50) -> list[tuple[str, int, str, str]]:
+    """Поиск через sqlite3: [(таблица, id, заголовок, фрагмент описания)] по убыванию релевантности."""
+    query = search_query(text, limit)
+    if query is None:
+        return []
+    return [(entity_table(code), record_id, title, original_snippet(snippet, description))
+            for code, record_id, title, snippet, description in conn.execute(*query)]
@@ -0,0 +1,223 @@
+"""
+sqlaudit.py
+Проверка планов (EXPLAIN QUERY PLAN) всех запросов, которые выполнила
+программа, на большой синтетической базе.
+
+Запросы собирает sqltrace: в сеансе GUI, прогоне бенчмарков или любом
+скрипте с переменной окружения WAGON_SQL_CAPTURE=<файл.json> при выходе
+в файл дописываются тексты всех выполненных запросов, включая SELECT
+моделей Qt с подставленными setFilter. Аудитор выполняет для каждого
+запроса EXPLAIN QUERY PLAN (параметры – NULL) на фикстуре нужного масштаба
+и отмечает:
+• SCAN <таблица> – полный просмотр таблицы (или всего индекса);
+• USE TEMP B-TREE – сортировка/группировка во временном B-дереве.
+
+Большая таблица – не меньше BIG_TABLE_ROWS строк в проверочной базе.
+Принятые находки хранятся в базовом файле (--baseline, см.
+sqlaudit_baseline.json); код выхода 1, если появился полный просмотр
+большой таблицы, которого нет в базовом файле, – это можно включить в CI:
+
+    WAGON_SQL_CAPTURE=sql.json python -m benchmarks.suite --scale 10k
+    python sqlaudit.py sql.json --scale medium --baseline sqlaudit_baseline.json
+    python sqlaudit.py sql.json --db wagons.db --update-baseline sqlaudit_baseline.json
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+from typing import NamedTuple
+
+import sqltrace
+
+# Таблица считается большой от этого числа строк в проверочной базе
+BIG_TABLE_ROWS = 10_000
+BASELINE_FILE = Path(__file__).with_name("sqlaudit_baseline.json")
+# Запросы генератора тест-данных (попадают в запись при создании фикстуры) не проверяются
+IGNORED_CALLERS = ("fill_test_data.",)
+
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH")
+# «SCAN вагоны», «SCAN вагоны USING COVERING INDEX …»; до SQLite 3.36 – «SCAN TABLE вагоны»
+_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\S+)")
+_BINDINGS_RE = re.compile(r"uses (\d+)")
+
+
+class Finding(NamedTuple):
+    kind: str          # "SCAN" или "TEMP B-TREE"
+    table: str | None
+    detail: str        # строка плана
+    big: bool
+
+    @property
+    def key(self) -> str:
+        return f"{self.kind} {self.table}" if self.table else f"{self.kind} {self.detail}"
+
+
+class StatementAudit(NamedTuple):
+    sql: str
+    callers: list[str]
+    plan: list[str]
+    findings: list[Finding]
+    error: str | None
+
+
+def load_statements(paths) -> dict[str, list[str]]:
+    """Запросы из файлов sqltrace.save_statements: {запрос: [вызывающие]}."""
+    statements: dict[str, list[str]] = {}
+    for path in paths:
+        for sql, entry in json.loads(Path(path).read_text(encoding="utf-8")).items():
+            callers = statements.setdefault(sqltrace.normalize(sql), [])
+            callers.extend(c for c in entry.get("callers", []) if c not in callers)
+    return statements
+
+
+def session_statements() -> dict[str, list[str]]:
+    """Запросы текущего сеанса (статистика sqltrace)."""
+    return {stats.sql: stats.callers for stats in sqltrace.top(limit=None)}
+
+
+def table_sizes(conn: sqlite3.Connection) -> dict[str, int]:
+    """Строк в таблицах: оценка из sqlite_stat1 (после ANALYZE), иначе COUNT(*)."""
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+    sizes = {}
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+        for table, stat in conn.execute("SELECT tbl, stat FROM sqlite_stat1"):
+            sizes[table] = max(sizes.get(table, 0), int(stat.split()[0]))
+    for name in names:
+        if name in sizes:
+            continue
+        try:
+            sizes[name] = conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+        except sqlite3.Error:
+            # виртуальные таблицы без нужного модуля
+            continue
+    return sizes
+
+
+def explain(conn: sqlite3.Connection, sql: str) -> list[str]:
+    """Строки плана запроса; параметры подставляются как NULL."""
+    explain_sql = f"EXPLAIN QUERY PLAN {sql}"
+    try:
+        rows = conn.execute(explain_sql).fetchall()
+    except sqlite3.ProgrammingError as e:
+        # Число позиционных параметров известно только из сообщения об ошибке
+        match = _BINDINGS_RE.search(str(e))
+        rows = conn.execute(explain_sql, (None,) * int(match.group(1)) if match else _Nulls()).fetchall()
+    return [row[-1] for row in rows]
+
+
+class _Nulls(dict):
+    """Именованные параметры: любое имя – NULL."""
+
+    def __missing__(self, key):
+        return None
+
+
+def findings(plan: list[str], sizes: dict[str, int]) -> list[Finding]:
+    result = []
+    for detail in plan:
+        match = _SCAN_RE.match(detail)
+        if match and match.group(1) in sizes:
+            table = match.group(1)
+            result.append(Finding("SCAN", table, detail, sizes[table] >= BIG_TABLE_ROWS))
+        elif "USE TEMP B-TREE" in detail:
+            result.append(Finding("TEMP B-TREE", None, detail, False))
+    return result
+
+
+def audit(conn: sqlite3.Connection, statements: dict[str, list[str]]) -> list[StatementAudit]:
+    sizes = table_sizes(conn)
+    results = []
+    for sql, callers in sorted(statements.items()):
+        if not sql.lstrip("( ").upper().startswith(_EXPLAINABLE):
+            continue
+        if callers and all(caller.startswith(IGNORED_CALLERS) for caller in callers):
+            continue
+        try:
+            plan = explain(conn, sql)
+        except sqlite3.Error as e:
+            results.append(StatementAudit(sql, callers, [], [], str(e)))
+            continue
+        results.append(StatementAudit(sql, callers, plan, findings(plan, sizes), None))
+    return results
+
+
+def load_baseline(path: str | Path) -> set[tuple[str, str]]:
+    """Принятые находки: {(запрос, «SCAN таблица» | «TEMP B-TREE …»)}."""
+    path = Path(path)
+    if not path.exists():
+        return set()
+    return {(item["sql"], item["finding"]) for item in json.loads(path.read_text(encoding="utf-8"))}
+
+
+def save_baseline(path: str | Path, results: list[StatementAudit]) -> None:
+    items = [{"sql": r.sql, "finding": f.key} for r in results for f in r.findings]
+    Path(path).write_text(json.dumps(items, ensure_ascii=False, indent=1), encoding="utf-8")
+
+
+def new_big_scans(results: list[StatementAudit], baseline: set) -> list[tuple[StatementAudit, Finding]]:
+    return [(r, f) for r in results for f in r.findings
+            if f.kind == "SCAN" and f.big and (r.sql, f.key) not in baseline]
+
+
+def describe(results: list[StatementAudit], baseline: set = frozenset()) -> str:
+    lines = []
+    flagged = [r for r in results if r.findings or r.error]
+    lines.append(f"Запросов проверено: {len(results)}, с находками: {len(flagged)}")
+    for r in flagged:
+        lines.append("")
+        lines.append(r.sql)
+        if r.callers:
+            lines.append(f"  откуда: {', '.join(r.callers[:3])}")
+        if r.error:
+            lines.append(f"  ошибка EXPLAIN: {r.error}")
+        for f in r.findings:
+            mark = "НОВАЯ " if (r.sql, f.key) not in baseline else ""
+            size = " (большая таблица)" if f.big else ""
+            lines.append(f"  {mark}{f.kind}{size}: {f.detail}")
+    return "\n".join(lines)
+
+
+def _open_read_only(path: Path) -> sqlite3.Connection:
+    # Обычное соединение: EXPLAIN аудитора не должны попадать в статистику sqltrace
+    return sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN для всех запросов сеанса")
+    parser.add_argument("captures", nargs="+", help=f"файлы запросов ({sqltrace.CAPTURE_ENV})")
+    parser.add_argument("--db", help="проверочная БД (по умолчанию – фикстура --scale)")
+    parser.add_argument("--scale", default="medium", help="масштаб фикстуры fill_test_data (по умолчанию medium)")
+    parser.add_argument("--baseline", default=str(BASELINE_FILE), help="файл принятых находок")
+    parser.add_argument("--update-baseline", metavar="ФАЙЛ", help="записать текущие находки как принятые")
+    args = parser.parse_args()
+
+    if args.db:
+        db_path = Path(args.db)
+    else:
+        from fill_test_data import SCALES, fixture
+        db_path = fixture(Path(tempfile.mkdtemp()) / "аудит.db", SCALES[args.scale], read_only=True,
+                          on_progress=lambda stage, done, total: print(f"\r{stage}: {done}/{total}", end=""))
+        print()
+
+    conn = _open_read_only(db_path)
+    try:
+        results = audit(conn, load_statements(args.captures))
+    finally:
+        conn.close()
+
+    if args.update_baseline:
+        save_baseline(args.update_baseline, results)
+        print(f"Находки записаны в {args.update_baseline}")
+        sys.exit(0)
+
+    baseline = load_baseline(args.baseline)
+    print(describe(results, baseline))
+    fresh = new_big_scans(results, baseline)
+    if fresh:
+        print(f"\nНовых полных просмотров больших таблиц: {len(fresh)}")
+        sys.exit(1)
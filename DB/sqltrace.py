@@ -0,0 +1,303 @@
+"""
+sqltrace.py
+Замер времени SQL-запросов и журнал медленных запросов.
+
+Все sqlite3-соединения программы открываются через connection.connect() /
+connect_snapshot() с фабрикой TracedConnection, а запросы GUI выполняются
+через GUI.TracedQuery (подкласс QSqlQuery). Оба пути сообщают сюда о каждом
+выполненном запросе: текст, «форма» параметров (типы значений, а не сами
+значения), длительность, число строк и вызывающий код – класс диалога и
+метод, из которого пришёл запрос.
+
+Длительность включает выборку строк: SQLite выполняет запрос по мере
+чтения, поэтому запрос считается завершённым, когда строки прочитаны до
+конца, курсор выполнил следующий запрос или закрыт.
+
+Накопленная статистика (top) группирует запросы по тексту; запросы дольше
+SLOW_QUERY_MS пишутся в журнал с ротацией (configure_slow_log).
+
+Если задана переменная окружения WAGON_SQL_CAPTURE=<файл.json>, при выходе
+все запросы сеанса (текст, вызывающие, формы параметров) дописываются в этот
+файл – его проверяет sqlaudit.py (планы запросов на большой фикстуре).
+"""
+
+import atexit
+import contextlib
+import json
+import os
+import logging
+import sys
+import threading
+import time
+import weakref
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import NamedTuple
+
+import sqlite3
+
+# Порог медленного запроса, мс
+SLOW_QUERY_MS = 100
+# Ротация журнала медленных запросов
+SLOW_LOG_BYTES = 1_048_576
+SLOW_LOG_BACKUPS = 3
+
+# False – connection.connect() открывает обычные соединения без замера
+enabled = True
+
+CAPTURE_ENV = "WAGON_SQL_CAPTURE"
+
+slow_log = logging.getLogger("sqltrace.slow")
+slow_log.propagate = False
+# Без configure_slow_log журнал молчит (иначе logging.lastResort пишет в stderr)
+slow_log.addHandler(logging.NullHandler())
+
+_lock = threading.Lock()
+_stats: dict[str, "_Entry"] = {}
+
+
+class _Entry:
+    __slots__ = ("calls", "seconds", "max_seconds", "rows", "callers", "shapes")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.callers: dict[str, int] = {}
+        self.shapes: set[str] = set()
+
+
+class QueryStats(NamedTuple):
+    sql: str
+    calls: int
+    seconds: float
+    max_seconds: float
+    rows: int
+    callers: list[str]        # по убыванию числа вызовов
+    shapes: list[str]
+
+    @property
+    def avg_ms(self) -> float:
+        return self.seconds * 1000 / self.calls if self.calls else 0.0
+
+
+def normalize(sql: str) -> str:
+    """Текст запроса одной строкой – ключ статистики."""
+    return " ".join(sql.split())
+
+
+def param_shape(params) -> str:
+    """Типы параметров без значений: (int, str, None), {id: int} или 500 × (int, str)."""
+    if params is None:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in params.items()) + "}"
+    return "(" + ", ".join("None" if value is None else type(value).__name__ for value in params) + ")"
+
+
+_SKIP_FILES = {__file__, str(Path(__file__).with_name("connection.py")), contextlib.__file__}
+
+
+def caller() -> str:
+    """
+    Кто выполнил запрос: метод ближайшего по стеку объекта (обычно диалога)
+    и, если запрос выполнила функция модуля, – она сама: «ExcelReportDialog.
+    generate_report → reports.act_rows».
+    """
+    inner = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        owner = frame.f_locals.get("self")
+        # Кадры слоя замера (в т. ч. GUI.TracedQuery) пропускаются
+        if code.co_filename not in _SKIP_FILES and not hasattr(owner, "_trace_finish"):
+            if owner is not None:
+                method = f"{type(owner).__name__}.{code.co_name}"
+                return f"{method} → {inner}" if inner else method
+            if inner is None:
+                inner = f"{Path(code.co_filename).stem}.{code.co_name}"
+        frame = frame.f_back
+    return inner or "?"
+
+
+def record(sql: str, shape: str, seconds: float, rows: int, source: str | None = None) -> None:
+    """Учитывает выполненный запрос и пишет его в журнал, если он медленный."""
+    key = normalize(sql)
+    source = source or caller()
+    with _lock:
+        entry = _stats.get(key)
+        if entry is None:
+            entry = _stats[key] = _Entry()
+        entry.calls += 1
+        entry.seconds += seconds
+        entry.max_seconds = max(entry.max_seconds, seconds)
+        entry.rows += max(rows, 0)
+        entry.callers[source] = entry.callers.get(source, 0) + 1
+        if len(entry.shapes) < 10:
+            entry.shapes.add(shape)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        slow_log.warning("%.1f мс, строк %d, %s, параметры %s: %s",
+                         seconds * 1000, rows, source, shape, key)
+
+
+def top(limit: int | None = 50, order: str = "seconds") -> list[QueryStats]:
+    """Запросы по убыванию order: seconds (общее время), calls, max_seconds или rows."""
+    with _lock:
+        items = [
+            QueryStats(sql, e.calls, e.seconds, e.max_seconds, e.rows,
+                       sorted(e.callers, key=e.callers.get, reverse=True), sorted(e.shapes))
+            for sql, e in _stats.items()
+        ]
+    items.sort(key=lambda stats: getattr(stats, order), reverse=True)
+    return items[:limit]
+
+
+def reset() -> None:
+    with _lock:
+        _stats.clear()
+
+
+def save_statements(path: str | Path) -> int:
+    """
+    Дописывает запросы сеанса в JSON-файл {запрос: {"callers": [...],
+    "shapes": [...]}}, объединяя с уже сохранёнными. Результат – число
+    запросов в файле.
+    """
+    path = Path(path)
+    try:
+        saved = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        saved = {}
+    for stats in top(limit=None):
+        entry = saved.setdefault(stats.sql, {"callers": [], "shapes": []})
+        entry["callers"] = sorted(set(entry["callers"]) | set(stats.callers))
+        entry["shapes"] = sorted(set(entry["shapes"]) | set(stats.shapes))
+    path.write_text(json.dumps(saved, ensure_ascii=False, indent=1), encoding="utf-8")
+    return len(saved)
+
+
+def configure_slow_log(path: str | Path | None, threshold_ms: float | None = None) -> None:
+    """Направляет журнал медленных запросов в файл path с ротацией (None – отключить)."""
+    global SLOW_QUERY_MS
+    if threshold_ms is not None:
+        SLOW_QUERY_MS = threshold_ms
+    for handler in list(slow_log.handlers):
+        slow_log.removeHandler(handler)
+        handler.close()
+    if path is not None:
+        handler = RotatingFileHandler(path, maxBytes=SLOW_LOG_BYTES, backupCount=SLOW_LOG_BACKUPS,
+                                      encoding="utf-8", delay=True)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        slow_log.addHandler(handler)
+        slow_log.setLevel(logging.WARNING)
+
+
+def slow_log_path(db_path: str | Path) -> Path:
+    db_path = Path(db_path)
+    return db_path.with_name(f"{db_path.stem}_медленные_запросы.log")
+
+
+# ──────────────────────────── sqlite3 ────────────────────────────────────── #
+class TracedCursor(sqlite3.Cursor):
+    """Курсор, замеряющий выполнение и выборку каждого запроса."""
+
+    _trace = None    # [sql, форма параметров, вызывающий, секунды, строки] текущего запроса
+
+    def _trace_finish(self):
+        trace, self._trace = self._trace, None
+        if trace is not None:
+            sql, shape, source, seconds, rows = trace
+            record(sql, shape, seconds, rows if rows else max(self.rowcount, 0), source)
+
+    def _trace_fetch(self, fetch, size=None):
+        """Выполняет fetch и добавляет его время и строки к текущему запросу.
+
+        size – сколько строк запрошено списком (None – все): меньший список
+        означает, что выборка закончилась.
+        """
+        started = time.perf_counter()
+        result = fetch() if size is None or size == "all" else fetch(size)
+        if self._trace is not None:
+            self._trace[3] += time.perf_counter() - started
+            if isinstance(result, list):
+                self._trace[4] += len(result)
+                if size == "all" or len(result) < size:
+                    self._trace_finish()
+            elif result is None:
+                self._trace_finish()
+            else:
+                self._trace[4] += 1
+        return result
+
+    def execute(self, sql, parameters=()):
+        self._trace_finish()
+        source = caller()
+        started = time.perf_counter()
+        result = super().execute(sql, parameters)
+        self._trace = [sql, param_shape(parameters), source, time.perf_counter() - started, 0]
+        if self.description is None:
+            self._trace_finish()
+        return result
+
+    def executemany(self, sql, seq_of_parameters):
+        self._trace_finish()
+        seq_of_parameters = list(seq_of_parameters)
+        source = caller()
+        started = time.perf_counter()
+        result = super().executemany(sql, seq_of_parameters)
+        shape = param_shape(seq_of_parameters[0]) if seq_of_parameters else "()"
+        record(sql, f"{len(seq_of_parameters)} × {shape}", time.perf_counter() - started,
+               max(self.rowcount, 0), source)
+        return result
+
+    def fetchone(self):
+        return self._trace_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._trace_fetch(super().fetchmany, size or self.arraysize)
+
+    def fetchall(self):
+        return self._trace_fetch(super().fetchall, "all")
+
+    def __next__(self):
+        try:
+            return self._trace_fetch(super().__next__)
+        except StopIteration:
+            self._trace_finish()
+            raise
+
+    def close(self):
+        self._trace_finish()
+        super().close()
+
+
+class TracedConnection(sqlite3.Connection):
+    """Соединение, все курсоры которого – TracedCursor (фабрика для sqlite3.connect)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._trace_cursors = weakref.WeakSet()
+
+    def cursor(self, factory=TracedCursor):
+        cursor = super().cursor(factory)
+        self._trace_cursors.add(cursor)
+        return cursor
+
+    # sqlite3.Connection.execute создаёт курсор в обход cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        # Недочитанные выборки учитываются с тем, что успели прочитать
+        for cursor in list(self._trace_cursors):
+            if isinstance(cursor, TracedCursor):
+                cursor._trace_finish()
+        super().close()
+
+
+if os.environ.get(CAPTURE_ENV):
+    atexit.register(save_statements, os.environ[CAPTURE_ENV])
@@ -0,0 +1,250 @@
+"""
+table_filter.py
+Панель фильтра SQLiteEditor: условия по колонкам и быстрый поиск →
+параметризованный WHERE для PagedTableModel.setFilter.
+
+Условие по колонке задаётся строкой, как её вводит оператор:
+• 024-06064          – равенство;
+• 024-06*            – начинается с (диапазон col >= ? AND col < ?, по индексу);
+• 100..200, 100..    – диапазон, границы включительно, любая может быть пустой;
+• 2025-05, 05.2025   – для колонок дат: весь месяц; 2025-05-03, 03.05.2025 –
+  день; диапазон дат – 01.05.2025..15.05.2025.
+
+Для связанных колонок (setRelation) условие относится к показанному значению:
+t.id_вагона IN (SELECT id FROM вагоны WHERE номер = ?) – подзапрос идёт по
+уникальному индексу справочника, внешний – по индексу работ по id_вагона.
+Даты работ сравниваются по числовым ts_начала/ts_окончания (миграция 2),
+а не по тексту, в той же шкале, что и отчёты (reports.period_bounds).
+
+Быстрый поиск ищет слова в полнотекстовом индексе (search.py) по самой
+таблице, если это справочник, или по её связанным справочникам: в работах
+«024-06064» находит работы этого вагона, «Иванов» – этого исполнителя.
+
+    where = build_where("выполненные_работы", columns, relations,
+                        [Condition("id_вагона", "024-06064"), Condition("дата_начала_", "05.2025")])
+    model.setFilter(where.sql, where.params)
+"""
+
+import calendar
+import re
+from datetime import date, timedelta
+from typing import NamedTuple
+
+import search
+from reports import period_bounds
+
+# Колонки дат с числовой меткой времени и индексами по ней
+TIMESTAMP_COLUMNS = {
+    ("выполненные_работы", "дата_начала_"): "ts_начала",
+    ("выполненные_работы", "дата_окончания_"): "ts_окончания",
+}
+DATE_TYPES = ("DATE", "DATETIME")
+NUMERIC_TYPES = ("INTEGER", "REAL", "NUMERIC")
+
+RANGE_SEPARATOR = ".."
+PREFIX_MARK = "*"
+
+_DAY_RE = re.compile(r"^(?:(\d{4})-(\d{1,2})-(\d{1,2})|(\d{1,2})\.(\d{1,2})\.(\d{4}))$")
+_MONTH_RE = re.compile(r"^(?:(\d{4})-(\d{1,2})|(\d{1,2})\.(\d{4}))$")
+
+
+class Condition(NamedTuple):
+    column: str
+    text: str
+
+
+class Where(NamedTuple):
+    sql: str
+    params: list
+
+    def __bool__(self):
+        return bool(self.sql)
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def parse_days(text: str) -> tuple[date, date] | None:
+    """Первый и последний день для «2025-05-03», «03.05.2025», «2025-05», «05.2025»; иначе None."""
+    text = text.strip()
+    try:
+        match = _DAY_RE.match(text)
+        if match:
+            if match.group(1):
+                day = date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+            else:
+                day = date(int(match.group(6)), int(match.group(5)), int(match.group(4)))
+            return day, day
+        match = _MONTH_RE.match(text)
+        if match:
+            year, month = (int(match.group(1)), int(match.group(2))) if match.group(1) else \
+                (int(match.group(4)), int(match.group(3)))
+            return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+    except ValueError:
+        return None
+    return None
+
+
+def _prefix_upper(prefix: str) -> str:
+    """Наименьшая строка больше всех строк с этим префиксом (для col < ?)."""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _number(text: str, column: str):
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text.replace(",", "."))
+        except ValueError:
+            raise ValueError(f"{column}: «{text}» – не число") from None
+
+
+def _value_condition(expr: str, text: str, numeric: bool, column: str) -> tuple[str, list]:
+    """Равенство, префикс или диапазон для выражения expr."""
+    if RANGE_SEPARATOR in text:
+        low, high = (part.strip() for part in text.split(RANGE_SEPARATOR, 1))
+        parts, params = [], []
+        if low:
+            parts.append(f"{expr} >= ?")
+            params.append(_number(low, column) if numeric else low)
+        if high:
+            parts.append(f"{expr} <= ?")
+            params.append(_number(high, column) if numeric else high)
+        if not parts:
+            raise ValueError(f"{column}: пустой диапазон")
+        return " AND ".join(parts), params
+    if text.endswith(PREFIX_MARK) and len(text) > 1:
+        prefix = text[:-1]
+        if numeric:
+            return f"substr(CAST({expr} AS TEXT), 1, {len(prefix)}) = ?", [prefix]
+        return f"{expr} >= ? AND {expr} < ?", [prefix, _prefix_upper(prefix)]
+    return f"{expr} = ?", [_number(text, column) if numeric else text]
+
+
+def _date_condition(table: str, column: str, text: str) -> tuple[str, list]:
+    """Полуинтервал дат: по ts-колонке, если она есть, иначе по тексту ISO-даты."""
+    if RANGE_SEPARATOR in text:
+        low, high = (part.strip() for part in text.split(RANGE_SEPARATOR, 1))
+    else:
+        low = high = text
+    start = parse_days(low) if low else None
+    end = parse_days(high) if high else None
+    if (low and start is None) or (high and end is None) or not (start or end):
+        raise ValueError(f"{column}: «{text}» – не дата (03.05.2025, 05.2025, 01.05.2025..15.05.2025)")
+    first = start[0] if start else None
+    last = end[1] if end else None
+    timestamp = TIMESTAMP_COLUMNS.get((table, column))
+    if timestamp:
+        expr = f"t.{_quote(timestamp)}"
+        bounds = (period_bounds(first, first)[0] if first else None,
+                  period_bounds(last, last)[1] if last else None)
+    else:
+        expr = f"t.{_quote(column)}"
+        bounds = (first.isoformat() if first else None,
+                  (last + timedelta(days=1)).isoformat() if last else None)
+    parts, params = [], []
+    if bounds[0] is not None:
+        parts.append(f"{expr} >= ?")
+        params.append(bounds[0])
+    if bounds[1] is not None:
+        parts.append(f"{expr} < ?")
+        params.append(bounds[1])
+    return " AND ".join(parts), params
+
+
+def condition_sql(table: str, columns: dict[str, str], relations: dict[str, tuple[str, str, str]],
+                  condition: Condition) -> tuple[str, list]:
+    """
+    SQL одного условия. columns – {колонка: объявленный тип}, relations –
+    {колонка: (таблица, колонка ключа, показываемая колонка)}.
+    ValueError – условие не разобрано (текст для оператора).
+    """
+    column, text = condition.column, condition.text.strip()
+    if column not in columns:
+        raise ValueError(f"Нет колонки {column}")
+    if not text:
+        raise ValueError(f"{column}: пустое условие")
+    if column in relations:
+        related, key, display = relations[column]
+        inner, params = _value_condition(f"r.{_quote(display)}", text, False, column)
+        return (f"t.{_quote(column)} IN (SELECT r.{_quote(key)} FROM {_quote(related)} r WHERE {inner})",
+                params)
+    declared = columns[column].upper()
+    if declared.startswith(DATE_TYPES) and not text.endswith(PREFIX_MARK):
+        return _date_condition(table, column, text)
+    return _value_condition(f"t.{_quote(column)}", text, declared.startswith(NUMERIC_TYPES), column)
+
+
+def hit_sources_query(text: str) -> tuple[str, list] | None:
+    """
+    (sql, params) номеров справочников, в которых есть совпадения с текстом.
+    Условие «id_вагона IN (…) OR id_услуги IN (…)» нельзя выполнить по
+    индексам, если хоть одна колонка без индекса; поэтому в быстрый поиск
+    попадают только справочники с совпадениями (hit_codes).
+    """
+    expression = search.match_expression(text)
+    if not expression:
+        return None
+    return f"SELECT DISTINCT rowid % {len(search.SOURCES)} FROM поиск WHERE поиск MATCH ?", [expression]
+
+
+def quick_search_sql(table: str, columns: dict[str, str], relations: dict[str, tuple[str, str, str]],
+                     text: str, hit_codes: set[int] | None = None) -> tuple[str, list] | None:
+    """
+    Быстрый поиск: записи справочника или записи, связанные со справочниками,
+    в заголовке/описании которых есть все слова (префиксы) текста. Для
+    таблиц без полнотекстового пути – префикс по текстовым колонкам.
+    hit_codes – номера справочников с совпадениями (см. hit_sources_query),
+    None – все.
+    """
+    expression = search.match_expression(text)
+    if not expression:
+        return None
+    size = len(search.SOURCES)
+
+    def hits(code):
+        return f"SELECT rowid / {size} FROM поиск WHERE поиск MATCH ? AND rowid % {size} = {code}"
+
+    if table in search.SOURCES and "id" in columns:
+        return f"t.id IN ({hits(search.SOURCES[table][0])})", [expression]
+    parts, params = [], []
+    searchable = {column: search.SOURCES[related][0] for column, (related, key, _) in relations.items()
+                  if related in search.SOURCES and key == "id"}
+    if searchable and hit_codes is not None and not hit_codes & set(searchable.values()):
+        return "0", []
+    for column, code in searchable.items():
+        if hit_codes is None or code in hit_codes:
+            parts.append(f"t.{_quote(column)} IN ({hits(code)})")
+            params.append(expression)
+    if not parts:
+        words = text.strip()
+        for column, declared in columns.items():
+            if not declared.upper().startswith(NUMERIC_TYPES + DATE_TYPES):
+                parts.append(f"t.{_quote(column)} >= ? AND t.{_quote(column)} < ?")
+                params += [words, _prefix_upper(words)]
+    if not parts:
+        return None
+    return " OR ".join(f"({part})" for part in parts), params
+
+
+def build_where(table: str, columns: dict[str, str], relations: dict[str, tuple[str, str, str]],
+                conditions: list[Condition] = (), text: str = "", hit_codes: set[int] | None = None) -> Where:
+    """WHERE панели фильтра: все условия и быстрый поиск через AND. ValueError – см. condition_sql."""
+    parts, params = [], []
+    for condition in conditions:
+        sql, values = condition_sql(table, columns, relations, condition)
+        parts.append(f"({sql})")
+        params += values
+    quick = quick_search_sql(table, columns, relations, text, hit_codes) if text.strip() else None
+    if quick:
+        parts.append(f"({quick[0]})")
+        params += quick[1]
+    return Where(" AND ".join(parts), params)
+
+
+def describe(conditions: list[Condition], titles: dict[str, str] = None) -> str:
+    """Условия для подписи панели: «Вагон: 024-06064; Дата начала: 05.2025»."""
+    titles = titles or {}
+    return "; ".join(f"{titles.get(c.column, c.column)}: {c.text}" for c in conditions)
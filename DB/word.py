@@ -17,6 +17,7 @@ word_marker_tools.py
     pip install python-docx
 """
 
+import logging
 import os
 import re
 from typing import Dict, Iterable, Set, List, Optional, Tuple
@@ -24,6 +25,11 @@ import sqlite3
 
 from docx import Document
 
+import metrics
+from connection import connect_snapshot
+
+log = logging.getLogger("word")
+
 
 # ──────────────────────────── helpers ────────────────────────────────────── #
 def _rewrite_paragraphs(
@@ -49,7 +55,7 @@ def _rewrite_paragraphs(
             for marker, value in mapping.items():
                 marker_pattern = re.escape(f"[{marker}]")
                 if re.search(marker_pattern, original) and value.startswith("LIST:") and document:
-                    print(f"Найден LIST маркер: [{marker}], обрабатываем как список...")
+                    log.debug("Найден LIST маркер: [%s], обрабатываем как список...", marker)
                     match = re.search(marker_pattern, original)
                     
                     # Получаем текст до и после маркера
@@ -120,7 +126,7 @@ def _rewrite_paragraphs(
             for marker, value in mapping.items():
                 marker_pattern = re.escape(f"[{marker}]")
                 if re.search(marker_pattern, original):
-                    print(f"Обычная замена маркера: [{marker}] -> {value}")
+                    log.debug("Обычная замена маркера: [%s] -> %s", marker, value)
                     original = re.sub(marker_pattern, value, original)
                     was_replaced = True
             
@@ -172,14 +178,15 @@ def process_db_markers(db_path: str, markers: List[str]) -> Dict[str, str]:
         return {}
 
     if not os.path.exists(db_path):
-        print(f"Ошибка: База данных не найдена по пути {db_path}")
+        log.error("Ошибка: База данных не найдена по пути %s", db_path)
         return {}
     
     result = {}
     conn = None
     
     try:
-        conn = sqlite3.connect(db_path)
+        # Снимок только для чтения: все маркеры документа – из одного состояния БД
+        conn = connect_snapshot(db_path)
         cursor = conn.cursor()
         
         # Получаем информацию о таблицах и их колонках
@@ -204,7 +211,7 @@ def process_db_markers(db_path: str, markers: List[str]) -> Dict[str, str]:
                 # Проверяем без учета регистра
                 table_match = next((t for t in tables if t.lower() == table_name.lower()), None)
                 if not table_match:
-                    print(f"Таблица '{table_name}' не найдена в базе данных")
+                    log.warning("Таблица '%s' не найдена в базе данных", table_name)
                     continue
                 table_name = table_match
             
@@ -213,7 +220,7 @@ def process_db_markers(db_path: str, markers: List[str]) -> Dict[str, str]:
                 # Проверяем без учета регистра
                 column_match = next((c for c in columns if c.lower() == column_name.lower()), None)
                 if not column_match:
-                    print(f"Колонка '{column_name}' не найдена в таблице '{table_name}'")
+                    log.warning("Колонка '%s' не найдена в таблице '%s'", column_name, table_name)
                     continue
                 column_name = column_match
             
@@ -259,12 +266,12 @@ def process_db_markers(db_path: str, markers: List[str]) -> Dict[str, str]:
                 if value is not None:
                     result[marker] = str(value[0]) if value[0] is not None else ""
                 else:
-                    print(f"Данные для маркера '{marker}' не найдены")
+                    log.warning("Данные для маркера '%s' не найдены", marker)
             except sqlite3.Error as e:
-                print(f"Ошибка при получении данных для маркера '{marker}': {e}")
+                log.error("Ошибка при получении данных для маркера '%s': %s", marker, e)
     
     except sqlite3.Error as e:
-        print(f"Ошибка базы данных: {e}")
+        log.error("Ошибка базы данных: %s", e)
     finally:
         if conn:
             conn.close()
@@ -288,14 +295,15 @@ def process_related_tables_markers(db_path: str, main_table_id: Optional[int] =
         return {}
         
     if not os.path.exists(db_path):
-        print(f"Ошибка: База данных не найдена по пути {db_path}")
+        log.error("Ошибка: База данных не найдена по пути %s", db_path)
         return {}
     
     result = {}
     conn = None
     
     try:
-        conn = sqlite3.connect(db_path)
+        # Снимок только для чтения: все маркеры документа – из одного состояния БД
+        conn = connect_snapshot(db_path)
         cursor = conn.cursor()
         
         # Получаем схему базы данных - таблицы, колонки и внешние ключи
@@ -332,7 +340,7 @@ def process_related_tables_markers(db_path: str, main_table_id: Optional[int] =
             # Нормализуем имена таблиц и колонок (поиск без учета регистра)
             table_match = next((t for t in tables if t.lower() == table_name.lower()), None)
             if not table_match:
-                print(f"Таблица '{table_name}' не найдена в базе данных")
+                log.warning("Таблица '%s' не найдена в базе данных", table_name)
                 continue
             
             table_name = table_match
@@ -340,7 +348,7 @@ def process_related_tables_markers(db_path: str, main_table_id: Optional[int] =
             
             column_match = next((c for c in columns if c.lower() == column_name.lower()), None)
             if not column_match:
-                print(f"Колонка '{column_name}' не найдена в таблице '{table_name}'")
+                log.warning("Колонка '%s' не найдена в таблице '%s'", column_name, table_name)
                 continue
             
             column_name = column_match
@@ -385,10 +393,10 @@ def process_related_tables_markers(db_path: str, main_table_id: Optional[int] =
                 else:
                     result[marker] = ""
             except sqlite3.Error as e:
-                print(f"Ошибка при получении данных для маркера '{marker}': {e}")
+                log.error("Ошибка при получении данных для маркера '%s': %s", marker, e)
     
     except sqlite3.Error as e:
-        print(f"Ошибка базы данных: {e}")
+        log.error("Ошибка базы данных: %s", e)
     finally:
         if conn:
             conn.close()
@@ -430,20 +438,15 @@ def replace_placeholders(
     keys_re = "|".join(re.escape(k) for k in mapping)
     pattern = re.compile(r"\[(" + keys_re + r")\]")
     
-    # Выводим все ключи для отладки
-    print("Ключи для замены:")
-    for k in mapping.keys():
-        print(f"  - {k}")
-    
-    # Все маркеры, которые есть в документе
-    doc_markers = extract_placeholders(input_path)
-    print("Маркеры в документе:")
-    for marker in doc_markers:
-        print(f"  - {marker}")
-        if marker in mapping:
-            print(f"    Значение: {mapping[marker]}")
-        else:
-            print(f"    !!! НЕТ ЗНАЧЕНИЯ В СЛОВАРЕ !!!")
+    # Ключи и маркеры документа для отладки: лишний разбор шаблона
+    # выполняется только при уровне DEBUG
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Ключи для замены: %s", list(mapping))
+        for marker in extract_placeholders(input_path):
+            if marker in mapping:
+                log.debug("Маркер в документе: %s = %s", marker, mapping[marker])
+            else:
+                log.debug("Маркер в документе: %s – НЕТ ЗНАЧЕНИЯ В СЛОВАРЕ", marker)
 
     doc = Document(input_path)
 
@@ -461,8 +464,9 @@ def replace_placeholders(
         _rewrite_paragraphs(section.header.paragraphs, pattern, mapping, doc)
         _rewrite_paragraphs(section.footer.paragraphs, pattern, mapping, doc)
 
-    doc.save(output_path)
-    print(f"✓ Файл сохранён: {output_path}")
+    with metrics.span("word.save"):
+        doc.save(output_path)
+    log.info("✓ Файл сохранён: %s", output_path)
 
 
 def extract_placeholders(docx_path: str) -> list:
@@ -534,11 +538,13 @@ def create_test_document(output_path: str) -> None:
     table.cell(2, 1).text = "[договоры.дата]"
     
     doc.save(output_path)
-    print(f"✓ Тестовый файл сохранён: {output_path}")
+    log.info("✓ Тестовый файл сохранён: %s", output_path)
 
 
 # ───────────────────────────── CLI demo ──────────────────────────────────── #
 if __name__ == "__main__":
+    import logs
+    logs.setup()
     here = os.path.dirname(os.path.abspath(__file__))
 
     # 1. Всегда создаём тестовый шаблон